@@ -44,11 +44,13 @@ INSTALLED_APPS = [
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
 MIDDLEWARE = [
+    'example_app.timing.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'example_app.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -85,6 +87,135 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Selector lists for dropdowns, shared by all users and worker processes
+    'faststats_metadata': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'metadata'),
+        'TIMEOUT': 24 * 60 * 60,
+    },
+    # Status and results of background chart jobs, readable by any worker process
+    'chart_jobs': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'chart_jobs'),
+        'TIMEOUT': 10 * 60,
+    },
+}
+
+# Cube results stored as Arrow files, memory-mapped by every worker process
+CUBE_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'cubes')
+
+CUBE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Cubes over the reporting period stored as one partition per year, so when new
+# data arrives only the latest year is fetched again (see cube_partitions.py)
+INCREMENTAL_CUBES = False
+
+CUBE_PARTITION_DIR = os.path.join(BASE_DIR, 'cache', 'cube_partitions')
+
+CUBE_PARTITION_MAX_BYTES = 512 * 1024 * 1024
+
+# Airport co-ordinates, built once per data view and stored as Arrow files
+COORDINATE_INDEX_DIR = os.path.join(BASE_DIR, 'cache', 'coordinates')
+
+COORDINATE_INDEX_MAX_BYTES = 64 * 1024 * 1024
+
+# Route counts between every origin and destination, built once per data view
+# and max_date and memory-mapped by each worker process (see route_counts.py)
+ROUTE_COUNT_INDEX_DIR = os.path.join(BASE_DIR, 'cache', 'route_counts')
+
+ROUTE_COUNT_INDEX_MAX_BYTES = 64 * 1024 * 1024
+
+# Rendered chart HTML, held in each process and on disk
+RENDER_CACHE_MEMORY_BYTES = 128 * 1024 * 1024
+
+RENDER_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'renders')
+
+RENDER_CACHE_DISK_BYTES = 1024 * 1024 * 1024
+
+# Independent FastStats queries run in parallel by parallel_queries.run_queries
+
+QUERY_WORKERS = 8  # Threads in each process
+
+QUERY_TIMEOUT = 60  # Seconds each query may wait for a thread, and then run
+
+# Lock files so identical queries from different processes run once (see single_flight.py)
+QUERY_LOCK_DIR = os.path.join(BASE_DIR, 'cache', 'query_locks')
+
+# Background chart jobs
+# If enabled, chart requests return straight away and the page polls for the graph
+
+CHART_JOBS_ENABLED = False
+
+CHART_JOB_WORKERS = 4  # Threads building charts in each process
+
+CHART_JOB_TIMEOUT = 5 * 60  # Seconds before an unfinished job can be queued again
+
+# Streamed chart pages
+# If enabled (and chart jobs aren't), chart pages are sent up to the chart straight
+# away and the chart follows as it is serialized. Stages run after the response
+# starts aren't included in its Server-Timing header or profile.
+
+STREAMING_CHARTS = False
+
+# Charts drawn in the browser
+# If enabled, chart pages fetch the chart's data as JSON from the example's /data
+# endpoint and draw it with plotly.js, instead of receiving the figure's HTML.
+# Takes priority over chart jobs and streaming.
+
+CLIENT_SIDE_CHARTS = False
+
+PLOTLY_JS_URL = 'https://cdn.plot.ly/plotly-1.49.4.min.js'  # Same version plotly.py embeds
+
+# Request stage timings
+# Every response gets a Server-Timing header and a JSON line on the
+# 'example_app.timing' logger. If enabled, durations are also collected
+# into histograms in each process, shown to admins at /timing_stats/
+
+STAGE_TIMING_HISTOGRAMS = False
+
+# Request profiling
+# Profiles are saved with details of each request, and only the newest are kept.
+# Open .prof files with pstats or snakeviz, and .speedscope.json at speedscope.app
+
+PROFILE_SAMPLE_RATE = 0.0  # Fraction of requests profiled at random
+
+PROFILE_ON_REQUEST = True  # Staff users can profile a request with ?profile or an X-Profile header
+
+PROFILER = 'auto'  # 'cprofile', 'pyinstrument', or 'auto' for pyinstrument if installed
+
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+
+PROFILE_MAX_FILES = 100
+
+
+# Logging
+# https://docs.djangoproject.com/en/2.2/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'example_app.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -123,3 +254,23 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static'), ]
+
+
+# FastStats API sessions
+# Live sessions kept per process, so requests can skip Session.deserialize
+
+API_SESSION_CACHE_SIZE = 64  # Maximum number of sessions held
+
+API_SESSION_CACHE_TTL = 30 * 60  # Seconds before a held session is rebuilt
+
+# Connections to FastStats
+# Each process keeps a pool of connections per FastStats URL, shared by all
+# its sessions, shown to admins at /connection_pool_stats/ (see faststats_client.py)
+
+FASTSTATS_POOL_SIZE = 16  # Connections kept open per URL, at least QUERY_WORKERS
+
+FASTSTATS_TCP_KEEPALIVE = True  # Probe idle connections, so they aren't silently dropped
+
+FASTSTATS_RETRIES = 3  # Retries of failed connections, and of 502-504 responses to GETs
+
+FASTSTATS_RETRY_BACKOFF = 0.5  # Seconds between retries, doubling after the second
@@ -30,10 +30,17 @@ urlpatterns = [
     path('login_api/login_api_proc', views.login_api_proc, name='login_api_proc'),
     path('example_one/', views.example_one, name='example_one'),
     path('example_one/show_count', views.example_one_count, name='example_one_count'),
+    path('example_one/counts', views.example_one_counts, name='example_one_counts'),
     path('example_two/', views.example_two, name='example_two'),
     path('example_two/show_graph', views.example_two_graph, name='example_two_graph'),
+    path('example_two/data', views.example_two_data, name='example_two_data'),
     path('example_three', views.example_three, name='example_three'),
     path('example_three/show_map', views.example_three_map, name='example_three_map'),
+    path('example_three/data', views.example_three_data, name='example_three_data'),
     path('example_four/', views.example_four, name='example_four'),
     path('example_four/show_map', views.example_four_map, name='example_four_map'),
+    path('example_four/data', views.example_four_data, name='example_four_data'),
+    path('chart_jobs/<str:job_id>', views.chart_job_status, name='chart_job_status'),
+    path('timing_stats/', views.timing_stats, name='timing_stats'),
+    path('connection_pool_stats/', views.connection_pool_stats, name='connection_pool_stats'),
 ]
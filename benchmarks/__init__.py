@@ -0,0 +1,5 @@
+"""Benchmarks for the example pipelines.
+
+Run each script as a module from the project root, e.g.
+`python -m benchmarks.example_three_map`.
+"""
@@ -0,0 +1,62 @@
+import os
+import resource
+import sys
+import tempfile
+import time
+
+
+def setup_django():
+    """Configure Django settings so the example_app modules can be imported."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "api_apps.settings")
+    import django
+
+    django.setup()
+
+
+def use_temporary_cache_dirs():
+    """Point the app's disk caches at a new temporary directory, returning its path.
+
+    Call this after setup_django() but before importing any example_app modules,
+    so benchmarks neither read from nor fill the project's own caches.
+    """
+    from django.conf import settings
+
+    cache_dir = tempfile.mkdtemp(prefix="benchmark-cache-")
+    for setting in (
+        "CUBE_CACHE_DIR",
+        "CUBE_PARTITION_DIR",
+        "COORDINATE_INDEX_DIR",
+        "ROUTE_COUNT_INDEX_DIR",
+        "RENDER_CACHE_DIR",
+    ):
+        setattr(settings, setting, os.path.join(cache_dir, setting.lower()))
+    return cache_dir
+
+
+def peak_rss_bytes():
+    """Return the highest resident set size of this process so far, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def best_time(func, *args, repeat=5, **kwargs):
+    """Return best wall time in seconds over 'repeat' calls, and the last result."""
+    best = float("inf")
+    result = None
+    for __ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def print_table(headers, rows):
+    """Print rows as a plain-text table with right-aligned columns."""
+    widths = [
+        max(len(str(value)) for value in [header, *(row[i] for row in rows)])
+        for i, header in enumerate(headers)
+    ]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(v).rjust(w) for v, w in zip(row, widths)))
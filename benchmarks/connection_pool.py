@@ -0,0 +1,57 @@
+"""Compare new connections to FastStats with apteco's own clients and the shared pool.
+
+A session is deserialized for each of a number of page views, as happens
+whenever a live session isn't held by the process, and runs one count query.
+apteco's Session gives every deserialized session a new connection pool,
+while PooledSession reuses the process's pool for the FastStats URL.
+The stand-in FastStats server runs in this process and counts connections.
+"""
+import argparse
+import time
+
+from .common import print_table, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--routes", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds per request")
+    parser.add_argument("--views", type=int, default=50, help="Sessions to deserialize")
+    args = parser.parse_args()
+
+    setup_django()
+    from apteco.session import Session, login_with_password
+
+    from benchmarks.fake_faststats import start_server
+    from example_app.example_one_code import query_example_one_count
+    from example_app.faststats_client import PooledSession, get_pool_stats
+
+    server = start_server(n_routes=args.routes, latency=args.latency)
+    rows = []
+    try:
+        serialized = login_with_password(server.url, "benchmark", "Flight Delays", "benchmark", "")
+        serialized = serialized.serialize()
+        # Original implementation first: a new API client per deserialized session
+        for name, session_class in [("apteco", Session), ("shared pool", PooledSession)]:
+            connections_before = server.connections_accepted
+            requests_before = sum(server.request_counts.values())
+            start = time.perf_counter()
+            for __ in range(args.views):
+                session = session_class.deserialize(serialized)
+                query_example_one_count(session, "HEATHROW", "MALAGA")
+            rows.append(
+                (
+                    name,
+                    sum(server.request_counts.values()) - requests_before,
+                    server.connections_accepted - connections_before,
+                    f"{time.perf_counter() - start:.2f}",
+                )
+            )
+    finally:
+        server.shutdown()
+    print_table(["client", "requests", "connections", "seconds"], rows)
+    print(get_pool_stats())
+
+
+if __name__ == "__main__":
+    main()
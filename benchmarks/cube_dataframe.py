@@ -0,0 +1,72 @@
+"""Compare ways of turning a cube into the examples' DataFrame, filtered to a year."""
+import argparse
+import tracemalloc
+
+from .common import best_time, print_table, setup_django
+from .synthetic import make_cube_df
+
+
+def create_and_filter_with_strftime(cube, selected_year):
+    """Original implementation: a label formatted per row, then a filtered copy."""
+    if selected_year is not None:
+        date_var_desc = "Reporting Period (Month)"
+        new_col_name = "Month"
+        new_col_fmt = "%B"
+    else:
+        date_var_desc = "Reporting Period (Year)"
+        new_col_name = "Year"
+        new_col_fmt = "%Y"
+
+    df = cube.to_df()
+    df = df.reset_index().rename(columns={date_var_desc: "Date"})
+    df.loc[:, new_col_name] = df.loc[:, "Date"].dt.strftime(new_col_fmt)
+    if selected_year is not None:
+        df = df[df.loc[:, "Date"].dt.year == int(selected_year)]
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from example_app.api_shared_methods import create_and_filter_cube_dataframe
+    from example_app.cube_cache import CachedCube
+
+    implementations = [
+        ("strftime", create_and_filter_with_strftime),
+        ("lookup", create_and_filter_cube_dataframe),
+    ]
+    rows = []
+    for n_rows in args.rows:
+        for selected_year in (None, "2015"):
+            cube = CachedCube(make_cube_df(n_rows, selected_year))
+            for name, create_and_filter in implementations:
+                seconds, df = best_time(
+                    create_and_filter, cube, selected_year, repeat=args.repeat
+                )
+                tracemalloc.start()
+                create_and_filter(cube, selected_year)
+                __, alloc_peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                rows.append(
+                    (
+                        len(cube.to_df()),
+                        selected_year or "all years",
+                        name,
+                        len(df),
+                        f"{seconds * 1000:.1f}",
+                        f"{alloc_peak / 2 ** 20:.1f}",
+                        f"{df.memory_usage(deep=True).sum() / 2 ** 20:.1f}",
+                    )
+                )
+    print_table(
+        ["cube rows", "year", "implementation", "rows out", "ms", "alloc peak MB", "result MB"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Compare counting origin and destination pairs one query at a time with one batch cube.
+
+Each reporting airport is counted against a number of destinations,
+first with a count query per pair (as the example one page used to),
+then with get_example_one_counts, which gets every pair from one cube,
+then with lookups in the route count index (which the example one page now uses).
+Queries go to the stand-in FastStats server, with optional added latency.
+"""
+import argparse
+import time
+
+from .common import print_table, setup_django, use_temporary_cache_dirs
+from .pipelines import start_stand_in_server
+
+
+def count_pairs(session, origins, dests):
+    """Original implementation: one count query per origin and destination pair."""
+    from example_app.example_one_code import query_example_one_count
+
+    return [[query_example_one_count(session, origin, dest) for dest in dests] for origin in origins]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--routes", type=int, default=100000)
+    parser.add_argument("--destinations", type=int, nargs="+", default=[10, 50, 400])
+    parser.add_argument("--latency", type=float, default=0.01, help="Seconds per request")
+    parser.add_argument(
+        "--skip-pairs-above",
+        type=int,
+        default=2000,
+        help="Don't count pairs one at a time for more pairs than this",
+    )
+    args = parser.parse_args()
+
+    setup_django()
+    use_temporary_cache_dirs()
+    from apteco.session import login_with_password
+
+    from example_app.example_one_code import get_example_one_count, get_example_one_counts
+
+    rows = []
+    process, url = start_stand_in_server(args.routes, latency=args.latency)
+    try:
+        session = login_with_password(url, "benchmark", "Flight Delays", "benchmark", "")
+        start = time.perf_counter()
+        get_example_one_count(session, "HEATHROW", "MALAGA")
+        index_seconds = time.perf_counter() - start
+        all_counts = get_example_one_counts(session)
+        origins = all_counts.index.to_list()
+        for n_dests in args.destinations:
+            dests = all_counts.columns[:n_dests].to_list()
+            n_pairs = len(origins) * len(dests)
+            if n_pairs <= args.skip_pairs_above:
+                start = time.perf_counter()
+                count_pairs(session, origins, dests)
+                rows.append((n_pairs, "query per pair", f"{time.perf_counter() - start:.2f}"))
+            start = time.perf_counter()
+            get_example_one_counts(session, origins, dests)
+            rows.append((n_pairs, "batch cube", f"{time.perf_counter() - start:.2f}"))
+            start = time.perf_counter()
+            for origin in origins:
+                for dest in dests:
+                    get_example_one_count(session, origin, dest)
+            rows.append((n_pairs, "index lookups", f"{time.perf_counter() - start:.4f}"))
+        rows.append(("", "index build", f"{index_seconds:.2f}"))
+    finally:
+        process.terminate()
+        process.wait()
+    print_table(["pairs", "implementation", "seconds"], rows)
+
+
+if __name__ == "__main__":
+    main()
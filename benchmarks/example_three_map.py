@@ -0,0 +1,40 @@
+"""Compare per-route traces against a single batched trace for the example three map."""
+import argparse
+
+from .common import best_time, print_table, setup_django
+from .synthetic import make_example_three_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--routes", type=int, nargs="+", default=[50, 200, 800])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from example_app.api_shared_methods import get_html
+    from example_app.example_three_code import make_example_three_figure
+
+    rows = []
+    for n_routes in args.routes:
+        df = make_example_three_df(n_routes)
+        for batched in (False, True):
+            build_seconds, fig = best_time(
+                make_example_three_figure, df, batched, repeat=args.repeat
+            )
+            html_seconds, html = best_time(get_html, fig, repeat=args.repeat)
+            rows.append(
+                (
+                    n_routes,
+                    "batched" if batched else "per-route",
+                    len(fig.data),
+                    f"{build_seconds * 1000:.1f}",
+                    f"{html_seconds * 1000:.1f}",
+                    len(html.encode("utf-8")),
+                )
+            )
+    print_table(["routes", "mode", "traces", "build ms", "write_html ms", "html bytes"], rows)
+
+
+if __name__ == "__main__":
+    main()
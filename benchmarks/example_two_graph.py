@@ -0,0 +1,72 @@
+"""Compare ways of building the example two graph from a cube with many selectors."""
+import argparse
+
+from .common import best_time, print_table, setup_django
+from .synthetic import make_example_two_df
+
+
+def make_graph_with_masks(df, measure_var_desc):
+    """Original implementation: a boolean mask and filtered copies per selector."""
+    from plotly import graph_objects as go
+
+    from example_app.api_shared_methods import get_html
+
+    df.loc[:, "Date"] = df.loc[:, "Date"].dt.to_timestamp()
+    fig = go.Figure(data=go.Scatter())
+    for elem in sorted(set(df[measure_var_desc])):
+        mask = df[measure_var_desc] == elem
+        fig.add_trace(
+            go.Scatter(
+                mode="lines+markers",
+                x=df[mask]["Date"],
+                y=df[mask]["Flight Routes"],
+                name=elem,
+            )
+        )
+    fig.update_layout(
+        xaxis={"title": "Year"},
+        yaxis={"title": "Number of Flight Routes"},
+        width=1500,
+        height=800,
+    )
+    return get_html(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--selectors", type=int, nargs="+", default=[100, 1000, 3000])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument(
+        "--skip-masks-above",
+        type=int,
+        default=1000,
+        help="Don't run the original implementation for more selectors than this",
+    )
+    args = parser.parse_args()
+
+    setup_django()
+    from example_app.example_two_code import make_example_two_graph
+
+    # Bypass the render cache so every call builds and serializes the figure
+    make_graph = make_example_two_graph.__wrapped__
+    implementations = [
+        ("masks", lambda df: make_graph_with_masks(df, "Airline Name")),
+        ("groupby", lambda df: make_graph(df, "Airline Name")),
+        ("groupby, no validation", lambda df: make_graph(df, "Airline Name", validate=False)),
+    ]
+
+    rows = []
+    for n_selectors in args.selectors:
+        df = make_example_two_df(n_selectors)
+        for name, make in implementations:
+            if name == "masks" and n_selectors > args.skip_masks_above:
+                continue
+            seconds, html = best_time(lambda: make(df.copy()), repeat=args.repeat)
+            rows.append(
+                (n_selectors, len(df), name, f"{seconds * 1000:.1f}", len(html.encode("utf-8")))
+            )
+    print_table(["selectors", "rows", "implementation", "ms", "html bytes"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,802 @@
+"""Local stand-in for the FastStats API, serving a synthetic flight routes system.
+
+It implements the parts of the API py-apteco uses for the examples:
+simple login and logout, system info, tables and variables,
+cubes, data grids (exports) and counts.
+Start it from the project root with e.g.
+`python -m benchmarks.fake_faststats --routes 1000000 --latency 0.05`
+then log in to the URL it prints with any username and password
+and any data view and system name.
+"""
+import argparse
+import collections
+import datetime
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+AIRPORTS_TABLE = "Reporting Airport"
+ROUTES_TABLE = "Flight Route"
+
+REPORTING_AIRPORT_NAMES = [
+    "HEATHROW",
+    "GATWICK",
+    "MANCHESTER",
+    "STANSTED",
+    "LUTON",
+    "BIRMINGHAM",
+    "EDINBURGH",
+    "GLASGOW",
+    "BRISTOL",
+    "NEWCASTLE",
+    "LIVERPOOL",
+    "EAST MIDLANDS INTERNATIONAL",
+    "LEEDS BRADFORD",
+    "ABERDEEN",
+    "BELFAST INTERNATIONAL",
+    "SOUTHAMPTON",
+    "CARDIFF WALES",
+    "EXETER",
+    "JERSEY",
+    "GUERNSEY",
+]
+DESTINATION_NAMES = [
+    "MALAGA",
+    "FARO",
+    "ALICANTE",
+    "PALMA DE MALLORCA",
+    "LAS PALMAS",
+    "TENERIFE SOUTH",
+    "SEVILLE",
+    "MALTA",
+    "DUBLIN",
+    "AMSTERDAM",
+    "PARIS (CHARLES DE GAULLE)",
+    "NEW YORK (JFK)",
+    "DUBAI",
+    "INDIANAPOLIS",
+    "STANSTED",
+    "JERSEY",
+]
+AIRLINE_NAMES = [
+    "RYANAIR",
+    "EASYJET",
+    "BRITISH AIRWAYS PLC",
+    "FLYBE LTD",
+    "JET2.COM LTD",
+    "VIRGIN ATLANTIC AIRWAYS LTD",
+    "TUI AIRWAYS LTD",
+    "AER LINGUS",
+    "LOGANAIR LTD",
+    "WIZZ AIR",
+]
+MONTH_ABBREVIATIONS = [
+    "Jan", "Feb", "Mar", "Apr", "May", "Jun",
+    "Jul", "Aug", "Sep", "Oct", "Nov", "Dec",
+]
+
+
+class FakeFastStatsError(Exception):
+    """Raised for a request the stand-in can't answer, with its HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class FakeVariable:
+    """Variable in the synthetic system, holding one value per record of its table.
+
+    Selector-like variables ('Selector', 'Date' and 'CombinedCategories' kinds)
+    hold an index into 'codes'; 'Numeric' and 'Text' variables hold the values.
+    """
+
+    def __init__(self, name, description, table, kind, values, codes=None, descs=None):
+        self.name = name
+        self.description = description
+        self.table = table
+        self.kind = kind
+        self.values = values
+        self.codes = codes
+        self.descs = descs if descs is not None else codes
+        self.code_index = {code: i for i, code in enumerate(codes or [])}
+
+
+class FlightRouteData:
+    """Synthetic Flight Delays system: reporting airports with child flight routes.
+
+    Each flight route picks a reporting airport, destination, airline and month,
+    with a skewed distribution so some are much more common than others
+    (as in the real data, and so that top N filters mean something).
+    """
+
+    def __init__(
+        self,
+        n_routes=100000,
+        n_airports=20,
+        n_destinations=400,
+        n_airlines=100,
+        first_year=1996,
+        last_year=2019,
+        seed=0,
+    ):
+        rng = np.random.default_rng(seed)
+        self.n_routes = n_routes
+        self.first_year = first_year
+        self.last_year = last_year
+        self.n_months = (last_year - first_year + 1) * 12
+
+        self.airports = pad_names(REPORTING_AIRPORT_NAMES, "AIRPORT", n_airports)
+        self.destinations = pad_names(DESTINATION_NAMES, "DESTINATION", n_destinations)
+        self.airlines = pad_names(AIRLINE_NAMES, "AIRLINE", n_airlines)
+        self.sizes = {AIRPORTS_TABLE: n_airports, ROUTES_TABLE: n_routes}
+
+        airport_lat = rng.uniform(49.9, 58.5, n_airports).round(4)
+        airport_lon = rng.uniform(-6.0, 1.8, n_airports).round(4)
+        destination_lat = rng.uniform(-45.0, 70.0, n_destinations).round(4)
+        destination_lon = rng.uniform(-170.0, 170.0, n_destinations).round(4)
+
+        # Each route's parent record, which relates it to the airports table
+        self.route_airport = skewed_choice(rng, n_airports, n_routes)
+        destination = skewed_choice(rng, n_destinations, n_routes)
+        airline = skewed_choice(rng, n_airlines, n_routes)
+        month = rng.integers(0, self.n_months, n_routes)
+
+        month_codes = [
+            f"{first_year + m // 12}{m % 12 + 1:02d}01" for m in range(self.n_months)
+        ]
+        month_descs = [
+            f"{MONTH_ABBREVIATIONS[m % 12]} {first_year + m // 12}"
+            for m in range(self.n_months)
+        ]
+        year_codes = [str(year) for year in range(first_year, last_year + 1)]
+        route_names = np.array(
+            [[f"{a.title()} - {d.title()}" for d in self.destinations] for a in self.airports],
+            dtype=object,
+        )
+
+        variables = [
+            FakeVariable(
+                "reRepor1", "Reporting Airport", AIRPORTS_TABLE, "Selector",
+                np.arange(n_airports), self.airports,
+            ),
+            FakeVariable(
+                "AiLatit1", "Reporting Airport Latitude", AIRPORTS_TABLE, "Numeric",
+                airport_lat,
+            ),
+            FakeVariable(
+                "AiLongi1", "Reporting Airport Longitude", AIRPORTS_TABLE, "Numeric",
+                airport_lon,
+            ),
+            FakeVariable(
+                "flReport", "Reporting Period", ROUTES_TABLE, "Date",
+                month, month_codes, month_descs,
+            ),
+            FakeVariable(
+                "fl1FOVRG", "Reporting Period Year", ROUTES_TABLE, "CombinedCategories",
+                month // 12, year_codes,
+            ),
+            FakeVariable(
+                "flAirlin", "Airline Name", ROUTES_TABLE, "Selector",
+                airline, self.airlines,
+            ),
+            FakeVariable(
+                "flOrigi1", "Origin Destination", ROUTES_TABLE, "Selector",
+                destination, self.destinations,
+            ),
+            FakeVariable(
+                "AiLatitu", "Origin Airport Latitude", ROUTES_TABLE, "Numeric",
+                destination_lat[destination],
+            ),
+            FakeVariable(
+                "AiLongit", "Origin Airport Longitude", ROUTES_TABLE, "Numeric",
+                destination_lon[destination],
+            ),
+            FakeVariable(
+                "fl1H1F70", "Flight Route Name", ROUTES_TABLE, "Text",
+                RouteNames(route_names, self.route_airport, destination),
+            ),
+        ]
+        self.variables = {variable.name: variable for variable in variables}
+
+    def values_on(self, variable, table):
+        """Return variable's value for each record of 'table' (its own or a child)."""
+        if variable.table == table:
+            return variable.values
+        if variable.table == AIRPORTS_TABLE and table == ROUTES_TABLE:
+            return variable.values[self.route_airport]
+        raise FakeFastStatsError(
+            400, f"Variable '{variable.name}' can't be used on the '{table}' table"
+        )
+
+    def change_table(self, mask, from_table, to_table):
+        """Convert records mask between tables, as an ANY or THE clause would."""
+        if from_table == to_table:
+            return mask
+        if from_table == ROUTES_TABLE:  # ANY: airports with a selected route
+            return np.bincount(
+                self.route_airport[mask], minlength=self.sizes[AIRPORTS_TABLE]
+            ) > 0
+        return mask[self.route_airport]  # THE: routes of a selected airport
+
+    def select(self, selection):
+        """Return boolean mask of the records chosen by selection dict."""
+        table = selection["tableName"]
+        rule = selection.get("rule")
+        if rule is None or rule.get("clause") is None:
+            mask = np.ones(self.sizes[table], dtype=bool)
+        else:
+            clause_table, mask = self.evaluate_clause(rule["clause"])
+            mask = self.change_table(mask, clause_table, table)
+
+        top_n = selection.get("topN")
+        if top_n and top_n.get("groupingVariableName"):
+            grouping = self.variables[top_n["groupingVariableName"]]
+            groups = self.values_on(grouping, table)
+            if grouping.kind == "Text":
+                groups = groups.to_array()
+            mask = first_n_per_group(mask, groups, top_n["groupMax"])
+        elif top_n:
+            raise FakeFastStatsError(400, "Only N per variable limits are supported")
+        return mask
+
+    def evaluate_clause(self, clause):
+        """Return (table name, records mask) of clause dict."""
+        if clause.get("criteria"):
+            criteria = clause["criteria"]
+            table = criteria["tableName"]
+            variable = self.variables[criteria["variableName"]]
+            values = [
+                value
+                for value_rule in criteria.get("valueRules") or []
+                for value in value_rule["listRule"]["list"].split("\t")
+            ]
+            mask = self.match(variable, table, values)
+            return table, mask if criteria.get("include", True) else ~mask
+
+        if clause.get("logic"):
+            logic = clause["logic"]
+            table = logic["tableName"]
+            operation = logic["operation"].upper()
+            masks = [
+                self.change_table(operand_mask, operand_table, table)
+                for operand_table, operand_mask in map(
+                    self.evaluate_clause, logic["operands"]
+                )
+            ]
+            if operation == "AND":
+                return table, np.logical_and.reduce(masks)
+            if operation == "OR":
+                return table, np.logical_or.reduce(masks)
+            if operation == "NOT":
+                return table, ~masks[0]
+            if operation in ("ANY", "THE"):
+                return table, masks[0]
+            raise FakeFastStatsError(400, f"Unsupported logic operation '{operation}'")
+
+        if clause.get("subSelection"):
+            selection = clause["subSelection"]["selection"]
+            return selection["tableName"], self.select(selection)
+
+        raise FakeFastStatsError(400, "Empty clause")
+
+    def match(self, variable, table, values):
+        """Return mask of records where variable matches any of 'values'."""
+        record_values = self.values_on(variable, table)
+        if variable.kind == "Numeric":
+            mask = np.zeros(len(record_values), dtype=bool)
+            for value in values:
+                mask |= numeric_match(record_values, value)
+            return mask
+        if variable.kind == "Text":
+            return np.isin(record_values.to_array(), values)
+        indexes = [variable.code_index[code] for code in values if code in variable.code_index]
+        return np.isin(record_values, indexes)
+
+    def cube(self, cube):
+        """Return CubeResult dict of cube request dict, counting records per cell."""
+        table = cube["resolveTableName"]
+        selection = cube["baseQuery"]["selection"]
+        mask = self.change_table(self.select(selection), selection["tableName"], table)
+        for measure in cube["measures"]:
+            if measure["function"] != "Count" or measure["resolveTableName"] != table:
+                raise FakeFastStatsError(400, "Only record counts of the cube table are supported")
+
+        dimension_results = []
+        bins = []
+        for dimension in cube["dimensions"]:
+            codes, descs, record_bins = self.dimension_bins(dimension, table)
+            codes, descs, record_bins = self.filter_categories(
+                dimension, table, mask, codes, descs, record_bins
+            )
+            dimension_results.append(
+                {
+                    "id": dimension["id"],
+                    "headerCodes": "\t".join(codes + ["iTOTAL"]),
+                    "headerDescriptions": "\t".join(descs + ["Total"]),
+                }
+            )
+            bins.append((record_bins, len(codes)))
+
+        # Records in a left out category aren't counted in any cell
+        in_cube = mask & np.logical_and.reduce([record_bins >= 0 for record_bins, __ in bins])
+        bins = [(record_bins[in_cube], size) for record_bins, size in bins]
+
+        # Cells are laid out with the last dimension given varying slowest
+        bins.reverse()
+        shape = tuple(size for __, size in bins)
+        counts = np.bincount(
+            np.ravel_multi_index([record_bins for record_bins, __ in bins], shape),
+            minlength=int(np.prod(shape)),
+        ).reshape(shape)
+        for axis in range(counts.ndim):
+            counts = np.concatenate([counts, counts.sum(axis=axis, keepdims=True)], axis=axis)
+        rows = ["\t".join(row) for row in counts.reshape(len(counts), -1).astype(str)]
+
+        return {
+            **self.result_header(),
+            "dimensionResults": dimension_results,
+            "measureResults": [
+                {"id": measure["id"], "rows": rows, "cells": []} for measure in cube["measures"]
+            ],
+            "counts": self.counts(mask, table),
+        }
+
+    def dimension_bins(self, dimension, table):
+        """Return header codes and descriptions and each record's cube bin for dimension.
+
+        Bin 0 is the unclassified category, as FastStats lists it first.
+        """
+        variable = self.variables[dimension["variableName"]]
+        record_values = self.values_on(variable, table)
+        if dimension["type"] == "Selector":
+            return [""] + variable.codes, ["Unclassified"] + variable.descs, record_values + 1
+        if dimension["type"] == "DateBand" and variable.kind == "Date":
+            banding = dimension["banding"]["type"]
+            if banding == "Years":
+                codes = [str(year) for year in range(self.first_year, self.last_year + 1)]
+                return ["0000"] + codes, ["Unclassified"] + codes, record_values // 12 + 1
+            if banding == "Months":
+                codes = [code[:6] for code in variable.codes]
+                return ["000000"] + codes, ["Unclassified"] + variable.descs, record_values + 1
+        raise FakeFastStatsError(400, f"Unsupported dimension {dimension}")
+
+    def filter_categories(self, dimension, table, mask, codes, descs, record_bins):
+        """Return dimension's categories after its category filters, and each record's bin.
+
+        Records in a category that is left out get bin -1.
+        """
+        keep = np.ones(len(codes), dtype=bool)
+        if dimension.get("omitUnclassified"):
+            keep[0] = False
+        if dimension.get("filterQuery"):
+            selection = dimension["filterQuery"]["selection"]
+            filter_mask = self.change_table(self.select(selection), selection["tableName"], table)
+            keep &= np.bincount(record_bins[filter_mask], minlength=len(codes)) > 0
+
+        counts = np.bincount(record_bins[mask], minlength=len(codes))
+        if dimension.get("minimumCategoryCount"):
+            keep &= counts >= dimension["minimumCategoryCount"]
+        if dimension.get("topNCategoryCount"):
+            # Most records first, ties in header order; kept in header order
+            ranked = np.flatnonzero(keep)[np.argsort(-counts[keep], kind="stable")]
+            keep[:] = False
+            keep[ranked[: dimension["topNCategoryCount"]]] = True
+
+        new_bins = np.where(keep, np.cumsum(keep) - 1, -1)
+        return (
+            [code for code, kept in zip(codes, keep) if kept],
+            [desc for desc, kept in zip(descs, keep) if kept],
+            new_bins[record_bins],
+        )
+
+    def export(self, export):
+        """Return ExportResult dict of export request dict, with its first rows."""
+        table = export["resolveTableName"]
+        selection = export["baseQuery"]["selection"]
+        mask = self.change_table(self.select(selection), selection["tableName"], table)
+        records = np.flatnonzero(mask)[: export.get("maximumNumberOfRowsToBrowse", 1000)]
+
+        columns = [
+            self.column_strings(self.variables[column["variableName"]], table, records)
+            for column in export["columns"]
+        ]
+        lines = ["\t".join(values) for values in zip(*columns)]
+        return {
+            **self.result_header(),
+            "rows": [{"codes": line, "descriptions": line} for line in lines],
+            "counts": self.counts(mask, table),
+        }
+
+    def column_strings(self, variable, table, records):
+        """Return variable's values for 'records' of 'table' formatted as FastStats does."""
+        record_values = self.values_on(variable, table)[records]
+        if variable.kind == "Numeric":
+            return [f"{value:12.6f}" for value in record_values.tolist()]
+        if variable.kind == "Text":
+            return record_values.to_array().tolist()
+        if variable.kind == "Date":
+            return [
+                f"01-{m % 12 + 1:02d}-{self.first_year + m // 12}"
+                for m in record_values.tolist()
+            ]
+        return [variable.descs[i] for i in record_values.tolist()]
+
+    def query_count(self, query):
+        """Return QueryResult dict with counts of the query's selection."""
+        selection = query["selection"]
+        mask = self.select(selection)
+        return {**self.result_header(), "counts": self.counts(mask, selection["tableName"])}
+
+    def counts(self, mask, table):
+        """Return count of selected records on 'table' and on its ancestor table."""
+        counts = [{"tableName": table, "countValue": int(mask.sum())}]
+        if table == ROUTES_TABLE:
+            airports = self.change_table(mask, ROUTES_TABLE, AIRPORTS_TABLE)
+            counts.append({"tableName": AIRPORTS_TABLE, "countValue": int(airports.sum())})
+        return counts
+
+    def result_header(self):
+        return {"title": "", "notes": "", "ranSuccessfully": True, "systemName": "Flight Delays"}
+
+    def system_info(self, system):
+        return {
+            "name": system,
+            "description": "Flight Delays (synthetic)",
+            "viewName": system,
+            "fastStatsBuildDate": f"{self.last_year + 1}-01-01T00:00:00",
+            "dateSettings": {
+                "useIso8601WeekOfYear": True,
+                "businessYearStartDD": 1,
+                "businessYearStartMM": 1,
+            },
+        }
+
+    def tables(self):
+        return paged(
+            [
+                table_summary(AIRPORTS_TABLE, "Reporting Airports", self.sizes[AIRPORTS_TABLE], ""),
+                table_summary(ROUTES_TABLE, "Flight Routes", self.sizes[ROUTES_TABLE], AIRPORTS_TABLE),
+            ]
+        )
+
+    def variable_summaries(self):
+        return [self.variable_summary(variable) for variable in self.variables.values()]
+
+    def variable_summary(self, variable):
+        summary = {
+            "name": variable.name,
+            "description": variable.description,
+            "type": "Selector" if variable.codes is not None else variable.kind,
+            "folderName": variable.table,
+            "tableName": variable.table,
+            "isSelectable": True,
+            "isBrowsable": True,
+            "isExportable": True,
+            "isVirtual": variable.name.startswith("fl1"),
+        }
+        if variable.kind == "Numeric":
+            summary["numericInfo"] = {
+                "minimum": float(variable.values.min()),
+                "maximum": float(variable.values.max()),
+                "isCurrency": False,
+                "currencyLocale": "",
+                "currencySymbol": "",
+            }
+        elif variable.kind == "Text":
+            summary["textInfo"] = {"maximumTextLength": 255}
+        else:
+            summary["selectorInfo"] = {
+                "selectorType": "SingleValue",
+                "subType": "Date" if variable.kind == "Date" else "Categorical",
+                "varCodeOrder": "Nominal",
+                "numberOfCodes": len(variable.codes),
+                "codeLength": max(len(code) for code in variable.codes),
+                "minimumVarCodeCount": 1,
+                "maximumVarCodeCount": 1,
+                "minimumDate": f"{self.first_year}-01-01T00:00:00",
+                "maximumDate": f"{self.last_year}-12-01T00:00:00",
+                "combinedFromVariableName": (
+                    "flReport" if variable.kind == "CombinedCategories" else None
+                ),
+            }
+        return summary
+
+
+class RouteNames:
+    """Flight Route Name values, looked up from each route's airport and destination."""
+
+    def __init__(self, names, route_airport, route_destination):
+        self.names = names  # airport x destination array of route names
+        self.route_airport = route_airport
+        self.route_destination = route_destination
+
+    def __getitem__(self, records):
+        return RouteNames(
+            self.names, self.route_airport[records], self.route_destination[records]
+        )
+
+    def to_array(self):
+        return self.names[self.route_airport, self.route_destination]
+
+
+class FakeFastStatsServer(ThreadingHTTPServer):
+    """HTTP server answering FastStats API requests from a FlightRouteData.
+
+    Every response is delayed by 'latency' seconds plus up to 'jitter' more,
+    to stand in for the network and query time of a real FastStats system.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, data, latency=0.0, jitter=0.0, verbose=False):
+        super().__init__(address, FakeFastStatsHandler)
+        self.data = data
+        self.latency = latency
+        self.jitter = jitter
+        self.verbose = verbose
+        self.access_tokens = {}  # access token -> session ID
+        self.request_counts = collections.Counter()  # endpoint name -> requests answered
+        self.connections_accepted = 0
+        self.lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections_accepted += 1
+        super().process_request(request, client_address)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class FakeFastStatsHandler(BaseHTTPRequestHandler):
+    """Routes API requests to the server's FlightRouteData."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are sent separately, which would wait on delayed ACKs
+    # when a kept-alive connection is reused
+    disable_nagle_algorithm = True
+
+    ROUTES = [
+        ("POST", r"/(?P<data_view>[^/]+)/Sessions/SimpleLogin$", "simple_login"),
+        ("DELETE", r"/(?P<data_view>[^/]+)/Sessions/(?P<session_id>[^/]+)$", "logout"),
+        ("GET", r"/(?P<data_view>[^/]+)/FastStatsSystems/(?P<system>[^/]+)$", "system_info"),
+        ("GET", r"/(?P<data_view>[^/]+)/FastStatsSystems/(?P<system>[^/]+)/Tables$", "tables"),
+        ("GET", r"/(?P<data_view>[^/]+)/FastStatsSystems/(?P<system>[^/]+)/Variables$", "variables"),
+        ("POST", r"/(?P<data_view>[^/]+)/Cubes/(?P<system>[^/]+)/CalculateSync$", "cube"),
+        ("POST", r"/(?P<data_view>[^/]+)/Exports/(?P<system>[^/]+)/ExportSync$", "export"),
+        ("POST", r"/(?P<data_view>[^/]+)/Queries/(?P<system>[^/]+)/CountSync$", "count"),
+    ]
+
+    def do_GET(self):
+        self.handle_api_request("GET")
+
+    def do_POST(self):
+        self.handle_api_request("POST")
+
+    def do_DELETE(self):
+        self.handle_api_request("DELETE")
+
+    def handle_api_request(self, method):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            for route_method, pattern, name in self.ROUTES:
+                match = re.search(pattern, url.path)
+                if route_method == method and match:
+                    if name != "simple_login":
+                        self.check_access_token()
+                    with self.server.lock:
+                        self.server.request_counts[name] += 1
+                    params = {key: unquote(value) for key, value in match.groupdict().items()}
+                    status, result = getattr(self, name)(body, url.query, **params)
+                    break
+            else:
+                raise FakeFastStatsError(404, f"No endpoint for {method} {url.path}")
+        except FakeFastStatsError as exc:
+            status, result = exc.status, {"message": str(exc)}
+        except (KeyError, ValueError) as exc:
+            status, result = 400, {"message": f"Bad request: {exc!r}"}
+
+        server = self.server
+        time.sleep(server.latency + random.uniform(0, server.jitter))
+        self.send_json(status, result)
+
+    def check_access_token(self):
+        scheme, __, token = (self.headers.get("Authorization") or "").partition(" ")
+        with self.server.lock:
+            if scheme != "Bearer" or token not in self.server.access_tokens:
+                raise FakeFastStatsError(401, "Not logged in")
+
+    def send_json(self, status, result):
+        payload = b"" if result is None else json.dumps(result).encode("utf-8")
+        self.send_response(status)
+        if payload:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def simple_login(self, body, query, data_view):
+        form = parse_qs(body.decode("utf-8"))
+        username = form.get("UserLogin", [""])[0]
+        if not username:
+            raise FakeFastStatsError(400, "UserLogin is required")
+        session_id = uuid.uuid4().hex
+        access_token = uuid.uuid4().hex
+        with self.server.lock:
+            self.server.access_tokens[access_token] = session_id
+        return 200, {
+            "accessToken": access_token,
+            "sessionId": session_id,
+            "lastLogin": datetime.datetime.now().isoformat(timespec="seconds"),
+            "user": {
+                "id": 1,
+                "username": username,
+                "firstname": username.title(),
+                "surname": "Tester",
+                "emailAddress": f"{username}@example.com",
+            },
+            "licence": {
+                "audienceSelection": True,
+                "audiencePreview": True,
+                "export": True,
+                "advancedQuery": True,
+                "cube": True,
+                "profile": True,
+                "dashboards": True,
+                "dashboardsPareto": True,
+            },
+        }
+
+    def logout(self, body, query, data_view, session_id):
+        with self.server.lock:
+            for token, token_session_id in list(self.server.access_tokens.items()):
+                if token_session_id == session_id:
+                    del self.server.access_tokens[token]
+        return 204, None
+
+    def system_info(self, body, query, data_view, system):
+        return 200, self.server.data.system_info(system)
+
+    def tables(self, body, query, data_view, system):
+        return 200, self.server.data.tables()
+
+    def variables(self, body, query, data_view, system):
+        params = parse_qs(query)
+        offset = int(params.get("offset", ["0"])[0])
+        count = int(params.get("count", ["1000"])[0])
+        return 200, paged(self.server.data.variable_summaries(), offset, count)
+
+    def cube(self, body, query, data_view, system):
+        return 200, self.server.data.cube(json.loads(body))
+
+    def export(self, body, query, data_view, system):
+        return 200, self.server.data.export(json.loads(body))
+
+    def count(self, body, query, data_view, system):
+        return 200, self.server.data.query_count(json.loads(body))
+
+
+def pad_names(names, prefix, n):
+    """Return 'n' names, the real-looking ones first and then numbered ones."""
+    return names[:n] + [f"{prefix} {i:04d}" for i in range(len(names), n)]
+
+
+def skewed_choice(rng, n_categories, size):
+    """Return 'size' picks from range(n_categories), with lower numbers more likely."""
+    weights = 1 / np.arange(1, n_categories + 1)
+    return rng.choice(n_categories, size=size, p=weights / weights.sum())
+
+
+def first_n_per_group(mask, groups, n):
+    """Return mask keeping only the first 'n' selected records for each group value."""
+    records = np.flatnonzero(mask)
+    order = np.argsort(groups[records], kind="stable")
+    sorted_groups = groups[records][order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    limited = np.zeros_like(mask)
+    limited[records[order[rank < n]]] = True
+    return limited
+
+
+def numeric_match(values, rule):
+    """Return mask of numeric 'values' matching a FastStats rule like '>=-90' or '3'."""
+    for operator, compare in (
+        (">=", np.greater_equal),
+        ("<=", np.less_equal),
+        (">", np.greater),
+        ("<", np.less),
+    ):
+        if rule.startswith(operator):
+            return compare(values, float(rule[len(operator):]))
+    return values == float(rule)
+
+
+def table_summary(name, plural, total_records, parent_table):
+    return {
+        "name": name,
+        "singularDisplayName": name,
+        "pluralDisplayName": plural,
+        "isDefaultTable": parent_table == "",
+        "isPeopleTable": False,
+        "totalRecords": total_records,
+        "childRelationshipName": "",
+        "parentRelationshipName": "",
+        "hasChildTables": parent_table == "",
+        "parentTable": parent_table,
+    }
+
+
+def paged(items, offset=0, count=None):
+    """Return PagedResults dict of 'count' items from 'offset'."""
+    page = items[offset:] if count is None else items[offset:offset + count]
+    return {"offset": offset, "count": len(page), "totalCount": len(items), "list": page}
+
+
+def start_server(host="127.0.0.1", port=0, latency=0.0, jitter=0.0, **data_options):
+    """Start a stand-in server in a background thread, returning the server.
+
+    'data_options' are passed to FlightRouteData. Use port 0 to pick a free port,
+    and 'server.url' as the base URL to log in to. Call 'server.shutdown()' to stop.
+    """
+    server = FakeFastStatsServer(
+        (host, port), FlightRouteData(**data_options), latency=latency, jitter=jitter
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--routes", type=int, default=100000)
+    parser.add_argument("--airports", type=int, default=20)
+    parser.add_argument("--destinations", type=int, default=400)
+    parser.add_argument("--airlines", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds to delay every response by")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="up to this many more seconds of random delay")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    data = FlightRouteData(
+        n_routes=args.routes,
+        n_airports=args.airports,
+        n_destinations=args.destinations,
+        n_airlines=args.airlines,
+        seed=args.seed,
+    )
+    server = FakeFastStatsServer(
+        (args.host, args.port), data, args.latency, args.jitter, args.verbose
+    )
+    print(f"Serving {args.routes} synthetic flight routes at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
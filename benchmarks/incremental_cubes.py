@@ -0,0 +1,95 @@
+"""Compare fetching whole period cubes with refreshing their yearly partitions.
+
+For each cube this times a full fetch of the whole reporting history (as the
+cube cache does after every data load), the first load of its yearly
+partitions, a repeat request (served from the combined cube) and a refresh
+after FastStats reports a new max_date, which only fetches the latest year.
+Cubes come from the stand-in FastStats server.
+"""
+import argparse
+import datetime
+import os
+import time
+
+from .common import print_table, setup_django, use_temporary_cache_dirs
+from .pipelines import start_stand_in_server
+
+
+def time_period_cube(session, dimension, selection, incremental):
+    """Return seconds to get the all years cube, and the number of years fetched."""
+    from django.conf import settings
+
+    from example_app.cube_cache import cube_store
+    from example_app.cube_partitions import get_period_cube
+
+    if not incremental:
+        cube_store.clear()
+    settings.INCREMENTAL_CUBES = incremental
+    n_partitions = count_partitions()
+    start = time.perf_counter()
+    get_period_cube(session, dimension, selection).to_df()
+    seconds = time.perf_counter() - start
+    return seconds, count_partitions() - n_partitions
+
+
+def count_partitions():
+    """Return number of yearly partitions on disk."""
+    from example_app.cube_partitions import partition_store
+
+    try:
+        return len(os.listdir(partition_store.directory))
+    except FileNotFoundError:
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--routes", type=int, nargs="+", default=[100000, 1000000])
+    args = parser.parse_args()
+
+    setup_django()
+    use_temporary_cache_dirs()
+    from apteco.session import login_with_password
+
+    from example_app.cube_partitions import partition_store
+    from example_app.fs_var_names import (
+        AIRLINE_NAME_CODE,
+        ORIGIN_DESTINATION_CODE,
+        REPORTING_PERIOD_CODE,
+    )
+    from example_app.query_plan import PlannedDimension, get_nonzero_dimension
+
+    rows = []
+    for n_routes in args.routes:
+        process, url = start_stand_in_server(n_routes, latency=0.0)
+        try:
+            session = login_with_password(url, "benchmark", "Flight Delays", "benchmark", "")
+            routes = session.tables["Flight Route"]
+            reporting_period = session.variables[REPORTING_PERIOD_CODE]
+            cases = [
+                ("airlines", PlannedDimension(routes[AIRLINE_NAME_CODE]), None),
+                (
+                    "Ryanair destinations",
+                    get_nonzero_dimension(routes[ORIGIN_DESTINATION_CODE]),
+                    routes[AIRLINE_NAME_CODE] == "RYANAIR",
+                ),
+            ]
+            for name, dimension, selection in cases:
+                partition_store.clear()
+                max_date = reporting_period.max_date
+                for fetch in ("full", "first load", "repeat", "refresh"):
+                    if fetch == "refresh":
+                        reporting_period.max_date += datetime.timedelta(days=1)
+                    incremental = fetch != "full"
+                    seconds, fetched = time_period_cube(session, dimension, selection, incremental)
+                    fetched = fetched if incremental else "all"
+                    rows.append((n_routes, name, fetch, fetched, f"{seconds * 1000:.1f}"))
+                reporting_period.max_date = max_date
+        finally:
+            process.terminate()
+            process.wait()
+    print_table(["routes", "cube", "fetch", "years fetched", "ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
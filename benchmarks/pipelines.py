@@ -0,0 +1,269 @@
+"""End-to-end benchmarks of the four example pipelines against the stand-in server.
+
+Each pipeline is run stage by stage (FastStats queries to DataFrame,
+then DataFrame to chart HTML) with empty caches, for each data size.
+For every stage this reports the best wall time, the peak memory allocated
+by Python (from tracemalloc), the process's peak resident set size so far,
+and the size of any HTML produced.
+
+Results can be saved as a JSON baseline and later runs compared against it:
+`python -m benchmarks.pipelines --save benchmarks/baselines/pipelines.json`
+`python -m benchmarks.pipelines --compare benchmarks/baselines/pipelines.json`
+A comparison exits with status 1 if any stage got slower, or allocated more
+or produced more HTML, by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from .common import peak_rss_bytes, print_table, setup_django, use_temporary_cache_dirs
+
+COMPARED_METRICS = ["seconds", "alloc_peak_bytes", "html_bytes"]
+
+
+def get_pipelines():
+    """Return mapping of pipeline name to its stages, as (name, function) pairs.
+
+    Each stage function takes the session and the previous stage's result.
+    Chart functions are called through '__wrapped__' to skip the render cache,
+    with the arguments the views use.
+    """
+    from example_app.example_four_code import (
+        get_example_four_dataframe,
+        make_example_four_map,
+    )
+    from example_app.example_one_code import get_example_one_count
+    from example_app.example_three_code import (
+        get_example_three_dataframe,
+        make_example_three_map,
+    )
+    from example_app.example_two_code import (
+        get_example_two_dataframe,
+        make_example_two_graph,
+    )
+    from example_app.fs_var_names import AIRLINE_NAME_CODE
+
+    return {
+        "example_one": [
+            ("count", lambda session, __: get_example_one_count(session, "HEATHROW", "MALAGA")),
+        ],
+        "example_two": [
+            (
+                "dataframe",
+                lambda session, __: get_example_two_dataframe(
+                    session, AIRLINE_NAME_CODE, None, 0
+                ),
+            ),
+            (
+                "graph",
+                lambda __, df: make_example_two_graph.__wrapped__(
+                    df, "Airline Name", None, validate=False
+                ),
+            ),
+        ],
+        "example_three": [
+            ("dataframe", lambda session, __: get_example_three_dataframe(session, "HEATHROW")),
+            ("map", lambda __, df: make_example_three_map.__wrapped__(df)),
+        ],
+        "example_four": [
+            (
+                "dataframe",
+                lambda session, __: get_example_four_dataframe(session, "RYANAIR", None, None),
+            ),
+            ("map", lambda __, df: make_example_four_map.__wrapped__(df)),
+        ],
+    }
+
+
+def clear_caches():
+    """Empty every cache the pipelines read from, so each run starts cold."""
+    from example_app import (
+        airport_coordinates,
+        cube_cache,
+        cube_partitions,
+        render_cache,
+        route_counts,
+    )
+
+    cube_cache.cube_store.clear()
+    cube_partitions.partition_store.clear()
+    airport_coordinates.coordinate_store.clear()
+    with airport_coordinates._lock:
+        airport_coordinates._indexes.clear()
+    with route_counts._lock:
+        route_counts.count_store.clear()
+        route_counts.code_store.clear()
+        route_counts._indexes.clear()
+    render_cache.memory_store.clear()
+    render_cache.disk_store.clear()
+
+
+def run_pipeline(session, stages, repeat):
+    """Return a result dict per stage from 'repeat' timed runs and one traced run."""
+    best_seconds = [float("inf")] * len(stages)
+    for __ in range(repeat):
+        clear_caches()
+        result = None
+        for i, (__, stage) in enumerate(stages):
+            start = time.perf_counter()
+            result = stage(session, result)
+            best_seconds[i] = min(best_seconds[i], time.perf_counter() - start)
+
+    # tracemalloc slows everything down, so allocations get a run of their own
+    clear_caches()
+    results = []
+    result = None
+    for (name, stage), seconds in zip(stages, best_seconds):
+        tracemalloc.start()
+        result = stage(session, result)
+        __, alloc_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results.append(
+            {
+                "stage": name,
+                "seconds": seconds,
+                "alloc_peak_bytes": alloc_peak,
+                "peak_rss_bytes": peak_rss_bytes(),
+                "html_bytes": len(result.encode("utf-8")) if isinstance(result, str) else None,
+            }
+        )
+    return results
+
+
+def start_stand_in_server(n_routes, latency):
+    """Start the stand-in server in its own process, returning (process, URL).
+
+    Running it separately keeps its data out of this process's memory figures.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    command = [
+        sys.executable, "-m", "benchmarks.fake_faststats",
+        "--port", str(port), "--routes", str(n_routes), "--latency", str(latency),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("Stand-in FastStats server failed to start")
+            time.sleep(0.1)
+
+
+def run_benchmarks(route_counts, pipeline_names, repeat, latency):
+    from apteco.session import login_with_password
+
+    pipelines = get_pipelines()
+    results = []
+    for n_routes in route_counts:
+        process, url = start_stand_in_server(n_routes, latency)
+        try:
+            session = login_with_password(url, "benchmark", "Flight Delays", "benchmark", "")
+            for name in pipeline_names:
+                for stage_result in run_pipeline(session, pipelines[name], repeat):
+                    results.append({"pipeline": name, "routes": n_routes, **stage_result})
+        finally:
+            process.terminate()
+            process.wait()
+    return results
+
+
+def find_regressions(results, baseline_results, tolerance):
+    """Return descriptions of metrics over 'tolerance' (a fraction) worse than baseline."""
+    baseline = {
+        (r["pipeline"], r["routes"], r["stage"]): r for r in baseline_results
+    }
+    regressions = []
+    for result in results:
+        key = (result["pipeline"], result["routes"], result["stage"])
+        if key not in baseline:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = baseline[key][metric], result[metric]
+            if old and new is not None and new > old * (1 + tolerance):
+                regressions.append(
+                    f"{'/'.join(map(str, key))} {metric}: {old:.6g} -> {new:.6g}"
+                    f" (+{(new / old - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--routes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument(
+        "--pipelines",
+        nargs="+",
+        default=["example_one", "example_two", "example_three", "example_four"],
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds the stand-in server delays each response by")
+    parser.add_argument("--save", metavar="PATH", help="save results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare results with a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="fraction a metric may exceed its baseline by (default 0.25)")
+    args = parser.parse_args()
+
+    setup_django()
+    use_temporary_cache_dirs()
+    results = run_benchmarks(args.routes, args.pipelines, args.repeat, args.latency)
+
+    print_table(
+        ["pipeline", "routes", "stage", "ms", "alloc peak MB", "peak RSS MB", "html KB"],
+        [
+            (
+                r["pipeline"],
+                r["routes"],
+                r["stage"],
+                f"{r['seconds'] * 1000:.1f}",
+                f"{r['alloc_peak_bytes'] / 2 ** 20:.1f}",
+                f"{r['peak_rss_bytes'] / 2 ** 20:.0f}",
+                "" if r["html_bytes"] is None else f"{r['html_bytes'] / 1024:.0f}",
+            )
+            for r in results
+        ],
+    )
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as file:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "repeat": args.repeat,
+                    "latency": args.latency,
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = find_regressions(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}:")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
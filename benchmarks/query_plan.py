@@ -0,0 +1,149 @@
+"""Compare the cells FastStats sends for the example cubes, with and without planned filters.
+
+Without planning, each cube has every category of its dimensions (months of
+every year, every destination, every selector) and the view filters the rows
+in pandas. With planning, FastStats leaves out the categories the view would
+drop, and example two's top selectors are first ranked by a 1D cube, whose
+cells are counted too. Each cube is fetched from the stand-in FastStats
+server, bypassing the caches, and this reports the cells sent, the rows the
+view keeps and the best time for the queries plus decoding.
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from .common import print_table, setup_django, use_temporary_cache_dirs
+from .pipelines import start_stand_in_server
+
+
+def make_unplanned_cube(session, measure_var_code, selected_year, selection=None):
+    """Original implementation: every category, filtered afterwards in pandas."""
+    from example_app.fs_var_names import REPORTING_PERIOD_CODE
+    from example_app.typed_results import TypedCube
+
+    routes = session.tables["Flight Route"]
+    if selected_year is not None:
+        date_dim = routes[REPORTING_PERIOD_CODE].month
+    else:
+        date_dim = routes[REPORTING_PERIOD_CODE].year
+    dimensions = [session.variables[measure_var_code], date_dim]
+    return [TypedCube(dimensions, selection=selection, table=routes, session=session)]
+
+
+def make_top_n_cubes(session, measure_var_code, selected_year, limit, selection=None):
+    """Return the 1D cube ranking the top selectors and the 2D cube of just those."""
+    from example_app.query_plan import PlannedDimension, get_period_dimension
+    from example_app.typed_results import TypedCube, get_values_slice
+
+    routes = session.tables["Flight Route"]
+    measure_var = session.variables[measure_var_code]
+    ranking_dimension = PlannedDimension(measure_var)
+    ranking = TypedCube([ranking_dimension], selection=selection, table=routes, session=session)
+    values = get_values_slice(ranking_dimension)
+    totals = pd.Series(ranking._data[0][values], index=ranking._headers[0]["codes"][values])
+
+    top_rule = measure_var == totals.nlargest(limit).index.to_list()
+    dimensions = [
+        PlannedDimension(measure_var, filter_query=top_rule),
+        get_period_dimension(session, selected_year),
+    ]
+    query = top_rule if selection is None else selection & top_rule
+    return [ranking, TypedCube(dimensions, selection=query, table=routes, session=session)]
+
+
+def make_nonzero_cube(session, selected_year, selection):
+    """Return cube of the destinations with flight routes, as example four plans it."""
+    from example_app.fs_var_names import ORIGIN_DESTINATION_CODE
+    from example_app.query_plan import get_nonzero_dimension, get_period_dimension
+    from example_app.typed_results import TypedCube
+
+    routes = session.tables["Flight Route"]
+    dimensions = [
+        get_nonzero_dimension(routes[ORIGIN_DESTINATION_CODE]),
+        get_period_dimension(session, selected_year),
+    ]
+    return [TypedCube(dimensions, selection=selection, table=routes, session=session)]
+
+
+def get_cases(session):
+    """Return (name, make unplanned cubes, make planned cubes, make view's rows) per query."""
+    from example_app.example_four_code import get_example_four_dataframe
+    from example_app.example_two_code import get_example_two_dataframe
+    from example_app.fs_var_names import (
+        AIRLINE_NAME_CODE,
+        ORIGIN_DESTINATION_CODE,
+        REPORTING_PERIOD_CODE,
+        REPORTING_PERIOD_YEARS_CODE,
+    )
+
+    routes = session.tables["Flight Route"]
+    year = str(session.variables[REPORTING_PERIOD_CODE].max_date.year)
+    in_year = routes[REPORTING_PERIOD_YEARS_CODE] == year
+    ryanair_in_year = (routes[AIRLINE_NAME_CODE] == "RYANAIR") & in_year
+    return [
+        (
+            f"example two, top 10 airlines, {year}",
+            lambda: make_unplanned_cube(session, AIRLINE_NAME_CODE, year, in_year),
+            lambda: make_top_n_cubes(session, AIRLINE_NAME_CODE, year, 10, in_year),
+            lambda: get_example_two_dataframe(session, AIRLINE_NAME_CODE, year, 10),
+        ),
+        (
+            "example two, top 10 destinations, all years",
+            lambda: make_unplanned_cube(session, ORIGIN_DESTINATION_CODE, None),
+            lambda: make_top_n_cubes(session, ORIGIN_DESTINATION_CODE, None, 10),
+            lambda: get_example_two_dataframe(session, ORIGIN_DESTINATION_CODE, None, 10),
+        ),
+        (
+            f"example four, Ryanair, {year}",
+            lambda: make_unplanned_cube(session, ORIGIN_DESTINATION_CODE, year, ryanair_in_year),
+            lambda: make_nonzero_cube(session, year, ryanair_in_year),
+            lambda: get_example_four_dataframe(session, "RYANAIR", year),
+        ),
+    ]
+
+
+def measure(make_cubes, repeat):
+    """Return best seconds to fetch and decode the cubes, and the cells sent."""
+    from example_app.query_plan import count_cube_cells
+
+    best = float("inf")
+    for __ in range(repeat):
+        start = time.perf_counter()
+        cubes = make_cubes()
+        for cube in cubes:
+            cube.to_df()
+        best = min(best, time.perf_counter() - start)
+    return best, sum(count_cube_cells(cube) for cube in cubes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--routes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    use_temporary_cache_dirs()
+    from apteco.session import login_with_password
+
+    rows = []
+    for n_routes in args.routes:
+        process, url = start_stand_in_server(n_routes, latency=0.0)
+        try:
+            session = login_with_password(url, "benchmark", "Flight Delays", "benchmark", "")
+            for name, make_unplanned, make_planned, make_view_df in get_cases(session):
+                view_rows = len(make_view_df())
+                for plan, make_cubes in (("none", make_unplanned), ("planned", make_planned)):
+                    seconds, cells = measure(make_cubes, args.repeat)
+                    rows.append(
+                        (n_routes, name, plan, cells, view_rows, f"{seconds * 1000:.1f}")
+                    )
+        finally:
+            process.terminate()
+            process.wait()
+    print_table(["routes", "query", "plan", "cells sent", "view rows", "ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
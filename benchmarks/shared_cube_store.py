@@ -0,0 +1,118 @@
+"""Compare reading cached DataFrames from Parquet blobs and memory-mapped Arrow files.
+
+Each worker process reads the same cached DataFrames and holds them, as the
+co-ordinate indexes are held: cubes, and flat frames shaped like a datagrid.
+Parquet blobs are decoded into a private copy per worker, while Arrow files
+are memory-mapped, so their numeric columns stay in the page cache shared by
+every worker. Index levels and text columns are still built in each worker.
+Arrow entries are read as the views read them, through CachedCube.to_df().
+Anonymous (not file-backed) memory is read from /proc, so this only runs on Linux.
+"""
+import argparse
+import io
+import multiprocessing
+import time
+
+from .common import print_table, setup_django, use_temporary_cache_dirs
+from .synthetic import make_cube_df, make_example_three_df
+
+
+def read_parquet_entry(store, key):
+    """Original implementation: decode the Parquet blob stored against 'key'."""
+    import pandas as pd
+
+    return pd.read_parquet(io.BytesIO(store.get(key)))
+
+
+def read_cached_cube(store, key):
+    """Read entry stored against 'key' as the views do, as a cube's DataFrame."""
+    from example_app.cube_cache import CachedCube, read_dataframe
+
+    return CachedCube(read_dataframe(store, key)).to_df()
+
+
+def anonymous_bytes():
+    """Return memory of this process not backed by a file, which no other process can share."""
+    with open("/proc/self/smaps_rollup") as file:
+        for line in file:
+            if line.startswith("Anonymous:"):
+                return int(line.split()[1]) * 1024
+
+
+def hold_entries(read_entry, store, keys, results):
+    """Read and hold every entry, putting (seconds, anonymous bytes added) on 'results'."""
+    before = anonymous_bytes()
+    start = time.perf_counter()
+    held = [read_entry(store, key) for key in keys]
+    seconds = time.perf_counter() - start
+    results.put((seconds, anonymous_bytes() - before))
+    del held
+
+
+def run_workers(n_workers, read_entry, store, keys):
+    """Return mean read seconds and total anonymous bytes added over 'n_workers' processes."""
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    workers = [
+        context.Process(target=hold_entries, args=(read_entry, store, keys, results))
+        for __ in range(n_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    measurements = [results.get() for __ in workers]
+    for worker in workers:
+        worker.join()
+    seconds = sum(seconds for seconds, __ in measurements) / n_workers
+    return seconds, sum(added for __, added in measurements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=300000, help="Rows in each DataFrame")
+    parser.add_argument("--frames", type=int, default=4, help="DataFrames of each kind")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    setup_django()
+    use_temporary_cache_dirs()
+    from django.conf import settings
+
+    from example_app.cube_cache import cube_store, write_dataframe
+    from example_app.disk_cache import DiskCache
+
+    parquet_store = DiskCache(settings.CUBE_CACHE_DIR, cube_store.max_bytes, suffix=".parquet")
+    frames = [("cube", make_cube_df), ("datagrid", make_example_three_df)]
+    implementations = [
+        ("parquet", read_parquet_entry, parquet_store),
+        ("arrow mmap", read_cached_cube, cube_store),
+    ]
+    rows = []
+    for frame_name, make_df in frames:
+        keys = [f"{frame_name}{i}" for i in range(args.frames)]
+        for seed, key in enumerate(keys):
+            df = make_df(args.rows, seed=seed)
+            write_dataframe(cube_store, key, df)
+            with parquet_store.open_for_write(key) as file:
+                df.to_parquet(file, compression="zstd")
+        for n_workers in args.workers:
+            for name, read_entry, store in implementations:
+                seconds, added = run_workers(n_workers, read_entry, store, keys)
+                rows.append(
+                    (
+                        frame_name,
+                        n_workers,
+                        name,
+                        f"{seconds * 1000:.1f}",
+                        f"{added / 1024 ** 2:.1f}",
+                    )
+                )
+    print(f"{args.frames} DataFrames of {args.rows} rows")
+    print_table(
+        ["frames", "workers", "store", "read ms per worker", "unshared MB, all workers"], rows
+    )
+    print(f"Files: parquet {parquet_store.size() / 1024 ** 2:.1f} MB,", end=" ")
+    print(f"arrow {cube_store.size() / 1024 ** 2:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
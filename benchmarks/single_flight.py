@@ -0,0 +1,90 @@
+"""Compare FastStats queries sent when many users request the same chart together.
+
+Worker processes, each with several threads, all build example two's
+DataFrame at once with empty caches, as when a shared dashboard is opened.
+Without coalescing every request that misses the cube cache sends its own
+cube query. With it, one query is sent and the other requests wait for it.
+The stand-in FastStats server runs in this process and counts the queries.
+"""
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import print_table, setup_django, use_temporary_cache_dirs
+
+
+def coalesce_without_waiting(key, load, fetch):
+    """Original implementation: every caller that misses the cache queries FastStats."""
+    result = load()
+    return fetch() if result is None else result
+
+
+def request_charts(url, n_threads, coalescing, start):
+    """Build example two's DataFrame in 'n_threads' threads once 'start' is set."""
+    from apteco.session import login_with_password
+
+    from example_app import cube_cache
+    from example_app.example_two_code import get_example_two_dataframe
+    from example_app.fs_var_names import AIRLINE_NAME_CODE
+
+    if not coalescing:
+        cube_cache.coalesce = coalesce_without_waiting
+    session = login_with_password(url, "benchmark", "Flight Delays", "benchmark", "")
+    start.wait()
+    with ThreadPoolExecutor(n_threads) as executor:
+        for __ in range(n_threads):
+            executor.submit(get_example_two_dataframe, session, AIRLINE_NAME_CODE, None, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--routes", type=int, default=100000)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per request")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--threads", type=int, default=8, help="Requests in each process")
+    args = parser.parse_args()
+
+    setup_django()
+    use_temporary_cache_dirs()
+    from benchmarks.fake_faststats import start_server
+    from example_app.cube_cache import cube_store
+
+    server = start_server(n_routes=args.routes, latency=args.latency)
+    context = multiprocessing.get_context("fork")
+    rows = []
+    try:
+        for n_processes in args.processes:
+            for coalescing in (False, True):
+                cube_store.clear()
+                start = context.Event()
+                workers = [
+                    context.Process(
+                        target=request_charts, args=(server.url, args.threads, coalescing, start)
+                    )
+                    for __ in range(n_processes)
+                ]
+                for worker in workers:
+                    worker.start()
+                time.sleep(1)  # for every worker to log in
+                queries_before = server.request_counts["cube"]
+                started = time.perf_counter()
+                start.set()
+                for worker in workers:
+                    worker.join()
+                rows.append(
+                    (
+                        n_processes * args.threads,
+                        n_processes,
+                        "single flight" if coalescing else "none",
+                        server.request_counts["cube"] - queries_before,
+                        f"{time.perf_counter() - started:.2f}",
+                    )
+                )
+    finally:
+        server.shutdown()
+    print_table(["requests", "processes", "coalescing", "cube queries", "seconds"], rows)
+
+
+if __name__ == "__main__":
+    main()
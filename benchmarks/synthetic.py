@@ -0,0 +1,54 @@
+"""Synthetic data shaped like the FastStats results used by the examples."""
+import numpy as np
+import pandas as pd
+
+
+def make_example_three_df(n_routes, seed=0):
+    """Return datagrid-style DataFrame of 'n_routes' routes from one airport."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "Origin Airport Longitude": rng.uniform(-180, 180, n_routes),
+            "Origin Airport Latitude": rng.uniform(-60, 70, n_routes),
+            "Reporting Airport Longitude": np.full(n_routes, -0.461941),
+            "Reporting Airport Latitude": np.full(n_routes, 51.4706),
+            "Flight Route Name": [f"Heathrow - Destination {i}" for i in range(n_routes)],
+        }
+    )
+
+
+def make_example_two_df(n_selectors, n_years=23, seed=0):
+    """Return cube-style DataFrame of yearly flight routes for 'n_selectors' airlines."""
+    rng = np.random.default_rng(seed)
+    periods = pd.period_range("1997", periods=n_years, freq="Y")
+    names = [f"AIRLINE {i:05d}" for i in range(n_selectors)]
+    return pd.DataFrame(
+        {
+            "Airline Name": np.repeat(names, n_years),
+            "Date": np.tile(periods, n_selectors),
+            "Flight Routes": rng.integers(0, 4000, n_selectors * n_years).astype(float),
+            "Year": np.tile(periods.strftime("%Y"), n_selectors),
+        }
+    )
+
+
+def make_cube_df(n_rows, selected_year=None, seed=0):
+    """Return DataFrame like a 2D cube's to_df(): about 'n_rows' destinations by period.
+
+    Periods are years 1996-2019, or their months if 'selected_year' is set.
+    """
+    rng = np.random.default_rng(seed)
+    if selected_year is None:
+        date_var_desc = "Reporting Period (Year)"
+        periods = pd.period_range("1996", "2019", freq="Y", name=date_var_desc)
+    else:
+        date_var_desc = "Reporting Period (Month)"
+        periods = pd.period_range("1996-01", "2019-12", freq="M", name=date_var_desc)
+    n_destinations = max(n_rows // len(periods), 1)
+    destinations = pd.CategoricalIndex(
+        [f"DESTINATION {i:06d}" for i in range(n_destinations)], name="Origin Destination"
+    )
+    index = pd.MultiIndex.from_product([destinations, periods])
+    return pd.DataFrame(
+        {"Flight Routes": rng.integers(0, 50, len(index)).astype(float)}, index=index
+    )
@@ -0,0 +1,106 @@
+"""Compare apteco's to_df() with the typed decoding in example_app.typed_results.
+
+Each cube and data grid is fetched from the stand-in FastStats server and
+turned into a DataFrame both ways. This reports the best time for the query
+plus decoding, the peak memory allocated while decoding (from tracemalloc)
+and the memory the resulting DataFrame holds.
+"""
+import argparse
+import time
+import tracemalloc
+
+from .common import print_table, setup_django
+from .pipelines import start_stand_in_server
+
+
+def get_cases(session):
+    """Return (name, make apteco result, make typed result) for each query."""
+    from apteco.cube import Cube
+    from apteco.datagrid import DataGrid
+
+    from example_app.fs_var_names import (
+        AIRLINE_NAME_CODE,
+        ORIGIN_AIRPORT_LATITUDE,
+        ORIGIN_AIRPORT_LONGITUDE,
+        ORIGIN_DESTINATION_CODE,
+        REPORTING_PERIOD_CODE,
+    )
+    from example_app.typed_results import TypedCube, TypedDataGrid
+
+    routes = session.tables["Flight Route"]
+    airline_years = [routes[AIRLINE_NAME_CODE], routes[REPORTING_PERIOD_CODE].year]
+    destination_months = [routes[ORIGIN_DESTINATION_CODE], routes[REPORTING_PERIOD_CODE].month]
+    coordinates = [
+        routes[ORIGIN_DESTINATION_CODE],
+        routes[ORIGIN_AIRPORT_LATITUDE],
+        routes[ORIGIN_AIRPORT_LONGITUDE],
+    ]
+    return [
+        (
+            "cube airline x year",
+            lambda: Cube(airline_years, table=routes, session=session),
+            lambda: TypedCube(airline_years, table=routes, session=session),
+        ),
+        (
+            "cube destination x month",
+            lambda: Cube(destination_months, table=routes, session=session),
+            lambda: TypedCube(destination_months, table=routes, session=session),
+        ),
+        (
+            "datagrid coordinates",
+            lambda: DataGrid(coordinates, table=routes, max_rows=100000, session=session),
+            lambda: TypedDataGrid(coordinates, table=routes, max_rows=100000, session=session),
+        ),
+    ]
+
+
+def measure(make_result, repeat):
+    """Return best seconds to fetch and decode, peak allocation and DataFrame bytes."""
+    best = float("inf")
+    for __ in range(repeat):
+        start = time.perf_counter()
+        make_result().to_df()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    df = make_result().to_df()
+    __, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, alloc_peak, df.memory_usage(deep=True).sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--routes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from apteco.session import login_with_password
+
+    rows = []
+    for n_routes in args.routes:
+        process, url = start_stand_in_server(n_routes, latency=0.0)
+        try:
+            session = login_with_password(url, "benchmark", "Flight Delays", "benchmark", "")
+            for name, make_apteco, make_typed in get_cases(session):
+                for decoding, make_result in (("apteco", make_apteco), ("typed", make_typed)):
+                    seconds, alloc_peak, df_bytes = measure(make_result, args.repeat)
+                    rows.append(
+                        (
+                            n_routes,
+                            name,
+                            decoding,
+                            f"{seconds * 1000:.1f}",
+                            f"{alloc_peak / 2 ** 20:.1f}",
+                            f"{df_bytes / 2 ** 20:.2f}",
+                        )
+                    )
+        finally:
+            process.terminate()
+            process.wait()
+    print_table(["routes", "query", "decoding", "ms", "alloc peak MB", "DataFrame MB"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+
+from .cube_cache import read_dataframe, write_dataframe
+from .disk_cache import DiskCache
+from .fs_var_names import (
+    ORIGIN_AIRPORT_LATITUDE,
+    ORIGIN_AIRPORT_LONGITUDE,
+    ORIGIN_DESTINATION_CODE,
+    REPORTING_AIRPORT_CODE,
+    REPORTING_AIRPORT_LATITUDE,
+    REPORTING_AIRPORT_LONGITUDE,
+)
+from .single_flight import coalesce
+from .timing import stage
+from .typed_results import TypedDataGrid
+
+# Airport co-ordinates only change when the data is reloaded, so each index is
+# built once per data view (and FastStats build), kept on disk and memory-mapped
+coordinate_store = DiskCache(
+    settings.COORDINATE_INDEX_DIR, settings.COORDINATE_INDEX_MAX_BYTES, suffix=".arrow"
+)
+_indexes = {}  # index key -> DataFrame
+_lock = threading.Lock()
+
+
+def get_destination_coordinates(session):
+    """Return DataFrame of latitude and longitude for every origin destination."""
+    return get_coordinate_index(session, "destinations", fetch_destination_coordinates)
+
+
+def get_reporting_airport_coordinates(session):
+    """Return DataFrame of latitude and longitude for every reporting airport."""
+    return get_coordinate_index(
+        session, "reporting_airports", fetch_reporting_airport_coordinates
+    )
+
+
+def get_coordinate_index(session, name, fetch_coordinates):
+    """Return index 'name' for the session's data view, building it if needed."""
+    key = get_index_key(session, name)
+    with _lock:
+        df = _indexes.get(key)
+    if df is not None:
+        return df
+
+    def load():
+        with stage("coordinate_cache"):
+            return read_dataframe(coordinate_store, key)
+
+    def fetch():
+        fetched = fetch_coordinates(session)
+        with stage("coordinate_cache"):
+            write_dataframe(coordinate_store, key, fetched)
+            # Mapped from disk, so every process shares the same copy
+            df = read_dataframe(coordinate_store, key)
+        # None if already evicted, e.g. by a small size limit
+        return fetched if df is None else df
+
+    # Concurrent requests send FastStats one query to build the index
+    df = coalesce(key, load, fetch)
+    with _lock:
+        _indexes[key] = df
+    return df
+
+
+def fetch_destination_coordinates(session):
+    """Query FastStats for the co-ordinates of each origin destination."""
+    routes = session.tables["Flight Route"]
+    columns = [
+        routes[ORIGIN_DESTINATION_CODE],
+        routes[ORIGIN_AIRPORT_LATITUDE],
+        routes[ORIGIN_AIRPORT_LONGITUDE],
+    ]
+    has_coordinates = routes[ORIGIN_AIRPORT_LATITUDE] >= -90
+    one_per_destination = has_coordinates.limit(1, per=routes[ORIGIN_DESTINATION_CODE])
+    with stage("query"):
+        datagrid = TypedDataGrid(
+            columns, selection=one_per_destination, max_rows=100000, session=session
+        )
+    with stage("to_df"):
+        return compact_coordinates(datagrid.to_df())
+
+
+def fetch_reporting_airport_coordinates(session):
+    """Query FastStats for the co-ordinates of each reporting airport."""
+    airports = session.tables["Reporting Airport"]
+    columns = [
+        airports[REPORTING_AIRPORT_CODE],
+        airports[REPORTING_AIRPORT_LATITUDE],
+        airports[REPORTING_AIRPORT_LONGITUDE],
+    ]
+    with stage("query"):
+        datagrid = TypedDataGrid(columns, table=airports, max_rows=100000, session=session)
+    with stage("to_df"):
+        return compact_coordinates(datagrid.to_df())
+
+
+def compact_coordinates(df):
+    """Return co-ordinates DataFrame with float64 co-ordinates, one row per airport."""
+    name_col, *coordinate_cols = df.columns
+    df = df.drop_duplicates(subset=name_col).reset_index(drop=True)
+    df[coordinate_cols] = df[coordinate_cols].astype("float64")
+    return df
+
+
+def get_index_key(session, name):
+    """Return key for coordinate index 'name' on the session's data view and build."""
+    parts = [
+        session.base_url,
+        session.system,
+        session.data_view,
+        str(session.system_info.build_date),
+        name,
+    ]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
@@ -1,21 +1,63 @@
-import io
+import functools
+import hashlib
+import json
+import uuid
+
+import numpy as np
+import pandas as pd
+from django.core.cache import caches
+from plotly import graph_objects as go
+from plotly import io as pio
+from plotly.offline import get_plotlyjs
+from plotly.utils import PlotlyJSONEncoder
 
 from example_app.fs_var_names import REPORTING_PERIOD_CODE
+from example_app.query_plan import get_nonzero_dimension
+from example_app.single_flight import coalesce
+from example_app.timing import stage, timed
+from example_app.typed_results import TypedCube
 
 
 def get_codes_with_filter(session, varcode, limit=0):
-    """Return descriptions of selector 'varcode' with > limit flight routes."""
+    """Return descriptions of selector 'varcode' with > limit flight routes.
+
+    Results are shared between users and processes through the metadata cache.
+    """
+    metadata_cache = caches["faststats_metadata"]
+    key = get_metadata_cache_key(session, "codes_with_filter", varcode, limit)
+
+    def fetch():
+        variable_descs = fetch_codes_with_filter(session, varcode, limit)
+        metadata_cache.set(key, variable_descs)
+        return variable_descs
+
+    # Concurrent requests for the same codes send FastStats one query
+    return coalesce(key, lambda: metadata_cache.get(key), fetch)
+
+
+def fetch_codes_with_filter(session, varcode, limit=0):
+    """Query FastStats for descriptions of selector 'varcode' with > limit flight routes."""
     routes = session.tables["Flight Route"]
 
-    cube = routes.cube([session.variables[varcode]])
-    cube_df = cube.to_df()
+    with stage("query"):
+        # FastStats leaves out codes with too few flight routes
+        dimension = get_nonzero_dimension(session.variables[varcode], limit)
+        cube = TypedCube([dimension], table=routes, session=session)
+    with stage("to_df"):
+        cube_df = cube.to_df()
 
-    filtered_df = cube_df[cube_df["Flight Routes"] > limit]
-    variable_descs = [desc.title() for desc in filtered_df.index.to_list()]
+    variable_descs = [desc.title() for desc in cube_df.index.to_list()]
 
     return variable_descs
 
 
+def get_metadata_cache_key(session, name, *args):
+    """Return metadata cache key for 'name' with 'args' on the session's data view."""
+    parts = [session.base_url, session.system, session.data_view, name, *args]
+    digest = hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()
+    return f"{name}:{digest}"
+
+
 def get_reporting_years(session):
     """Return list of options for reporting years."""
     reporting_period_var = session.variables[REPORTING_PERIOD_CODE]
@@ -27,7 +69,12 @@ def get_reporting_years(session):
 
 
 def create_and_filter_cube_dataframe(cube, selected_year):
-    """Create dataframe based on cube, filtered to selected year."""
+    """Create dataframe based on cube, filtered to selected year.
+
+    The year is filtered on the cube's index before it is flattened, and the
+    Month or Year column is a categorical whose labels are formatted once per
+    distinct period, rather than once per row.
+    """
 
     if selected_year is not None:
         date_var_desc = "Reporting Period (Month)"
@@ -38,17 +85,109 @@ def create_and_filter_cube_dataframe(cube, selected_year):
         new_col_name = "Year"
         new_col_fmt = "%Y"
 
-    df = cube.to_df().reset_index().rename(columns={date_var_desc: "Date"})
-    df.loc[:, new_col_name] = df.loc[:, "Date"].dt.strftime(new_col_fmt)
-
-    if selected_year is not None:
-        df = df[df.loc[:, "Date"].dt.year == int(selected_year)]
+    with stage("to_df"):
+        df = cube.to_df()
+
+    with stage("filter"):
+        # Each row's period, as a position in the distinct periods
+        if isinstance(df.index, pd.MultiIndex):
+            level = df.index.names.index(date_var_desc)
+            periods, period_codes = df.index.levels[level], df.index.codes[level]
+        else:
+            period_codes, periods = pd.factorize(df.index)
+
+        if selected_year is not None:
+            in_year = np.flatnonzero(periods.year == int(selected_year))
+            rows = np.isin(period_codes, in_year)
+            df, period_codes = df[rows], period_codes[rows]
+
+        df = df.reset_index().rename(columns={date_var_desc: "Date"})
+        # Months from different years share a label, so labels are deduplicated
+        label_codes, labels = pd.factorize(periods.strftime(new_col_fmt))
+        # Only labels with rows, as plotly draws an animation frame per category
+        df[new_col_name] = pd.Categorical.from_codes(
+            label_codes[period_codes], labels
+        ).remove_unused_categories()
 
     return df
 
 
-def get_html(fig):
-    """Return HTML for plotly figure."""
-    with io.StringIO() as file:
-        fig.write_html(file, full_html=False)
-        return file.getvalue()
+PLOTLY_CONFIG = {"responsive": True}
+
+
+@timed("write_html")
+def get_html(fig, validate=True):
+    """Return HTML for plotly figure or figure dict.
+
+    A figure dict is validated by plotly first, unless 'validate' is False.
+    """
+    return "".join(iter_html(fig, validate))
+
+
+def iter_html(fig, validate=True, include_plotlyjs=True):
+    """Yield HTML for plotly figure in chunks, serializing one trace or frame at a time.
+
+    Writes the same fragment as plotly's write_html(full_html=False), but the
+    figure's JSON is never held in memory all at once, so it can be streamed.
+    """
+    if isinstance(fig, dict):
+        fig_dict = go.Figure(fig).to_dict() if validate else fig
+    else:
+        fig_dict = fig.to_dict()
+    layout = fig_dict.get("layout", {})
+    template_layout = layout.get("template", {}).get("layout", {})
+    width = get_css_size(layout.get("width", template_layout.get("width", "100%")))
+    height = get_css_size(layout.get("height", template_layout.get("height", "100%")))
+    div_id = str(uuid.uuid4())
+
+    yield "<div>\n"
+    if include_plotlyjs:
+        yield get_plotlyjs_html()
+    yield (
+        f'<div id="{div_id}" class="plotly-graph-div" '
+        f'style="height:{height}; width:{width};"></div>\n'
+        '<script type="text/javascript">\n'
+        "window.PLOTLYENV=window.PLOTLYENV || {};\n"
+        f'if (document.getElementById("{div_id}")) {{\n'
+        f"Plotly.newPlot('{div_id}', ["
+    )
+    for i, trace in enumerate(fig_dict.get("data", [])):
+        yield (", " if i else "") + json.dumps(trace, cls=PlotlyJSONEncoder, sort_keys=True)
+    yield (
+        "], "
+        + json.dumps(layout, cls=PlotlyJSONEncoder, sort_keys=True)
+        + ", "
+        + json.dumps(PLOTLY_CONFIG)
+        + ")"
+    )
+    frames = fig_dict.get("frames")
+    if frames:
+        yield f".then(function () {{ Plotly.addFrames('{div_id}', ["
+        for i, frame in enumerate(frames):
+            yield (", " if i else "") + json.dumps(frame, cls=PlotlyJSONEncoder)
+        yield f"]); }}).then(function () {{ Plotly.animate('{div_id}', null); }})"
+    yield "\n};\n</script>\n</div>"
+
+
+@functools.lru_cache(maxsize=None)
+def get_plotlyjs_html():
+    """Return script tags that load plotly.js, about 3MB."""
+    return (
+        "<script type=\"text/javascript\">window.PlotlyConfig = {MathJaxConfig: 'local'};</script>\n"
+        f'<script type="text/javascript">{get_plotlyjs()}</script>\n'
+    )
+
+
+def get_css_size(size):
+    """Return figure width or height as a CSS size, taking numbers as pixels."""
+    try:
+        float(size)
+    except (ValueError, TypeError):
+        return size
+    return f"{size}px"
+
+
+@functools.lru_cache(maxsize=None)
+def get_default_template():
+    """Return plotly's default template as a dict, for figures built without plotly."""
+    return pio.templates[pio.templates.default].to_plotly_json()
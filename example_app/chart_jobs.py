@@ -0,0 +1,82 @@
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.CHART_JOB_WORKERS, thread_name_prefix="chart-job"
+)
+_in_flight = {}  # job ID -> Future, for jobs running in this process
+_lock = threading.Lock()
+
+
+def submit_chart_job(owner, session, build_graph, *args):
+    """Queue 'build_graph(session, *args)' in the background, returning its job ID.
+
+    Jobs are identified by their owner (the requesting user's ID), the data
+    view and its build, the function and its arguments, so an identical job
+    that is already running or finished is reused rather than queued again.
+    Job status is kept in the 'chart_jobs' cache, so any worker process can
+    report on it.
+    """
+    job_id = get_job_id(owner, session, build_graph, *args)
+    job_cache = caches["chart_jobs"]
+    with _lock:
+        if job_id in _in_flight:
+            return job_id
+        job = job_cache.get(job_id)
+        if job is not None and job["status"] != FAILED:
+            return job_id
+        job = {"status": PENDING, "owner": owner}
+        job_cache.set(job_id, job, timeout=settings.CHART_JOB_TIMEOUT)
+        _in_flight[job_id] = executor.submit(
+            run_chart_job, job_id, owner, session, build_graph, args
+        )
+    return job_id
+
+
+def run_chart_job(job_id, owner, session, build_graph, args):
+    """Build graph for job and store the result against its job ID."""
+    try:
+        graph_html = build_graph(session, *args)
+    except Exception:
+        logger.exception("Chart job %s failed", job_id)
+        job = {"status": FAILED, "owner": owner}
+    else:
+        job = {"status": DONE, "owner": owner, "graph": graph_html}
+    caches["chart_jobs"].set(job_id, job)
+    with _lock:
+        _in_flight.pop(job_id, None)
+
+
+def get_chart_job(job_id, owner):
+    """Return status of owner's job (with its graph once done), or None if it isn't known."""
+    job = caches["chart_jobs"].get(job_id)
+    if job is None or job["owner"] != owner:
+        return None
+    return {name: value for name, value in job.items() if name != "owner"}
+
+
+def get_job_id(owner, session, build_graph, *args):
+    """Return ID identifying owner's call of 'build_graph' with 'args' on the data view."""
+    parts = [
+        owner,
+        session.base_url,
+        session.system,
+        session.data_view,
+        str(session.system_info.build_date),
+        build_graph.__module__,
+        build_graph.__qualname__,
+        args,
+    ]
+    return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
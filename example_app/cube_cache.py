@@ -0,0 +1,154 @@
+import hashlib
+import json
+
+import pandas as pd
+import pyarrow as pa
+from django.conf import settings
+
+from .disk_cache import DiskCache
+from .single_flight import coalesce
+from .timing import stage
+from .typed_results import TypedCube
+
+cube_store = DiskCache(
+    settings.CUBE_CACHE_DIR, settings.CUBE_CACHE_MAX_BYTES, suffix=".arrow"
+)
+
+
+class CachedCube:
+    """Results of a cube query, with the same to_df() as an apteco Cube."""
+
+    def __init__(self, df):
+        self._df = df
+
+    def to_df(self):
+        """Return DataFrame sharing the cached columns, which mustn't be changed in place.
+
+        Cubes read from the cube store are memory-mapped and read-only, so each
+        request shares them through the page cache rather than copying them.
+        """
+        return self._df.copy(deep=False)
+
+
+def get_cube(session, dimensions, selection=None, table=None):
+    """Return cube results, from the cube cache if an identical query has been run."""
+    if table is None:
+        table = selection.table
+
+    key = get_cube_fingerprint(session, dimensions, selection, table)
+
+    def load():
+        with stage("cube_cache"):
+            return read_dataframe(cube_store, key)
+
+    def fetch():
+        with stage("query"):
+            cube = TypedCube(dimensions, selection=selection, table=table, session=session)
+        with stage("to_df"):
+            df = cube.to_df()
+        with stage("cube_cache"):
+            write_dataframe(cube_store, key, df)
+        return df
+
+    # Concurrent requests for the same cube send FastStats one query
+    return CachedCube(coalesce(key, load, fetch))
+
+
+def get_cube_fingerprint(
+    session, dimensions, selection=None, table=None, include_build_date=True
+):
+    """Return canonical fingerprint of a cube query, the same for all users.
+
+    The FastStats build date is included (unless 'include_build_date' is False)
+    so results from a previous data load are never reused.
+    """
+    if table is None:
+        table = selection.table
+
+    if selection is not None:
+        model_selection = canonicalize(selection._to_model_selection().to_dict())
+    else:
+        model_selection = None
+
+    system = [session.base_url, session.system, session.data_view]
+    if include_build_date:
+        system.append(str(session.system_info.build_date))
+
+    query = {
+        "system": system,
+        "table": table.name,
+        "selection": model_selection,
+        "dimensions": [
+            canonicalize(dimension._to_model_dimension().to_dict())
+            for dimension in dimensions
+        ],
+    }
+    query_json = json.dumps(query, sort_keys=True, default=str)
+    return hashlib.sha256(query_json.encode("utf-8")).hexdigest()
+
+
+def canonicalize(model_dict):
+    """Return API model dict with equivalent queries written the same way.
+
+    Unset fields are dropped, the values in list rules are sorted,
+    and the operands of AND and OR clauses are put in a fixed order.
+    """
+    if isinstance(model_dict, list):
+        return [canonicalize(item) for item in model_dict]
+    if not isinstance(model_dict, dict):
+        return model_dict
+
+    canonical = {
+        key: canonicalize(value)
+        for key, value in model_dict.items()
+        if value is not None
+    }
+    if isinstance(canonical.get("list"), str):
+        canonical["list"] = "\t".join(sorted(canonical["list"].split("\t")))
+    if canonical.get("operation", "").upper() in ("AND", "OR"):
+        canonical["operands"] = sorted(
+            canonical.get("operands", []),
+            key=lambda operand: json.dumps(operand, sort_keys=True, default=str),
+        )
+    return canonical
+
+
+def write_dataframe(store, key, df):
+    """Store DataFrame against 'key' in disk cache 'store', as an Arrow IPC file."""
+    # Index levels are stored as plain columns, as rebuilding a period index
+    # from Arrow's pandas metadata creates an object per row
+    index_columns = [] if isinstance(df.index, pd.RangeIndex) else list(df.index.names)
+    if index_columns:
+        df = df.reset_index()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = {**table.schema.metadata, b"index_columns": json.dumps(index_columns).encode()}
+    table = table.replace_schema_metadata(metadata)
+    with store.open_for_write(key) as file:
+        # Uncompressed, so readers can use its columns where they lie in the file
+        with pa.ipc.new_file(file, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_dataframe(store, key):
+    """Return DataFrame stored against 'key' in disk cache 'store', or None.
+
+    The file is memory-mapped and numeric columns are used without copying,
+    so every process reading an entry shares the one copy in the page cache.
+    Those columns are read-only.
+    """
+    path = store.get_path(key)
+    if path is None:
+        return None
+    try:
+        source = pa.memory_map(path)
+    except FileNotFoundError:  # evicted by another process
+        return None
+    table = pa.ipc.open_file(source).read_all()
+    df = table.to_pandas(split_blocks=True)
+    index_columns = json.loads(table.schema.metadata[b"index_columns"])
+    if len(index_columns) > 1:
+        # Not set_index(), which copies the shared columns or builds a lookup table
+        df.index = pd.MultiIndex.from_arrays([df.pop(name) for name in index_columns])
+    elif index_columns:
+        df.index = pd.Index(df.pop(index_columns[0]))
+    return df
@@ -0,0 +1,152 @@
+"""Cubes over the reporting period, stored on disk as one partition per year.
+
+Flight data arrives month by month, so when FastStats reports a new max_date
+on the reporting period only the latest year's partition has changed.
+Earlier years are kept across data loads, and only the new months are fetched
+(with the rest of their year) rather than the whole reporting history.
+Combined cubes are kept in the cube cache until the max_date changes.
+"""
+import hashlib
+
+import pandas as pd
+from django.conf import settings
+
+from .cube_cache import (
+    CachedCube,
+    cube_store,
+    get_cube,
+    get_cube_fingerprint,
+    read_dataframe,
+    write_dataframe,
+)
+from .disk_cache import DiskCache
+from .fs_var_names import REPORTING_PERIOD_CODE, REPORTING_PERIOD_YEARS_CODE
+from .query_plan import get_period_dimension
+from .single_flight import coalesce
+from .timing import stage
+from .typed_results import TypedCube
+
+partition_store = DiskCache(
+    settings.CUBE_PARTITION_DIR, settings.CUBE_PARTITION_MAX_BYTES, suffix=".arrow"
+)
+
+
+def get_period_cube(session, dimension, selection=None, selected_year=None):
+    """Return cube of flight routes per 'dimension' category, per reporting period.
+
+    Periods are the months of 'selected_year' if given, else every year.
+    Built from yearly partitions if INCREMENTAL_CUBES is set.
+    """
+    routes = session.tables["Flight Route"]
+    if settings.INCREMENTAL_CUBES:
+        return get_partitioned_cube(session, dimension, selection, selected_year)
+
+    if selected_year is not None:
+        selection = and_clauses(selection, routes[REPORTING_PERIOD_YEARS_CODE] == selected_year)
+    dimensions = [dimension, get_period_dimension(session, selected_year)]
+    return get_cube(session, dimensions, selection=selection, table=routes)
+
+
+def get_partitioned_cube(session, dimension, selection=None, selected_year=None):
+    """Return period cube combined from its yearly partitions, fetching any missing.
+
+    The combined cube is also kept in the cube cache until the max_date changes.
+    """
+    routes = session.tables["Flight Route"]
+    reporting_period = session.variables[REPORTING_PERIOD_CODE]
+    min_date, max_date = reporting_period.min_date, reporting_period.max_date
+
+    period_dimension = get_period_dimension(session, selected_year)
+    fingerprint = get_cube_fingerprint(
+        session, [dimension, period_dimension], selection, routes, include_build_date=False
+    )
+    key = get_dated_key(fingerprint, max_date)
+    with stage("cube_cache"):
+        df = read_dataframe(cube_store, key)
+        if df is not None:
+            return CachedCube(df)
+
+    if selected_year is not None:
+        years = [int(selected_year)]
+        start = max(pd.Period(f"{selected_year}-01", "M"), pd.Period(min_date, "M"))
+        end = min(pd.Period(f"{selected_year}-12", "M"), pd.Period(max_date, "M"))
+        periods = pd.period_range(start, end, freq="M", name=period_dimension.description)
+    else:
+        years = range(min_date.year, max_date.year + 1)
+        periods = pd.period_range(
+            str(min_date.year), str(max_date.year), freq="Y", name=period_dimension.description
+        )
+
+    partitions = [
+        get_year_partition(session, dimension, selection, year, max_date) for year in years
+    ]
+    with stage("cube_cache"):
+        df = combine_partitions(partitions, periods)
+        write_dataframe(cube_store, key, df)
+    return CachedCube(df)
+
+
+def get_year_partition(session, dimension, selection, year, max_date):
+    """Return flat DataFrame of the monthly cube for 'year', from disk if already fetched.
+
+    The latest year is stored against the max_date it was fetched at,
+    as it gains months when new data arrives. Earlier years are complete.
+    Concurrent requests for the same partition send FastStats one query.
+    """
+    routes = session.tables["Flight Route"]
+    in_year = routes[REPORTING_PERIOD_YEARS_CODE] == str(year)
+    year_selection = and_clauses(selection, in_year)
+    dimensions = [dimension, get_period_dimension(session, str(year))]
+
+    key = get_cube_fingerprint(
+        session, dimensions, year_selection, routes, include_build_date=False
+    )
+    if year == max_date.year:
+        key = get_dated_key(key, max_date)
+
+    def load():
+        with stage("cube_cache"):
+            return read_dataframe(partition_store, key)
+
+    def fetch():
+        with stage("query"):
+            cube = TypedCube(dimensions, selection=year_selection, table=routes, session=session)
+        with stage("to_df"):
+            # Flat columns are much quicker to read back than a period index
+            df = cube.to_df().reset_index()
+        with stage("cube_cache"):
+            write_dataframe(partition_store, key, df)
+        return df
+
+    return coalesce(key, load, fetch)
+
+
+def combine_partitions(partitions, periods):
+    """Return DataFrame of monthly partitions summed into 'periods', with every category.
+
+    Partitions can have different categories, e.g. the destinations flown to
+    in each year, so each category gets a row (of zeros if needed) per period.
+    """
+    months = pd.concat(partitions, ignore_index=True)
+    category_col, month_col = months.columns[:2]
+    # In the order FastStats lists them, as far as the partitions show it
+    category_values = months[category_col].astype(object)
+    categories = pd.unique(category_values)
+    totals = months.groupby(
+        [category_values, months[month_col].dt.asfreq(periods.freqstr)]
+    )["Flight Routes"].sum()
+
+    index = pd.MultiIndex.from_product(
+        [pd.CategoricalIndex(categories, name=category_col), periods]
+    )
+    return totals.reindex(index, fill_value=0.0).to_frame()
+
+
+def get_dated_key(key, max_date):
+    """Return key for results of 'key' with data up to 'max_date'."""
+    return hashlib.sha256(f"{key}:{max_date:%Y%m%d}".encode("utf-8")).hexdigest()
+
+
+def and_clauses(selection, clause):
+    """Return 'selection' restricted to 'clause', or 'clause' if there is no selection."""
+    return clause if selection is None else selection & clause
@@ -0,0 +1,118 @@
+import contextlib
+import os
+import tempfile
+
+
+class DiskCache:
+    """Size-bounded store of binary blobs in a directory, shared between processes.
+
+    Each entry is one file named after its key. Reading an entry refreshes its
+    modification time, and once the total size passes 'max_bytes' the least
+    recently used files are removed. Writes go through a temporary file and
+    an atomic rename, so readers in other processes never see partial blobs.
+
+    """
+
+    def __init__(self, directory, max_bytes, suffix=""):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+
+    def get(self, key):
+        """Return blob stored against 'key', or None if there isn't one."""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as file:
+                blob = file.read()
+            os.utime(path)
+        except FileNotFoundError:  # missing, or evicted by another process
+            return None
+        return blob
+
+    def get_path(self, key):
+        """Return path of the entry for 'key' to read in place, or None if there isn't one.
+
+        An entry evicted while open (or memory-mapped) stays readable until closed.
+        """
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def set(self, key, blob):
+        """Store 'blob' against 'key', evicting old entries if over the size limit."""
+        with self.open_for_write(key) as file:
+            file.write(blob)
+
+    @contextlib.contextmanager
+    def open_for_write(self, key):
+        """Return binary file for the entry for 'key', stored once the block exits.
+
+        Nothing is stored if the block raises, so a blob can be written in pieces
+        without holding it all in memory.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                yield file
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def delete(self, key):
+        """Remove the entry for 'key', if present."""
+        try:
+            os.unlink(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """Remove all entries."""
+        for path, __, __ in self._entries():
+            self._unlink(path)
+
+    def path(self, key):
+        """Return file path for the entry stored against 'key'."""
+        return os.path.join(self.directory, key + self.suffix)
+
+    def size(self):
+        """Return total size in bytes of all entries."""
+        return sum(size for __, size, __ in self._entries())
+
+    def evict(self):
+        """Remove least recently used entries until under the size limit."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for __, size, __ in entries)
+        for path, size, __ in entries:
+            if total <= self.max_bytes:
+                break
+            self._unlink(path)
+            total -= size
+
+    def _entries(self):
+        """Yield (path, size, last used) for each entry."""
+        try:
+            dir_entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return
+        for dir_entry in dir_entries:
+            if dir_entry.name.endswith(".tmp") or not dir_entry.name.endswith(self.suffix):
+                continue
+            try:
+                stat = dir_entry.stat()
+            except FileNotFoundError:
+                continue
+            yield dir_entry.path, stat.st_size, stat.st_mtime
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
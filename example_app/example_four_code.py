@@ -1,37 +1,36 @@
 import pandas as pd
 from plotly import express as px
 
+from .airport_coordinates import get_destination_coordinates
 from .api_shared_methods import create_and_filter_cube_dataframe, get_html
+from .cube_partitions import get_period_cube
 from .fs_var_names import (
     AIRLINE_NAME_CODE,
     ORIGIN_DESTINATION_CODE,
     REPORTING_AIRPORT_CODE,
-    ORIGIN_AIRPORT_LATITUDE,
-    ORIGIN_AIRPORT_LONGITUDE,
-    REPORTING_PERIOD_CODE,
-    REPORTING_PERIOD_YEARS_CODE,
 )
+from .parallel_queries import run_queries
+from .query_plan import get_nonzero_dimension
+from .render_cache import cached_render
+from .timing import stage
 
 
 def get_example_four_dataframe(session, airline, year, reporting_airport=None):
-    """Create dataframe by merging the cube and datagrid results together."""
+    """Create dataframe by joining the cube results to destination co-ordinates."""
 
     airline = airline.upper()
     if reporting_airport is not None:
         reporting_airport = reporting_airport.upper()
 
-    cube = get_example_four_cube(session, airline, year, reporting_airport)
+    # The cube and the co-ordinate index don't depend on each other, so fetch them together
+    cube, coordinates_df = run_queries(
+        (get_example_four_cube, session, airline, year, reporting_airport),
+        (get_destination_coordinates, session),
+    )
     cube_df = create_and_filter_cube_dataframe(cube, year)
 
-    datagrid = get_example_four_datagrid(session, airline)
-    datagrid_df = datagrid.to_df()
-
-    df = pd.merge(cube_df, datagrid_df, how="right", on="Origin Destination")
-
-    # Filter df to only include Origin Destinations that have had at least one flight in the date range selected
-    grouped_df = df.groupby("Origin Destination").sum()
-    filtered_df = grouped_df.loc[grouped_df["Flight Routes"] > 0]
-    df = df.loc[df["Origin Destination"].isin(filtered_df.index)]
+    with stage("join"):
+        df = pd.merge(cube_df, coordinates_df, how="inner", on="Origin Destination")
     return df
 
 
@@ -41,60 +40,70 @@ def get_example_four_cube(
     selected_year=None,
     selected_reporting_airport=None,
 ):
-    """Get 2D cube of number of flight routes per airline per time period."""
+    """Get 2D cube of number of flight routes per destination per time period.
+
+    FastStats keeps only destinations with at least one flight route in the
+    selection, and only the months of the selected year (if set).
+    """
     routes = session.tables["Flight Route"]
     airports = session.tables["Reporting Airport"]
 
     selection = routes[AIRLINE_NAME_CODE] == selected_airline
-    if selected_year is not None:
-        selection &= routes[REPORTING_PERIOD_YEARS_CODE] == selected_year
     if selected_reporting_airport is not None:
         selection &= airports[REPORTING_AIRPORT_CODE] == selected_reporting_airport
 
-    if selected_year is not None:
-        date_dim = routes[REPORTING_PERIOD_CODE].month
-    else:
-        date_dim = routes[REPORTING_PERIOD_CODE].year
-
-    cube = selection.cube([routes[ORIGIN_DESTINATION_CODE], date_dim])
+    dimension = get_nonzero_dimension(routes[ORIGIN_DESTINATION_CODE])
+    cube = get_period_cube(session, dimension, selection=selection, selected_year=selected_year)
     return cube
 
 
-def get_example_four_datagrid(session, airline):
-    """Create datagrid giving the co-ordinates of each destination airport the airline goes to."""
-    airports = session.tables["Reporting Airport"]
-    routes = session.tables["Flight Route"]
-
-    columns = [
-        airports[REPORTING_AIRPORT_CODE],
-        routes[ORIGIN_AIRPORT_LATITUDE],
-        routes[ORIGIN_AIRPORT_LONGITUDE],
-        routes[ORIGIN_DESTINATION_CODE],
-    ]
-
-    airline_rule = routes[AIRLINE_NAME_CODE] == airline
-    one_per_destination = airline_rule.limit(1, per=routes[ORIGIN_DESTINATION_CODE])
+@cached_render
+def make_example_four_map(df):
+    """Get HTML for plotly bubble map of airline flight routes to destinations."""
+    return get_html(make_example_four_figure(df))
 
-    datagrid = one_per_destination.datagrid(columns, max_rows=100000)
-    return datagrid
 
+def get_example_four_data(df):
+    """Return columnar data for drawing example four map in the browser.
 
-def make_example_four_map(df):
-    """Get HTML for plotly bubble map of airline flight routes to destinations."""
+    Destinations are listed once, and each row refers to its frame and
+    destination by position.
+    """
+    date_banding = df["Date"].array.resolution.title()
+    frame_codes, frames = pd.factorize(df[date_banding])
+    destination_codes, destinations = pd.factorize(df["Origin Destination"])
+    first_rows = df.drop_duplicates("Origin Destination")  # same order as factorize
+    return {
+        "frame_title": date_banding,
+        "frames": frames.tolist(),
+        "destinations": {
+            "name": destinations.tolist(),
+            "lat": first_rows["Origin Airport Latitude"].astype(float).tolist(),
+            "lon": first_rows["Origin Airport Longitude"].astype(float).tolist(),
+        },
+        "frame": frame_codes.tolist(),
+        "destination": destination_codes.tolist(),
+        "routes": df["Flight Routes"].astype(int).tolist(),
+    }
+
+
+def make_example_four_figure(df):
+    """Return plotly bubble map of airline flight routes to destinations."""
     date_banding = df["Date"].array.resolution.title()
 
-    fig = px.scatter_geo(
-        df,
-        lat="Origin Airport Latitude",
-        lon="Origin Airport Longitude",
-        animation_frame=date_banding,
-        text="Origin Destination",
-        size_max=30,
-        size="Flight Routes",
-        color="Flight Routes",  # Size and colour of bubbles determined by number of flights there
-        color_continuous_scale=px.colors.sequential.YlOrRd,  # Specifies what colour scale to use
-        projection="natural earth",
-        height=800,
-        width=1500,
-    )
-    return get_html(fig)
+    with stage("figure"):
+        fig = px.scatter_geo(
+            df,
+            lat="Origin Airport Latitude",
+            lon="Origin Airport Longitude",
+            animation_frame=date_banding,
+            text="Origin Destination",
+            size_max=30,
+            size="Flight Routes",
+            color="Flight Routes",  # Size and colour of bubbles determined by number of flights there
+            color_continuous_scale=px.colors.sequential.YlOrRd,  # Specifies what colour scale to use
+            projection="natural earth",
+            height=800,
+            width=1500,
+        )
+    return fig
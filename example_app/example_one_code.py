@@ -1,12 +1,64 @@
+import numpy as np
+import pandas as pd
+
 from .fs_var_names import ORIGIN_DESTINATION_CODE, REPORTING_AIRPORT_CODE
+from .query_plan import PlannedDimension
+from .route_counts import get_route_count_index
+from .timing import stage
+from .typed_results import TypedCube, get_values_slice
 
 
 def get_example_one_count(session, origin_code, dest_code):
-    """Get count of flight routes between origin and dest."""
+    """Get count of flight routes between origin and dest, from the route count index."""
+    index = get_route_count_index(session, get_example_one_counts)
+    return index.count(origin_code, dest_code)
+
+
+def query_example_one_count(session, origin_code, dest_code):
+    """Get count of flight routes between origin and dest with a count query."""
     routes = session.tables["Flight Route"]
     airports = session.tables["Reporting Airport"]
 
     origin = airports[REPORTING_AIRPORT_CODE] == origin_code
     dest = routes[ORIGIN_DESTINATION_CODE] == dest_code
     audience = routes * origin & dest
-    return audience.count()
+    with stage("query"):
+        return audience.count()
+
+
+def get_example_one_counts(session, origin_codes=None, dest_codes=None):
+    """Get DataFrame of flight routes between each origin (row) and dest (column).
+
+    All the counts come from one cube of reporting airport by destination.
+    Every origin or destination is included if its codes aren't given.
+    """
+    routes = session.tables["Flight Route"]
+    airports = session.tables["Reporting Airport"]
+
+    selection = None
+    origin_dim = PlannedDimension(airports[REPORTING_AIRPORT_CODE])
+    dest_dim = PlannedDimension(routes[ORIGIN_DESTINATION_CODE])
+    if origin_codes:
+        origin = airports[REPORTING_AIRPORT_CODE] == origin_codes
+        selection = routes * origin
+        origin_dim.filter_query = origin
+    if dest_codes:
+        dest = routes[ORIGIN_DESTINATION_CODE] == dest_codes
+        selection = dest if selection is None else selection & dest
+        dest_dim.filter_query = dest
+
+    with stage("query"):
+        cube = TypedCube([origin_dim, dest_dim], selection=selection, table=routes, session=session)
+    with stage("to_df"):
+        # Labelled by code, as the pairs are asked for
+        origin_values, dest_values = get_values_slice(origin_dim), get_values_slice(dest_dim)
+        counts = pd.DataFrame(
+            cube._data[0][origin_values, dest_values].astype(np.int64),
+            index=cube._headers[0]["codes"][origin_values],
+            columns=cube._headers[1]["codes"][dest_values],
+        )
+        if origin_codes:
+            counts = counts.reindex(index=origin_codes, fill_value=0)
+        if dest_codes:
+            counts = counts.reindex(columns=dest_codes, fill_value=0)
+    return counts
@@ -1,45 +1,82 @@
+import numpy as np
+import pandas as pd
 from plotly import graph_objects as go
 
-from .api_shared_methods import get_html
-from .fs_var_names import (
-    ORIGIN_AIRPORT_LATITUDE,
-    ORIGIN_AIRPORT_LONGITUDE,
-    ROUTE_NAME_CODE,
-    REPORTING_AIRPORT_CODE,
-    REPORTING_AIRPORT_LATITUDE,
-    REPORTING_AIRPORT_LONGITUDE,
+from .airport_coordinates import (
+    get_destination_coordinates,
+    get_reporting_airport_coordinates,
 )
+from .api_shared_methods import get_html
+from .fs_var_names import ORIGIN_DESTINATION_CODE, REPORTING_AIRPORT_CODE, ROUTE_NAME_CODE
+from .parallel_queries import run_queries
+from .render_cache import cached_render
+from .timing import stage, timed
+from .typed_results import TypedDataGrid
+
+EXAMPLE_THREE_COLUMNS = [
+    "Origin Airport Longitude",
+    "Origin Airport Latitude",
+    "Reporting Airport Longitude",
+    "Reporting Airport Latitude",
+    "Flight Route Name",
+]
 
 
 def get_example_three_dataframe(session, airport_code):
-    """Create dataframe for example three graph, based on the given airport."""
-    dg = get_example_three_datagrid(session, airport_code)
-    df = dg.to_df()
-    return df
+    """Create dataframe for example three graph, based on the given airport.
+
+    The airport's flight routes come from a datagrid, and their co-ordinates
+    from the precomputed airport co-ordinate indexes. An unknown airport, or
+    one without co-ordinates, gives an empty dataframe.
+    """
+    routes_df, destinations_df, airports_df = run_queries(
+        (get_example_three_routes, session, airport_code),
+        (get_destination_coordinates, session),
+        (get_reporting_airport_coordinates, session),
+    )
+
+    with stage("join"):
+        airport = airports_df.loc[airports_df["Reporting Airport"] == airport_code]
+        if airport.empty:
+            return pd.DataFrame(columns=EXAMPLE_THREE_COLUMNS)
 
+        df = routes_df.merge(destinations_df, on="Origin Destination")
+        df["Reporting Airport Longitude"] = airport["Reporting Airport Longitude"].iloc[0]
+        df["Reporting Airport Latitude"] = airport["Reporting Airport Latitude"].iloc[0]
+        return df[EXAMPLE_THREE_COLUMNS].reset_index(drop=True)
 
-def get_example_three_datagrid(session, airport_code):
-    """Create datagrid for example three data."""
+
+def get_example_three_routes(session, airport_code):
+    """Return DataFrame of destination and name of each flight route from the airport."""
     airports = session.tables["Reporting Airport"]
     routes = session.tables["Flight Route"]
 
-    columns = [
-        routes[ORIGIN_AIRPORT_LONGITUDE],
-        routes[ORIGIN_AIRPORT_LATITUDE],
-        airports[REPORTING_AIRPORT_LONGITUDE],
-        airports[REPORTING_AIRPORT_LATITUDE],
-        routes[ROUTE_NAME_CODE],
-    ]
+    columns = [routes[ORIGIN_DESTINATION_CODE], routes[ROUTE_NAME_CODE]]
+    airport_routes = routes * (airports[REPORTING_AIRPORT_CODE] == airport_code)
+    one_per_route = airport_routes.limit(1, per=routes[ROUTE_NAME_CODE])
+    with stage("query"):
+        datagrid = TypedDataGrid(
+            columns, selection=one_per_route, max_rows=100000, session=session
+        )
+    with stage("to_df"):
+        return datagrid.to_df()
 
-    airport_clause = airports[REPORTING_AIRPORT_CODE] == airport_code
-    one_per_dest = (routes * airport_clause).limit(1, per=routes[ROUTE_NAME_CODE])
-    datagrid = one_per_dest.datagrid(columns, table=routes)
 
-    return datagrid
+@cached_render
+def make_example_three_map(df, batched=True):
+    """Return HTML code for plotly map of unique flight routes from an airport."""
+    fig = make_example_three_figure(df, batched)
+    return get_html(fig)
 
 
-def make_example_three_map(df):
-    """Return HTML code for plotly map of unique flight routes from an airport."""
+@timed("figure")
+def make_example_three_figure(df, batched=True):
+    """Return plotly map of unique flight routes from an airport.
+
+    If 'batched', all routes are drawn as one trace, which keeps build time and
+    page size low for busy airports. Otherwise each route is a separate trace,
+    with its own colour and legend entry.
+    """
     fig = go.Figure()
 
     # Add each unique flight route as a line on a globe map, with co-ordinates set
@@ -50,17 +87,20 @@ def make_example_three_map(df):
         "Reporting Airport Latitude": "rep_lat",
         "Flight Route Name": "route_name",
     })
-    for row in df.itertuples(index=False):
-        fig.add_trace(
-            go.Scattergeo(
-                lon=[row.orig_lon, row.rep_lon],
-                lat=[row.orig_lat, row.rep_lat],
-                mode="lines+markers",
-                line={"width": 3},
-                text=row.route_name,
-                name=row.route_name,
+    if batched:
+        fig.add_trace(make_route_lines_trace(df))
+    else:
+        for row in df.itertuples(index=False):
+            fig.add_trace(
+                go.Scattergeo(
+                    lon=[row.orig_lon, row.rep_lon],
+                    lat=[row.orig_lat, row.rep_lat],
+                    mode="lines+markers",
+                    line={"width": 3},
+                    text=row.route_name,
+                    name=row.route_name,
+                )
             )
-        )
     fig.update_layout(
         geo={
             "showcountries": True,
@@ -69,4 +109,47 @@ def make_example_three_map(df):
         width=1500,
         height=700,  # Change figure size
     )
-    return get_html(fig)
+    return fig
+
+
+def get_example_three_data(df):
+    """Return columnar data for drawing example three map in the browser."""
+    airport = None
+    if len(df):
+        airport = {
+            "lon": float(df["Reporting Airport Longitude"].iloc[0]),
+            "lat": float(df["Reporting Airport Latitude"].iloc[0]),
+        }
+    return {
+        "airport": airport,
+        "routes": {
+            "name": df["Flight Route Name"].tolist(),
+            "lon": df["Origin Airport Longitude"].astype(float).tolist(),
+            "lat": df["Origin Airport Latitude"].astype(float).tolist(),
+        },
+    }
+
+
+def make_route_lines_trace(df):
+    """Return a single trace drawing every route, with NaN gaps between routes."""
+    # Each route takes three points: origin, reporting airport, then a NaN break
+    n_points = 3 * len(df)
+    lon = np.full(n_points, np.nan)
+    lat = np.full(n_points, np.nan)
+    lon[0::3] = df["orig_lon"].to_numpy(dtype=float)
+    lon[1::3] = df["rep_lon"].to_numpy(dtype=float)
+    lat[0::3] = df["orig_lat"].to_numpy(dtype=float)
+    lat[1::3] = df["rep_lat"].to_numpy(dtype=float)
+
+    text = np.repeat(df["route_name"].to_numpy(dtype=object), 3)
+    text[2::3] = None
+
+    return go.Scattergeo(
+        lon=lon,
+        lat=lat,
+        mode="lines+markers",
+        line={"width": 3},
+        text=text,
+        hoverinfo="lon+lat+text",
+        name="Flight routes",
+    )
@@ -1,7 +1,16 @@
+import numpy as np
 from plotly import graph_objects as go
 
-from .api_shared_methods import get_html, create_and_filter_cube_dataframe
-from .fs_var_names import REPORTING_PERIOD_CODE, REPORTING_PERIOD_YEARS_CODE
+from .api_shared_methods import (
+    create_and_filter_cube_dataframe,
+    get_default_template,
+    get_html,
+)
+from .cube_partitions import get_period_cube
+from .fs_var_names import REPORTING_PERIOD_YEARS_CODE
+from .query_plan import PlannedDimension, get_top_codes
+from .render_cache import cached_render
+from .timing import timed
 
 # Used for the x axis in example two graph
 MONTHS = [
@@ -21,64 +30,112 @@ MONTHS = [
 
 
 def get_example_two_dataframe(session, measure_var_code, selected_year, limit):
-    """Create dataframe for example two graph, filtered by top selectors if set."""
-    measure_var_desc = session.variables[measure_var_code].description
+    """Create dataframe for example two graph, of the top selectors if 'limit' is set."""
+    cube = get_example_two_cube(session, measure_var_code, selected_year, limit)
+    return create_and_filter_cube_dataframe(cube, selected_year)
 
-    cube = get_example_two_cube(session, measure_var_code, selected_year=selected_year)
-    df = create_and_filter_cube_dataframe(cube, selected_year)
-
-    # Filter the dataframe to only return rows regarding the top selectors
-    if limit > 0:
-        top_names = df.groupby(measure_var_desc).sum().nlargest(limit, "Flight Routes")
-        df = df[df[measure_var_desc].isin(top_names.index)]
-    return df
 
+def get_example_two_cube(session, measure_var_code, selected_year=None, limit=0):
+    """Create 2D cube of flight routes per 'measure' variable, per date selector.
 
-def get_example_two_cube(session, measure_var_code, selected_year=None):
-    """Create 2D cube of flight routes per 'measure' variable, per date selector."""
+    If 'limit' is set, the top selectors are ranked first by a 1D cube,
+    and the 2D cube is only built for them.
+    """
     routes = session.tables["Flight Route"]
+    measure_var = session.variables[measure_var_code]
+
+    top_rule = None
+    if limit > 0:
+        # Ranked by flight routes in the selected year, if specified
+        if selected_year is not None:
+            query = routes[REPORTING_PERIOD_YEARS_CODE] == selected_year
+        else:
+            query = None
+        top_rule = measure_var == get_top_codes(session, measure_var, limit, query)
 
-    # If specified, only return flight counts for the selected year
-    if selected_year is not None:
-        query = routes[REPORTING_PERIOD_YEARS_CODE] == selected_year
-        date_dim = routes[REPORTING_PERIOD_CODE].month
-    # Else, no underlying base query
-    else:
-        query = None
-        date_dim = routes[REPORTING_PERIOD_CODE].year
-
-    dimensions = [session.variables[measure_var_code], date_dim]
-    cube = routes.cube(dimensions, selection=query)
+    dimension = PlannedDimension(measure_var, filter_query=top_rule)
+    cube = get_period_cube(session, dimension, selection=top_rule, selected_year=selected_year)
     return cube
 
 
-def make_example_two_graph(df, measure_var_desc, year=None):
-    """Return HTML for plotly graph of number of flights over time per 'measure'."""
-    df.loc[:, "Date"] = df.loc[:, "Date"].dt.to_timestamp()
-
-    fig = go.Figure(data=go.Scatter())
-
-    # Add line trace for each selector description
-    for i, elem in enumerate(sorted(set(df[measure_var_desc]))):
-        mask = df[measure_var_desc] == elem
-        fig.add_trace(
-            go.Scatter(
-                mode="lines+markers",
-                x=df[mask]["Date"],
-                y=df[mask]["Flight Routes"],
-                name=elem,
-            )
-        )
-
-    fig.update_layout(
-        xaxis={"title": "Year"},
-        yaxis={"title": "Number of Flight Routes"},
-        width=1500,
-        height=800,
-    )
+@cached_render
+def make_example_two_graph(df, measure_var_desc, year=None, validate=True):
+    """Return HTML for plotly graph of number of flights over time per 'measure'.
+
+    If not 'validate', the figure is written straight from plain dicts,
+    skipping plotly's figure construction and validation.
+    """
+    fig = make_example_two_figure(df, measure_var_desc, year, validate)
+    return get_html(fig, validate=validate)
+
+
+@timed("figure")
+def make_example_two_figure(df, measure_var_desc, year=None, validate=True):
+    """Return plotly graph of flights over time per 'measure', as a dict if not 'validate'."""
+    traces = get_example_two_traces(df, measure_var_desc)
+    layout = get_example_two_layout(traces, year)
+    if validate:
+        return go.Figure(data=[go.Scatter(trace) for trace in traces], layout=layout)
+    return {"data": traces, "layout": layout}
+
+
+def get_example_two_data(df, measure_var_desc, year=None):
+    """Return columnar data for drawing example two graph in the browser.
+
+    Each series gives its dates as positions in the shared 'dates' list.
+    """
+    traces = get_example_two_traces(df, measure_var_desc)
+    dates = np.unique(np.concatenate([trace["x"] for trace in traces] or [[]]))
+    return {
+        "x_title": "Year" if year is None else f"Month ({year})",
+        "dates": dates.tolist(),
+        "month_names": None if year is None else MONTHS,
+        "series": [
+            {
+                "name": str(trace["name"]),
+                "x": np.searchsorted(dates, trace["x"]).tolist(),
+                "y": trace["y"].tolist(),
+            }
+            for trace in traces
+        ],
+    }
+
+
+def get_example_two_traces(df, measure_var_desc):
+    """Return line trace dicts for each selector description, in name order."""
+    # ISO strings, as plotly would otherwise write datetime64 arrays as integers
+    dates = np.datetime_as_string(df["Date"].dt.to_timestamp().to_numpy(), unit="s")
+    flight_routes = df["Flight Routes"].to_numpy()
+
+    # One pass over the selector column gives the row positions for every trace
+    positions = df.groupby(measure_var_desc, sort=False, observed=True).indices
+    return [
+        {
+            "type": "scatter",
+            "mode": "lines+markers",
+            "x": dates[positions[name]],
+            "y": flight_routes[positions[name]],
+            "name": name,
+        }
+        for name in sorted(positions)
+    ]
+
+
+def get_example_two_layout(traces, year=None):
+    """Return layout for example two graph, with month names as ticks if 'year' is set."""
+    layout = {
+        "template": get_default_template(),
+        "xaxis": {"title": {"text": "Year"}},
+        "yaxis": {"title": {"text": "Number of Flight Routes"}},
+        "width": 1500,
+        "height": 800,
+    }
     # If showing months, show natural language month values
     if year is not None:
-        fig.update_xaxes(
-            tickvals=df["Date"], ticktext=MONTHS, title_text=f"Month ({year})"
-        )
-    return get_html(fig)
+        tickvals = np.unique(np.concatenate([trace["x"] for trace in traces]))
+        layout["xaxis"] = {
+            "title": {"text": f"Month ({year})"},
+            "tickvals": tickvals,
+            "ticktext": MONTHS,
+        }
+    return layout
@@ -0,0 +1,113 @@
+"""FastStats sessions whose API clients share one connection pool per FastStats URL.
+
+apteco gives every session it logs in or deserializes a new API client with
+its own urllib3 pool, so few connections (or TLS handshakes) were reused.
+Sessions made here send their requests through a pool kept by the process for
+their FastStats URL instead, which keeps connections alive between requests
+and retries failed connections with backoff.
+"""
+import json
+import socket
+import threading
+
+import apteco_api as aa
+from apteco.exceptions import DeserializeError
+from apteco.session import Credentials, Session, SimpleLoginAlgorithm, User
+from apteco_api.rest import RESTClientObject
+from django.conf import settings
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+
+_rest_clients = {}  # FastStats URL -> RESTClientObject
+_lock = threading.Lock()
+
+
+class PooledSession(Session):
+    """FastStats session using the shared connection pool for its URL."""
+
+    def _create_client(self):
+        super()._create_client()
+        self.api_client.rest_client = get_rest_client(self.base_url)
+
+    @staticmethod
+    def deserialize(serialized_session):
+        """Return session from the output of serialize(), as Session.deserialize() does."""
+        try:
+            d = json.loads(serialized_session)
+            credentials = Credentials(
+                d["base_url"],
+                d["data_view"],
+                d["session_id"],
+                d["access_token"],
+                User(**d["user"]),
+            )
+            system = d["system"]
+        except (ValueError, KeyError, TypeError) as exc:
+            raise DeserializeError(f"The given input could not be deserialized: {exc!r}")
+        return PooledSession(credentials, system)
+
+
+class PooledLoginAlgorithm(SimpleLoginAlgorithm):
+    """Simple login sent through the shared connection pool for its URL."""
+
+    def _create_unauthorized_client(self):
+        super()._create_unauthorized_client()
+        self.api_client.rest_client = get_rest_client(self.base_url)
+
+
+def login_with_password(base_url, data_view, system, user, password):
+    """Log in to the API, returning a session using the shared connection pool."""
+    credentials = PooledLoginAlgorithm(base_url, data_view).run(user, password)
+    return PooledSession(credentials, system)
+
+
+def get_rest_client(base_url):
+    """Return this process's REST client for the FastStats API at 'base_url'.
+
+    The client holds no credentials, as API clients add them to each request,
+    so it is shared by every session on that URL.
+    """
+    with _lock:
+        rest_client = _rest_clients.get(base_url)
+        if rest_client is None:
+            config = aa.Configuration()
+            config.connection_pool_maxsize = settings.FASTSTATS_POOL_SIZE
+            # POST queries are only retried if they couldn't be sent,
+            # and a final 5xx response is still raised as an ApiException
+            config.retries = Retry(
+                total=settings.FASTSTATS_RETRIES,
+                backoff_factor=settings.FASTSTATS_RETRY_BACKOFF,
+                status_forcelist=[502, 503, 504],
+                raise_on_status=False,
+            )
+            rest_client = RESTClientObject(config)
+            if settings.FASTSTATS_TCP_KEEPALIVE:
+                rest_client.pool_manager.connection_pool_kw["socket_options"] = [
+                    *HTTPConnection.default_socket_options,
+                    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+                ]
+            _rest_clients[base_url] = rest_client
+    return rest_client
+
+
+def get_pool_stats():
+    """Return dict of FastStats URL -> counts of its pooled connections in this process."""
+    with _lock:
+        rest_clients = list(_rest_clients.items())
+
+    stats = {}
+    for base_url, rest_client in rest_clients:
+        pools = rest_client.pool_manager.pools
+        url_stats = {"requests": 0, "connections_opened": 0, "idle_connections": 0}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:  # evicted since listed
+                continue
+            url_stats["requests"] += pool.num_requests
+            url_stats["connections_opened"] += pool.num_connections
+            with pool.pool.mutex:
+                # Slots without an open connection hold None
+                url_stats["idle_connections"] += sum(conn is not None for conn in pool.pool.queue)
+        url_stats["max_connections"] = settings.FASTSTATS_POOL_SIZE
+        stats[base_url] = url_stats
+    return stats
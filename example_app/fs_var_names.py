@@ -6,6 +6,7 @@ The numbers and letters in the comments note where the variable is used in the p
 - 3: example_three_code.py
 - 4: example_four_code.py
 - a: api_shared_methods.py
+- c: airport_coordinates.py
 - v: views.py
 - t: tests.py
 
@@ -14,17 +15,17 @@ The numbers and letters in the comments note where the variable is used in the p
 # Virtual Variables
 # Combined Categories VV: Reporting Period combined up to years: 2, 4
 REPORTING_PERIOD_YEARS_CODE = "fl1FOVRG"
-# Expression VV: Flight route name: 3
+# Expression VV: Flight route name
 ROUTE_NAME_CODE = "fl1H1F70"
 
 #
-REPORTING_AIRPORT_CODE = "reRepor1"  # 1, 3, 4, v, t
+REPORTING_AIRPORT_CODE = "reRepor1"  # 1, 3, 4, c, v, t
 AIRLINE_NAME_CODE = "flAirlin"  # 4, v, t
-ORIGIN_DESTINATION_CODE = "flOrigi1"  # 1, 4, v, t
+ORIGIN_DESTINATION_CODE = "flOrigi1"  # 1, 3, 4, c, v, t
 REPORTING_PERIOD_CODE = "flReport"  # 2, 4, a, t
 
 # Latitude and Longitude variables
-ORIGIN_AIRPORT_LONGITUDE = "AiLongit"  # 3, 4, t
-ORIGIN_AIRPORT_LATITUDE = "AiLatitu"  # 3, 4, t
-REPORTING_AIRPORT_LONGITUDE = "AiLongi1"  # 3
-REPORTING_AIRPORT_LATITUDE = "AiLatit1"  # 3
+ORIGIN_AIRPORT_LONGITUDE = "AiLongit"  # 4, c, t
+ORIGIN_AIRPORT_LATITUDE = "AiLatitu"  # 4, c, t
+REPORTING_AIRPORT_LONGITUDE = "AiLongi1"  # c
+REPORTING_AIRPORT_LATITUDE = "AiLatit1"  # c
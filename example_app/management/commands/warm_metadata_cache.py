@@ -0,0 +1,47 @@
+import getpass
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+from example_app.api_shared_methods import (
+    fetch_codes_with_filter,
+    get_metadata_cache_key,
+)
+from example_app.fs_var_names import AIRLINE_NAME_CODE, REPORTING_AIRPORT_CODE
+from example_app.views import start_session
+
+# (variable code, limit) pairs used to populate the example dropdowns
+DROPDOWN_SELECTORS = [
+    (REPORTING_AIRPORT_CODE, 0),  # Examples one, three and four
+    (AIRLINE_NAME_CODE, 10001),  # Example four
+]
+
+
+class Command(BaseCommand):
+    help = "Populate the FastStats metadata cache with the selector lists used by the dropdowns."
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="FastStats API URL, normally ending '/OrbitAPI'")
+        parser.add_argument("data_view", help="Name of the data view")
+        parser.add_argument("system_name", help="Name of the FastStats system")
+        parser.add_argument("username", help="FastStats username")
+        parser.add_argument("--password", help="FastStats password (prompted for if not given)")
+
+    def handle(self, *args, **options):
+        password = options["password"] or getpass.getpass("Enter your password: ")
+        session = start_session(
+            options["username"],
+            password,
+            options["url"],
+            options["system_name"],
+            options["data_view"],
+        )
+
+        metadata_cache = caches["faststats_metadata"]
+        for varcode, limit in DROPDOWN_SELECTORS:
+            variable_descs = fetch_codes_with_filter(session, varcode, limit)
+            key = get_metadata_cache_key(session, "codes_with_filter", varcode, limit)
+            metadata_cache.set(key, variable_descs)
+            self.stdout.write(f"Cached {len(variable_descs)} values for '{varcode}' (> {limit} routes)")
+
+        self.stdout.write(self.style.SUCCESS("Metadata cache is warm."))
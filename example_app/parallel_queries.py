@@ -0,0 +1,69 @@
+import contextvars
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+query_executor = ThreadPoolExecutor(
+    max_workers=settings.QUERY_WORKERS, thread_name_prefix="faststats-query"
+)
+
+
+def run_queries(*queries, timeout=None):
+    """Run independent FastStats queries in parallel, returning results in order.
+
+    Each query is a tuple of a function followed by its arguments,
+    e.g. run_queries((get_cube, session, dims), (get_datagrid, session, cols)).
+
+    Each query has 'timeout' seconds (QUERY_TIMEOUT if not given) to start
+    running, queued behind other requests' queries in the shared thread pool,
+    and then 'timeout' seconds from when it starts. If any query raises, or
+    misses either deadline, queries that haven't started yet are cancelled and
+    the error (or TimeoutError) is raised. Queries already running can't be
+    interrupted, so their results are discarded.
+
+    Don't call this from inside a query, as it could wait on its own thread pool.
+    """
+    if timeout is None:
+        timeout = settings.QUERY_TIMEOUT
+
+    submitted = time.monotonic()
+    started = {}  # future position -> time.monotonic() when the query started running
+
+    def run_query(position, context, func, args):
+        started[position] = time.monotonic()
+        return context.run(func, *args)
+
+    # Each query runs in a copy of the caller's context, so its stages are timed
+    futures = [
+        query_executor.submit(run_query, position, contextvars.copy_context(), func, args)
+        for position, (func, *args) in enumerate(queries)
+    ]
+    done, not_done = set(), set(futures)
+    while not_done:
+        now = time.monotonic()
+        # Until a query starts, its deadline is to start within timeout of submitting
+        next_deadline = min(
+            started.get(position, submitted) + timeout
+            for position, future in enumerate(futures)
+            if future in not_done
+        )
+        if next_deadline <= now:
+            break
+        newly_done, not_done = wait(
+            not_done, timeout=next_deadline - now, return_when=FIRST_EXCEPTION
+        )
+        done |= newly_done
+        if any(future.exception() is not None for future in newly_done):
+            break
+    for future in not_done:
+        future.cancel()
+
+    for future in futures:
+        if future in done and future.exception() is not None:
+            raise future.exception()
+    if not_done:
+        raise TimeoutError(
+            f"FastStats queries did not start, or finish once started, within {timeout} seconds"
+        )
+    return [future.result() for future in futures]
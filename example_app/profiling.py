@@ -0,0 +1,182 @@
+import cProfile
+import datetime
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_HEADER = "X-Profile"
+
+# Only one request is profiled at a time, as profilers can't always run concurrently
+_profile_lock = threading.Lock()
+
+
+class CProfileProfiler:
+    """Deterministic profile of every function call, saved in pstats format."""
+
+    name = "cprofile"
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def save(self, path):
+        """Save profile to 'path' plus an extension, returning the file name."""
+        filename = path + ".prof"
+        self._profile.dump_stats(filename)
+        return os.path.basename(filename)
+
+
+class PyinstrumentProfiler:
+    """Sampling profile from pyinstrument, saved as speedscope JSON if supported."""
+
+    name = "pyinstrument"
+
+    def __init__(self):
+        self._profiler = pyinstrument.Profiler()
+
+    def start(self):
+        self._profiler.start()
+
+    def stop(self):
+        self._profiler.stop()
+
+    def save(self, path):
+        """Save profile to 'path' plus an extension, returning the file name."""
+        try:
+            from pyinstrument.renderers import SpeedscopeRenderer
+        except ImportError:  # pyinstrument < 4
+            filename, output = path + ".html", self._profiler.output_html()
+        else:
+            filename = path + ".speedscope.json"
+            output = self._profiler.output(SpeedscopeRenderer())
+        with open(filename, "w", encoding="utf-8") as file:
+            file.write(output)
+        return os.path.basename(filename)
+
+
+class ProfilingMiddleware:
+    """Profile a random sample of requests, and requests flagged by staff users.
+
+    A fraction PROFILE_SAMPLE_RATE of requests are profiled at random.
+    If PROFILE_ON_REQUEST is set, staff users can also profile a request by
+    adding '?profile' to its URL or sending an 'X-Profile' header.
+    Each profile is saved in PROFILE_DIR next to a JSON file describing the
+    request, and only the newest PROFILE_MAX_FILES profiles are kept.
+
+    Only the thread handling the request is profiled,
+    so time spent in run_queries shows as waiting for its threads.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reason = get_profile_reason(request)
+        if reason is None or not _profile_lock.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            profiler = get_profiler()
+            started_at = datetime.datetime.now()
+            start = time.perf_counter()
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+            duration = time.perf_counter() - start
+            save_profile(profiler, request, response, reason, started_at, duration)
+        finally:
+            _profile_lock.release()
+        return response
+
+
+def get_profile_reason(request):
+    """Return why request should be profiled ('requested' or 'sampled'), or None."""
+    if settings.PROFILE_ON_REQUEST and (
+        PROFILE_QUERY_PARAM in request.GET or PROFILE_HEADER in request.headers
+    ):
+        user = getattr(request, "user", None)
+        if user is not None and user.is_staff:
+            return "requested"
+    if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def get_profiler():
+    """Return new profiler of the kind set by PROFILER."""
+    if settings.PROFILER == "pyinstrument" or (
+        settings.PROFILER == "auto" and pyinstrument is not None
+    ):
+        return PyinstrumentProfiler()
+    return CProfileProfiler()
+
+
+def save_profile(profiler, request, response, reason, started_at, duration):
+    """Save profile and request details to PROFILE_DIR, then remove the oldest."""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    view = getattr(request.resolver_match, "url_name", None) or "unresolved"
+    stem = f"{started_at:%Y%m%dT%H%M%S}-{view}-{uuid.uuid4().hex[:8]}"
+    path = os.path.join(settings.PROFILE_DIR, stem)
+
+    profile_file = profiler.save(path)
+    user = getattr(request, "user", None)
+    metadata = {
+        "profile": profile_file,
+        "profiler": profiler.name,
+        "reason": reason,
+        "started_at": started_at.isoformat(),
+        "duration_ms": round(duration * 1000, 1),
+        "view": view,
+        "method": request.method,
+        "path": request.path,
+        "query_string": request.META.get("QUERY_STRING", ""),
+        "status": response.status_code,
+        "user": user.get_username() if user is not None and user.is_authenticated else None,
+        "pid": os.getpid(),
+    }
+    with open(path + ".json", "w", encoding="utf-8") as file:
+        json.dump(metadata, file, indent=2)
+
+    remove_old_profiles(settings.PROFILE_DIR, settings.PROFILE_MAX_FILES)
+
+
+def remove_old_profiles(directory, max_profiles):
+    """Delete all but the newest 'max_profiles' profiles (and their details) in directory."""
+    metadata_files = sorted(
+        (
+            entry
+            for entry in os.scandir(directory)
+            if entry.name.endswith(".json") and not entry.name.endswith(".speedscope.json")
+        ),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in metadata_files[:max(len(metadata_files) - max_profiles, 0)]:
+        paths = [entry.path]
+        try:
+            with open(entry.path, encoding="utf-8") as file:
+                paths.insert(0, os.path.join(directory, json.load(file)["profile"]))
+        except (OSError, ValueError, KeyError):
+            pass
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Already removed by another process
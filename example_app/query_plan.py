@@ -0,0 +1,103 @@
+"""Cube dimensions filtered by FastStats, so only the cells a chart needs are sent.
+
+FastStats can leave out a dimension's unclassified category, keep only its top
+N categories or those with at least a minimum count, and keep only categories
+with records in a filter query. Planning the views' filters into the cube query
+this way replaces filtering the whole cube in pandas after it has been sent.
+"""
+from functools import reduce
+from operator import mul
+
+import apteco_api as aa
+import pandas as pd
+from apteco.common import VariableType
+from django.core.cache import caches
+
+from .cube_cache import get_cube_fingerprint
+from .fs_var_names import REPORTING_PERIOD_CODE, REPORTING_PERIOD_YEARS_CODE
+from .single_flight import coalesce
+from .timing import stage
+from .typed_results import DATE_BANDINGS, TypedCube, get_values_slice
+
+
+class PlannedDimension:
+    """Cube dimension whose categories are filtered by FastStats.
+
+    Has the same attributes as the selector variable or date banding it wraps,
+    so it can be used anywhere the unplanned dimension could.
+    """
+
+    def __init__(
+        self,
+        dimension,
+        filter_query=None,
+        minimum_category_count=None,
+        top_n_category_count=None,
+    ):
+        self.dimension = dimension
+        self.filter_query = filter_query
+        self.minimum_category_count = minimum_category_count
+        self.top_n_category_count = top_n_category_count
+        # The typed cube finds values by header position, which needs a known banding
+        self.omit_unclassified = (
+            dimension.type == VariableType.SELECTOR or dimension.banding in DATE_BANDINGS
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.dimension, name)
+
+    def _to_model_dimension(self):
+        model = self.dimension._to_model_dimension()
+        model.omit_unclassified = self.omit_unclassified
+        if self.filter_query is not None:
+            model.filter_query = aa.Query(selection=self.filter_query._to_model_selection())
+        model.minimum_category_count = self.minimum_category_count
+        model.top_n_category_count = self.top_n_category_count
+        return model
+
+
+def get_period_dimension(session, selected_year=None):
+    """Return reporting period dimension: the months of 'selected_year', else all years."""
+    routes = session.tables["Flight Route"]
+    if selected_year is None:
+        return PlannedDimension(routes[REPORTING_PERIOD_CODE].year)
+    return PlannedDimension(
+        routes[REPORTING_PERIOD_CODE].month,
+        filter_query=routes[REPORTING_PERIOD_YEARS_CODE] == selected_year,
+    )
+
+
+def get_top_codes(session, variable, limit, selection=None):
+    """Return codes of the 'limit' categories of selector 'variable' with most flight routes.
+
+    Ranked from a one-dimensional cube, which is a single cell per category,
+    with ties broken in category order as nlargest does. Results are shared
+    between users and processes through the metadata cache, and concurrent
+    requests for the same ranking send FastStats one query.
+    """
+    routes = session.tables["Flight Route"]
+    dimension = PlannedDimension(variable)
+    fingerprint = get_cube_fingerprint(session, [dimension], selection, routes)
+    metadata_cache = caches["faststats_metadata"]
+    key = f"top_codes:{fingerprint}:{limit}"
+
+    def fetch():
+        with stage("query"):
+            cube = TypedCube([dimension], selection=selection, table=routes, session=session)
+        values = get_values_slice(dimension)
+        totals = pd.Series(cube._data[0][values], index=cube._headers[0]["codes"][values])
+        codes = totals.nlargest(limit).index.to_list()
+        metadata_cache.set(key, codes)
+        return codes
+
+    return coalesce(key, lambda: metadata_cache.get(key), fetch)
+
+
+def get_nonzero_dimension(variable, limit=0):
+    """Return selector dimension of the categories with more than 'limit' records."""
+    return PlannedDimension(variable, minimum_category_count=limit + 1)
+
+
+def count_cube_cells(cube):
+    """Return number of cells sent for a cube, including unclassified and totals."""
+    return reduce(mul, cube._sizes, 1) * len(cube._measure_names)
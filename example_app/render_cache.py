@@ -0,0 +1,119 @@
+import functools
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from django.conf import settings
+
+from .api_shared_methods import iter_html
+from .disk_cache import DiskCache
+
+
+class MemoryCache:
+    """Thread-safe LRU store of strings, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size in bytes)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                __, (__, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+
+memory_store = MemoryCache(settings.RENDER_CACHE_MEMORY_BYTES)
+disk_store = DiskCache(
+    settings.RENDER_CACHE_DIR, settings.RENDER_CACHE_DISK_BYTES, suffix=".html"
+)
+
+
+def cached_render(make_html):
+    """Decorate chart function taking a DataFrame, caching the HTML it returns.
+
+    Fragments are keyed on a hash of the DataFrame's contents plus the other
+    arguments, so a repeated selection skips building and serializing the
+    figure. Rendered fragments are held in memory and on disk.
+    """
+
+    @functools.wraps(make_html)
+    def wrapper(df, *args, **kwargs):
+        # Hash before rendering, as chart functions may modify the DataFrame
+        key = get_render_key(make_html.__qualname__, df, *args, **kwargs)
+
+        html = memory_store.get(key)
+        if html is not None:
+            return html
+
+        blob = disk_store.get(key)
+        if blob is not None:
+            html = blob.decode("utf-8")
+        else:
+            html = make_html(df, *args, **kwargs)
+            disk_store.set(key, html.encode("utf-8"))
+        memory_store.set(key, html)
+        return html
+
+    return wrapper
+
+
+def iter_cached_figure_html(make_figure, df, *args, **kwargs):
+    """Yield HTML for figure make_figure(df, ...) in chunks, without plotly.js.
+
+    Cached like cached_render. On a miss, the figure is streamed as it is
+    serialized and written to the disk store at the same time, rather than
+    being held in memory whole.
+    """
+    key = get_render_key(make_figure.__qualname__, df, *args, **kwargs)
+
+    html = memory_store.get(key)
+    if html is None:
+        blob = disk_store.get(key)
+        if blob is not None:
+            html = blob.decode("utf-8")
+            memory_store.set(key, html)
+    if html is not None:
+        yield html
+        return
+
+    # Figures are built as plotly objects, or as dicts on purpose to skip validation
+    fig = make_figure(df, *args, **kwargs)
+    with disk_store.open_for_write(key) as file:
+        for chunk in iter_html(fig, validate=False, include_plotlyjs=False):
+            file.write(chunk.encode("utf-8"))
+            yield chunk
+
+
+def get_render_key(name, df, *args, **kwargs):
+    """Return content hash of chart 'name' drawn from 'df' with the given parameters."""
+    digest = hashlib.sha256()
+    digest.update(name.encode("utf-8"))
+    params = [args, kwargs, list(df.columns), list(df.dtypes.astype(str))]
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
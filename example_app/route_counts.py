@@ -0,0 +1,112 @@
+"""Flight route counts between every origin and destination, looked up without a query.
+
+The counts for all pairs come from one cube and are saved as a NumPy matrix,
+which each worker process memory-maps, so the matrix is built once per data
+view and reporting period max_date and shared by every process. An index is
+rebuilt when FastStats reports a new max_date, on the first lookup after it.
+"""
+import hashlib
+import json
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .disk_cache import DiskCache
+from .fs_var_names import REPORTING_PERIOD_CODE
+from .single_flight import coalesce
+from .timing import stage
+
+count_store = DiskCache(
+    settings.ROUTE_COUNT_INDEX_DIR, settings.ROUTE_COUNT_INDEX_MAX_BYTES, suffix=".npy"
+)
+code_store = DiskCache(
+    settings.ROUTE_COUNT_INDEX_DIR, settings.ROUTE_COUNT_INDEX_MAX_BYTES, suffix=".json"
+)
+_indexes = {}  # index key -> RouteCountIndex
+_lock = threading.Lock()
+
+
+class RouteCountIndex:
+    """Flight route counts by reporting airport (row) and destination (column) code."""
+
+    def __init__(self, counts, origin_codes, dest_codes):
+        self.counts = counts
+        self.origin_rows = {code: row for row, code in enumerate(origin_codes)}
+        self.dest_columns = {code: column for column, code in enumerate(dest_codes)}
+
+    def count(self, origin_code, dest_code):
+        """Return number of flight routes from 'origin_code' to 'dest_code'."""
+        row = self.origin_rows.get(origin_code)
+        column = self.dest_columns.get(dest_code)
+        if row is None or column is None:
+            return 0
+        return int(self.counts[row, column])
+
+
+def get_route_count_index(session, fetch_counts):
+    """Return route count index for the session's data view, building it if needed.
+
+    'fetch_counts' returns a DataFrame of counts for every origin (row)
+    and destination (column), indexed by their codes.
+    """
+    key = get_index_key(session)
+    with _lock:
+        index = _indexes.get(key)
+    if index is not None:
+        return index
+
+    def load():
+        with stage("count_index"):
+            return load_index(key)
+
+    def fetch():
+        counts = fetch_counts(session)
+        with stage("count_index"):
+            save_index(key, counts)
+            index = load_index(key)
+        if index is None:  # already evicted, e.g. by a small size limit
+            index = RouteCountIndex(counts.to_numpy(), counts.index, counts.columns)
+        return index
+
+    # Concurrent requests send FastStats one query to build the index
+    index = coalesce(key, load, fetch)
+    with _lock:
+        _indexes[key] = index
+    return index
+
+
+def save_index(key, counts):
+    """Store DataFrame of route counts on disk as a matrix and its codes."""
+    codes = {"origins": counts.index.to_list(), "destinations": counts.columns.to_list()}
+    # Codes first, as the matrix being present marks the index as complete
+    code_store.set(key, json.dumps(codes).encode("utf-8"))
+    with count_store.open_for_write(key) as file:
+        np.save(file, counts.to_numpy(dtype=np.int64))
+
+
+def load_index(key):
+    """Return index stored on disk against 'key' with its matrix memory-mapped, or None."""
+    path = count_store.get_path(key)
+    blob = code_store.get(key)
+    if path is None or blob is None:
+        return None
+    try:
+        counts = np.load(path, mmap_mode="r")
+    except FileNotFoundError:  # evicted by another process
+        return None
+    codes = json.loads(blob)
+    return RouteCountIndex(counts, codes["origins"], codes["destinations"])
+
+
+def get_index_key(session):
+    """Return key for the route count index on the session's data view, build and max_date."""
+    max_date = session.variables[REPORTING_PERIOD_CODE].max_date
+    parts = [
+        session.base_url,
+        session.system,
+        session.data_view,
+        str(session.system_info.build_date),
+        f"{max_date:%Y%m%d}",
+    ]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
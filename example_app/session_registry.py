@@ -0,0 +1,85 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .faststats_client import PooledSession
+
+
+class SessionRegistry:
+    """Bounded, thread-safe store of live FastStats sessions, keyed by session ID.
+
+    Deserializing a session rebuilds the API client and reloads all table and
+    variable metadata, so live sessions are kept here and reused across requests.
+    Entries are evicted least-recently-used first once 'max_size' is reached,
+    and expire 'ttl' seconds after they were created.
+
+    """
+
+    def __init__(self, max_size=64, ttl=1800):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # session ID -> (serialized, session, expiry)
+        self._lock = threading.Lock()
+
+    def get(self, serialized_session):
+        """Return live session for 'serialized_session', deserializing on a miss."""
+        session_id = get_session_id(serialized_session)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                serialized, session, expiry = entry
+                if serialized == serialized_session and expiry > time.monotonic():
+                    self._sessions.move_to_end(session_id)
+                    return session
+                del self._sessions[session_id]
+
+        # Deserialize outside the lock, as it makes several calls to the API
+        session = PooledSession.deserialize(serialized_session)
+        self._store(session_id, serialized_session, session)
+        return session
+
+    def add(self, session):
+        """Register a newly created session, returning its serialized form."""
+        serialized_session = session.serialize()
+        self._store(session.session_id, serialized_session, session)
+        return serialized_session
+
+    def discard(self, serialized_session):
+        """Remove the session for 'serialized_session', if present."""
+        session_id = get_session_id(serialized_session)
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def clear(self):
+        """Remove all sessions."""
+        with self._lock:
+            self._sessions.clear()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _store(self, session_id, serialized_session, session):
+        expiry = time.monotonic() + self.ttl
+        with self._lock:
+            self._sessions[session_id] = (serialized_session, session, expiry)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+
+
+def get_session_id(serialized_session):
+    """Return FastStats session ID from serialized session, without deserializing."""
+    try:
+        return json.loads(serialized_session)["session_id"]
+    except (ValueError, KeyError, TypeError):
+        # Fall back to the raw string so malformed input still fails in deserialize
+        return serialized_session
+
+
+session_registry = SessionRegistry(
+    max_size=settings.API_SESSION_CACHE_SIZE,
+    ttl=settings.API_SESSION_CACHE_TTL,
+)
@@ -0,0 +1,161 @@
+"""Identical FastStats queries from concurrent requests, sent to FastStats once.
+
+When a shared dashboard is opened by many users together, each request misses
+the caches at the same moment and would send FastStats the same query.
+Instead, callers with the same query key wait for the first of them to finish,
+on a lock per key within a process and on a lock file per key across processes,
+then read its result from the cache it was stored in.
+"""
+import contextlib
+import hashlib
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .timing import stage
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_POLL_SECONDS = 0.05
+
+_key_locks = {}  # key -> [lock, number of callers using it]
+_key_locks_lock = threading.Lock()
+_held = threading.local()  # .keys: keys whose locks this thread holds
+
+
+def coalesce(key, load, fetch):
+    """Return result of load(), or of fetch() if load() returns None.
+
+    'fetch' runs the query and stores its result where 'load' finds it.
+    Concurrent callers with the same 'key' wait for the first to fetch,
+    then load its result, so the query only reaches FastStats once.
+    """
+    result = load()
+    if result is None:
+        with single_flight(key):
+            # Stored by another caller while this one waited
+            result = load()
+            if result is None:
+                result = fetch()
+    return result
+
+
+@contextlib.contextmanager
+def single_flight(key, timeout=None):
+    """Hold the lock for 'key' in this process and across processes.
+
+    Waits at most 'timeout' seconds (QUERY_TIMEOUT if not given) for the locks,
+    then carries on without them, so a stuck query can't hold up the others.
+    A thread already holding the locks for 'key' carries on straight away.
+    """
+    held_keys = _held.__dict__.setdefault("keys", set())
+    if key in held_keys:
+        yield
+        return
+    if timeout is None:
+        timeout = settings.QUERY_TIMEOUT
+    deadline = time.monotonic() + timeout
+    with contextlib.ExitStack() as locks:
+        with stage("single_flight"):
+            locks.enter_context(process_lock(key, deadline))
+            locks.enter_context(file_lock(key, deadline))
+        held_keys.add(key)
+        try:
+            yield
+        finally:
+            held_keys.discard(key)
+
+
+@contextlib.contextmanager
+def process_lock(key, deadline):
+    """Hold the lock for 'key' shared by threads in this process, if got by 'deadline'."""
+    with _key_locks_lock:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    lock = entry[0]
+    acquired = lock.acquire(timeout=max(deadline - time.monotonic(), 0))
+    try:
+        yield
+    finally:
+        if acquired:
+            lock.release()
+        with _key_locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _key_locks[key]
+
+
+@contextlib.contextmanager
+def file_lock(key, deadline):
+    """Hold the lock file for 'key' shared by every process, if got by 'deadline'.
+
+    Where the OS allows it, the file is removed before it is unlocked, so lock
+    files don't pile up, and a process that locked a removed file tries again.
+    """
+    os.makedirs(settings.QUERY_LOCK_DIR, exist_ok=True)
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    path = os.path.join(settings.QUERY_LOCK_DIR, f"{digest}.lock")
+    while True:
+        with open(path, "a+b") as file:
+            acquired = try_lock(file)
+            while not acquired and time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_SECONDS)
+                acquired = try_lock(file)
+            if acquired and not is_current(file, path):
+                unlock(file)
+                continue
+            try:
+                yield
+            finally:
+                if acquired:
+                    remove_lock_file(path)
+                    unlock(file)
+            return
+
+
+def is_current(file, path):
+    """Return whether open 'file' is still the lock file at 'path'."""
+    if fcntl is None:  # open files can't be removed on Windows, so it must be
+        return True
+    try:
+        return os.path.samestat(os.fstat(file.fileno()), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+def remove_lock_file(path):
+    """Remove lock file at 'path' while it is still locked, where the OS allows it."""
+    if fcntl is None:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def try_lock(file):
+    """Return whether an exclusive lock on 'file' was taken, without waiting for it."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def unlock(file):
+    """Release lock on 'file' taken by try_lock()."""
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
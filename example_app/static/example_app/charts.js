@@ -0,0 +1,184 @@
+// Draws the example charts in the browser from their JSON data endpoints.
+// Expects a #chart-data element with the chart's name and data URL, and plotly.js loaded.
+(function () {
+    var container = document.getElementById("chart-data");
+    // plotly express's sequential YlOrRd scale, as used by the server-side map
+    var YL_OR_RD = [
+        [0.0, "rgb(255,255,204)"], [0.125, "rgb(255,237,160)"], [0.25, "rgb(254,217,118)"],
+        [0.375, "rgb(254,178,76)"], [0.5, "rgb(253,141,60)"], [0.625, "rgb(252,78,42)"],
+        [0.75, "rgb(227,26,28)"], [0.875, "rgb(189,0,38)"], [1.0, "rgb(128,0,38)"]
+    ];
+
+    function showAlert(message) {
+        container.innerHTML = '<div class="alert alert-danger" role="alert" style="margin-left:14px;"></div>';
+        container.firstChild.textContent = message;
+    }
+
+    function drawExampleTwo(data) {
+        var traces = data.series.map(function (series) {
+            return {
+                type: "scatter",
+                mode: "lines+markers",
+                name: series.name,
+                x: series.x.map(function (i) { return data.dates[i]; }),
+                y: series.y
+            };
+        });
+        var layout = {
+            xaxis: {title: {text: data.x_title}},
+            yaxis: {title: {text: "Number of Flight Routes"}},
+            width: 1500,
+            height: 800
+        };
+        if (data.month_names) {
+            layout.xaxis.tickvals = data.dates;
+            layout.xaxis.ticktext = data.month_names;
+        }
+        return Plotly.newPlot(container, traces, layout, {responsive: true});
+    }
+
+    function drawExampleThree(data) {
+        // One trace draws every route, with a gap (null) after each
+        var routes = data.routes, lon = [], lat = [], text = [];
+        for (var i = 0; i < routes.name.length; i++) {
+            lon.push(routes.lon[i], data.airport.lon, null);
+            lat.push(routes.lat[i], data.airport.lat, null);
+            text.push(routes.name[i], routes.name[i], null);
+        }
+        var trace = {
+            type: "scattergeo",
+            mode: "lines+markers",
+            line: {width: 3},
+            lon: lon,
+            lat: lat,
+            text: text,
+            hoverinfo: "lon+lat+text",
+            name: "Flight routes"
+        };
+        var layout = {
+            geo: {showcountries: true, projection: {type: "orthographic"}},
+            width: 1500,
+            height: 700
+        };
+        return Plotly.newPlot(container, [trace], layout, {responsive: true});
+    }
+
+    function drawExampleFour(data) {
+        if (data.routes.length === 0) {
+            showAlert("No flight routes were found in this selection");
+            return Promise.resolve();
+        }
+        var destinations = data.destinations;
+        var maxRoutes = Math.max.apply(null, data.routes);
+        var frames = data.frames.map(function (name) {
+            return {name: name, lat: [], lon: [], text: [], routes: []};
+        });
+        data.routes.forEach(function (routes, row) {
+            var frame = frames[data.frame[row]], destination = data.destination[row];
+            frame.lat.push(destinations.lat[destination]);
+            frame.lon.push(destinations.lon[destination]);
+            frame.text.push(destinations.name[destination]);
+            frame.routes.push(routes);
+        });
+
+        function makeTrace(frame) {
+            return {
+                type: "scattergeo",
+                geo: "geo",
+                lat: frame.lat,
+                lon: frame.lon,
+                text: frame.text,
+                hovertemplate: data.frame_title + "=" + frame.name +
+                    "<br>Flight Routes=%{marker.color}<br>Origin Destination=%{text}<extra></extra>",
+                marker: {
+                    color: frame.routes,
+                    coloraxis: "coloraxis",
+                    size: frame.routes,
+                    sizemode: "area",
+                    sizeref: maxRoutes / (30 * 30)
+                },
+                showlegend: false
+            };
+        }
+
+        var animateArgs = {
+            frame: {duration: 0, redraw: true},
+            mode: "immediate",
+            fromcurrent: true,
+            transition: {duration: 0, easing: "linear"}
+        };
+        var layout = {
+            geo: {projection: {type: "natural earth"}},
+            coloraxis: {
+                colorscale: YL_OR_RD,
+                colorbar: {title: {text: "Flight Routes"}}
+            },
+            margin: {t: 60},
+            width: 1500,
+            height: 800,
+            updatemenus: [{
+                type: "buttons",
+                direction: "left",
+                showactive: false,
+                pad: {r: 10, t: 70},
+                x: 0.1,
+                xanchor: "right",
+                y: 0,
+                yanchor: "top",
+                buttons: [
+                    {
+                        label: "&#9654;",
+                        method: "animate",
+                        args: [null, {
+                            frame: {duration: 500, redraw: true},
+                            mode: "immediate",
+                            fromcurrent: true,
+                            transition: {duration: 500, easing: "linear"}
+                        }]
+                    },
+                    {label: "&#9724;", method: "animate", args: [[null], animateArgs]}
+                ]
+            }],
+            sliders: [{
+                active: 0,
+                currentvalue: {prefix: data.frame_title + "="},
+                len: 0.9,
+                pad: {b: 10, t: 60},
+                x: 0.1,
+                xanchor: "left",
+                y: 0,
+                yanchor: "top",
+                steps: frames.map(function (frame) {
+                    return {label: frame.name, method: "animate", args: [[frame.name], animateArgs]};
+                })
+            }]
+        };
+        var plotlyFrames = frames.map(function (frame) {
+            return {name: frame.name, data: [makeTrace(frame)]};
+        });
+        return Plotly.newPlot(container, [makeTrace(frames[0])], layout, {responsive: true})
+            .then(function () { return Plotly.addFrames(container, plotlyFrames); })
+            .then(function () { return Plotly.animate(container, null); });
+    }
+
+    var drawChart = {
+        example_two: drawExampleTwo,
+        example_three: drawExampleThree,
+        example_four: drawExampleFour
+    }[container.dataset.chart];
+
+    fetch(container.dataset.url, {credentials: "same-origin"})
+        .then(function (response) {
+            if (!response.ok) {
+                throw new Error("Chart data request failed");
+            }
+            return response.json();
+        })
+        .then(function (data) {
+            container.innerHTML = "";
+            return drawChart(data);
+        })
+        .catch(function () {
+            showAlert("The chart could not be created, please try again.");
+        });
+})();
@@ -1,16 +1,70 @@
+import datetime
+import glob
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from apteco.common import VariableType
 from apteco.session import Session
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import caches
 from django.test import SimpleTestCase, TestCase
+from plotly import graph_objects as go
+from plotly import io as pio
 
-from .api_shared_methods import get_codes_with_filter, get_reporting_years
+from benchmarks.fake_faststats import start_server
+from benchmarks.synthetic import make_cube_df
+
+from .airport_coordinates import (
+    get_destination_coordinates,
+    get_reporting_airport_coordinates,
+)
+from .api_shared_methods import (
+    create_and_filter_cube_dataframe,
+    get_codes_with_filter,
+    get_metadata_cache_key,
+    get_reporting_years,
+    iter_html,
+)
+from .chart_jobs import submit_chart_job
+from .cube_cache import (
+    CachedCube,
+    cube_store,
+    get_cube,
+    get_cube_fingerprint,
+    read_dataframe,
+    write_dataframe,
+)
+from .cube_partitions import get_period_cube, partition_store
+from .disk_cache import DiskCache
 from .example_four_code import (
     get_example_four_cube,
     get_example_four_dataframe,
-    get_example_four_datagrid,
+    make_example_four_figure,
+)
+from .example_one_code import (
+    get_example_one_count,
+    get_example_one_counts,
+    query_example_one_count,
 )
-from .example_one_code import get_example_one_count
-from .example_three_code import get_example_three_dataframe
-from .example_two_code import get_example_two_dataframe
+from .example_three_code import EXAMPLE_THREE_COLUMNS, get_example_three_dataframe
+from .example_two_code import (
+    get_example_two_data,
+    get_example_two_dataframe,
+    get_example_two_traces,
+)
+from .faststats_client import PooledSession, get_pool_stats
 from .fs_credentials import DATA_VIEW, PASSWORD, SYSTEM_NAME, URL, USERNAME
 from .fs_var_names import (
     AIRLINE_NAME_CODE,
@@ -19,7 +73,27 @@ from .fs_var_names import (
     ORIGIN_AIRPORT_LONGITUDE,
     REPORTING_AIRPORT_CODE,
     REPORTING_PERIOD_CODE,
+    REPORTING_PERIOD_YEARS_CODE,
+)
+from .parallel_queries import query_executor, run_queries
+from .query_plan import (
+    PlannedDimension,
+    count_cube_cells,
+    get_period_dimension,
+    get_top_codes,
+)
+from .render_cache import get_render_key
+from .route_counts import (
+    code_store,
+    count_store,
+    get_index_key,
+    get_route_count_index,
+    load_index,
 )
+from .session_registry import SessionRegistry
+from .single_flight import coalesce, single_flight
+from .timing import StageTimings
+from .typed_results import TypedCube, parse_export_rows, parse_measure_rows
 from .views import start_session
 
 session_details = {
@@ -39,6 +113,35 @@ class TestSessionCreation(TestCase):
         self.assertIsInstance(session, Session)
 
 
+class TestSessionRegistry(SimpleTestCase):
+    def test_added_session_is_reused(self):
+        registry = SessionRegistry()
+        serialized = registry.add(session)
+        self.assertIs(registry.get(serialized), session)
+
+    def test_discarded_session_is_rebuilt(self):
+        registry = SessionRegistry()
+        serialized = registry.add(session)
+        registry.discard(serialized)
+        self.assertEqual(len(registry), 0)
+        rebuilt = registry.get(serialized)
+        self.assertIsNot(rebuilt, session)
+        self.assertEqual(rebuilt.session_id, session.session_id)
+
+    def test_expired_session_is_rebuilt(self):
+        registry = SessionRegistry(ttl=0)
+        serialized = registry.add(session)
+        self.assertIsNot(registry.get(serialized), session)
+
+    def test_least_recently_used_session_is_evicted(self):
+        registry = SessionRegistry(max_size=1)
+        registry.add(session)
+        other_session = start_session(USERNAME, PASSWORD, URL, SYSTEM_NAME, DATA_VIEW)
+        registry.add(other_session)
+        self.assertEqual(len(registry), 1)
+        self.assertIs(registry.get(other_session.serialize()), other_session)
+
+
 class TestApiEndpoints(TestCase):
     def test_count_with_var_codes(self):
         aberdeen_airport = airports[REPORTING_AIRPORT_CODE] == "ABERDEEN"
@@ -62,6 +165,409 @@ class TestApiEndpoints(TestCase):
         )
 
 
+class TestFakeFastStats(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = start_server(n_routes=5000)
+        cls.fake_session = start_session("tester", "", cls.server.url, "Flight Delays", "fake")
+        cls.index_dir = tempfile.mkdtemp()
+        cls.project_index_dir = count_store.directory
+        count_store.directory = code_store.directory = cls.index_dir
+
+    @classmethod
+    def tearDownClass(cls):
+        count_store.directory = code_store.directory = cls.project_index_dir
+        shutil.rmtree(cls.index_dir)
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_count_matches_data(self):
+        data = self.server.data
+        expected = (data.variables["flOrigi1"].values[data.route_airport == 0] == 1).sum()
+        count = get_example_one_count(self.fake_session, "HEATHROW", "FARO")
+        self.assertEqual(count, expected)
+
+    def test_batch_counts_match_single_counts(self):
+        counts = get_example_one_counts(
+            self.fake_session, ["HEATHROW", "GATWICK"], ["FARO", "MALAGA", "NOWHERE"]
+        )
+        self.assertEqual(counts.index.to_list(), ["HEATHROW", "GATWICK"])
+        self.assertEqual(counts.columns.to_list(), ["FARO", "MALAGA", "NOWHERE"])
+        for origin, dest in [("HEATHROW", "FARO"), ("GATWICK", "MALAGA")]:
+            expected = query_example_one_count(self.fake_session, origin, dest)
+            self.assertEqual(counts.loc[origin, dest], expected)
+        self.assertEqual(counts["NOWHERE"].to_list(), [0, 0])
+
+    def test_batch_counts_cover_every_route(self):
+        counts = get_example_one_counts(self.fake_session)
+        self.assertEqual(counts.shape, (20, 400))
+        self.assertEqual(counts.to_numpy().sum(), 5000)
+
+    def test_sessions_share_pooled_connections(self):
+        other_session = start_session("other", "", self.server.url, "Flight Delays", "fake")
+        rebuilt = PooledSession.deserialize(self.fake_session.serialize())
+        rest_client = self.fake_session.api_client.rest_client
+        self.assertIs(other_session.api_client.rest_client, rest_client)
+        self.assertIs(rebuilt.api_client.rest_client, rest_client)
+        stats = get_pool_stats()[self.server.url]
+        self.assertLess(stats["connections_opened"], stats["requests"])
+        self.assertGreater(stats["idle_connections"], 0)
+
+    def test_example_three_routes_are_named_by_faststats(self):
+        data = self.server.data
+        df = get_example_three_dataframe(self.fake_session, "HEATHROW")
+        route_names = data.variables["fl1H1F70"].values
+        destinations = np.unique(route_names.route_destination[route_names.route_airport == 0])
+        self.assertEqual(len(df), len(destinations))
+        self.assertEqual(
+            sorted(df["Flight Route Name"]), sorted(route_names.names[0, destinations])
+        )
+
+    def test_example_three_unknown_airport_is_empty(self):
+        df = get_example_three_dataframe(self.fake_session, "NOWHERE")
+        self.assertTrue(df.empty)
+        self.assertEqual(df.columns.to_list(), EXAMPLE_THREE_COLUMNS)
+
+    def test_cube_counts_every_route(self):
+        fake_routes = self.fake_session.tables["Flight Route"]
+        df = fake_routes.cube([fake_routes[REPORTING_PERIOD_CODE].year]).to_df()
+        self.assertEqual(df["Flight Routes"].sum(), 5000)
+
+    def test_planned_cube_has_only_kept_categories(self):
+        fake_routes = self.fake_session.tables["Flight Route"]
+        airline = fake_routes[AIRLINE_NAME_CODE]
+        top_rule = airline == ["RYANAIR", "EASYJET", "FLYBE LTD"]
+        dimensions = [
+            PlannedDimension(airline, filter_query=top_rule),
+            get_period_dimension(self.fake_session, "2015"),
+        ]
+        in_2015 = fake_routes[REPORTING_PERIOD_YEARS_CODE] == "2015"
+        cube = TypedCube(dimensions, selection=in_2015 & top_rule, session=self.fake_session)
+        df = cube.to_df()
+        self.assertEqual(count_cube_cells(cube), (3 + 1) * (12 + 1))
+        self.assertEqual(df.index.levels[1].year.unique().tolist(), [2015])
+
+    def test_top_codes_have_most_flight_routes(self):
+        fake_routes = self.fake_session.tables["Flight Route"]
+        airline = fake_routes[AIRLINE_NAME_CODE]
+        in_2015 = fake_routes[REPORTING_PERIOD_YEARS_CODE] == "2015"
+        totals = fake_routes.cube([airline], selection=in_2015).to_df()["Flight Routes"]
+        codes = get_top_codes(self.fake_session, airline, 3, in_2015)
+        self.assertEqual(codes, totals.nlargest(3).index.to_list())
+
+    def test_new_max_date_only_fetches_latest_year(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(setattr, partition_store, "directory", partition_store.directory)
+        partition_store.directory = directory
+
+        fake_routes = self.fake_session.tables["Flight Route"]
+        reporting_period = self.fake_session.variables[REPORTING_PERIOD_CODE]
+        dimension = PlannedDimension(fake_routes[AIRLINE_NAME_CODE])
+        with self.settings(INCREMENTAL_CUBES=False):
+            expected = get_period_cube(self.fake_session, dimension).to_df()
+        with self.settings(INCREMENTAL_CUBES=True):
+            df = get_period_cube(self.fake_session, dimension).to_df()
+            n_years = len(os.listdir(directory))
+
+            self.addCleanup(setattr, reporting_period, "max_date", reporting_period.max_date)
+            reporting_period.max_date += datetime.timedelta(days=1)
+            get_period_cube(self.fake_session, dimension)
+        pd.testing.assert_frame_equal(df, expected, check_index_type=False)
+        self.assertEqual(n_years, 2019 - 1996 + 1)
+        self.assertEqual(len(os.listdir(directory)), n_years + 1)
+
+    def test_concurrent_identical_cubes_are_queried_once(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(setattr, cube_store, "directory", cube_store.directory)
+        cube_store.directory = os.path.join(directory, "cubes")
+
+        fake_routes = self.fake_session.tables["Flight Route"]
+        dimensions = [PlannedDimension(fake_routes[AIRLINE_NAME_CODE])]
+        requests_before = self.server.request_counts["cube"]
+        with self.settings(QUERY_LOCK_DIR=os.path.join(directory, "locks")):
+            with ThreadPoolExecutor(8) as executor:
+                futures = [
+                    executor.submit(get_cube, self.fake_session, dimensions, table=fake_routes)
+                    for __ in range(8)
+                ]
+                dfs = [future.result().to_df() for future in futures]
+        self.assertEqual(self.server.request_counts["cube"], requests_before + 1)
+        for df in dfs[1:]:
+            pd.testing.assert_frame_equal(df, dfs[0])
+
+    def test_route_count_index_is_rebuilt_for_new_max_date(self):
+        index = get_route_count_index(self.fake_session, get_example_one_counts)
+        self.assertEqual(
+            index.count("GATWICK", "MALAGA"),
+            query_example_one_count(self.fake_session, "GATWICK", "MALAGA"),
+        )
+        self.assertEqual(index.count("GATWICK", "NOWHERE"), 0)
+        self.assertIs(get_route_count_index(self.fake_session, get_example_one_counts), index)
+
+        # Another process maps the same matrix rather than querying again
+        key = get_index_key(self.fake_session)
+        mapped = load_index(key)
+        self.assertIsInstance(mapped.counts, np.memmap)
+        self.assertEqual(mapped.counts.sum(), 5000)
+
+        reporting_period = self.fake_session.variables[REPORTING_PERIOD_CODE]
+        self.addCleanup(setattr, reporting_period, "max_date", reporting_period.max_date)
+        reporting_period.max_date += datetime.timedelta(days=1)
+        self.assertIsNot(get_route_count_index(self.fake_session, get_example_one_counts), index)
+        self.assertNotEqual(get_index_key(self.fake_session), key)
+
+
+class TestSingleFlight(SimpleTestCase):
+    def test_stuck_query_lock_is_given_up_after_timeout(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        held, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with single_flight("query"):
+                held.set()
+                release.wait()
+
+        with self.settings(QUERY_LOCK_DIR=directory):
+            holder = threading.Thread(target=hold_lock)
+            holder.start()
+            held.wait()
+            start = time.monotonic()
+            with single_flight("query", timeout=0.2):
+                waited = time.monotonic() - start
+            release.set()
+            holder.join()
+        self.assertGreaterEqual(waited, 0.2)
+        self.assertLess(waited, 5)
+
+    def test_nested_queries_do_not_wait_for_outer_lock(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        def stripe(key):
+            return int(hashlib.sha256(key.encode("utf-8")).hexdigest(), 16) % 256
+
+        # A key which shared a lock file with "query" when keys were spread over 256
+        other_key = next(
+            f"query{i}" for i in itertools.count(1) if stripe(f"query{i}") == stripe("query")
+        )
+
+        def fetch_other():
+            return coalesce(other_key, lambda: None, fetch_same)
+
+        def fetch_same():
+            return coalesce("query", lambda: None, lambda: "fetched")
+
+        start = time.monotonic()
+        with self.settings(QUERY_LOCK_DIR=directory, QUERY_TIMEOUT=1):
+            result = coalesce("query", lambda: None, fetch_other)
+        self.assertEqual(result, "fetched")
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(os.listdir(directory), [])
+
+
+class TestCubeCache(TestCase):
+    def test_fingerprint_ignores_value_order(self):
+        dims = [routes[REPORTING_PERIOD_CODE].year]
+        malaga_faro = routes[ORIGIN_DESTINATION_CODE] == ["MALAGA", "FARO"]
+        faro_malaga = routes[ORIGIN_DESTINATION_CODE] == ["FARO", "MALAGA"]
+        self.assertEqual(
+            get_cube_fingerprint(session, dims, malaga_faro),
+            get_cube_fingerprint(session, dims, faro_malaga),
+        )
+
+    def test_fingerprint_depends_on_banding(self):
+        years = [routes[REPORTING_PERIOD_CODE].year]
+        months = [routes[REPORTING_PERIOD_CODE].month]
+        self.assertNotEqual(
+            get_cube_fingerprint(session, years, table=routes),
+            get_cube_fingerprint(session, months, table=routes),
+        )
+
+    def test_stored_dataframe_is_memory_mapped(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        store = DiskCache(directory, 1024 * 1024, suffix=".arrow")
+        df = make_cube_df(1000, "2015")
+        write_dataframe(store, "cube", df)
+        stored = read_dataframe(store, "cube")
+        pd.testing.assert_frame_equal(stored, df)
+        self.assertFalse(stored["Flight Routes"].to_numpy().flags.writeable)
+        self.assertIsNone(read_dataframe(store, "missing"))
+
+        flight_routes = CachedCube(stored).to_df()["Flight Routes"].to_numpy()
+        self.assertTrue(np.shares_memory(flight_routes, stored["Flight Routes"].to_numpy()))
+
+    def test_cached_cube_matches_cube(self):
+        dims = [routes[REPORTING_PERIOD_CODE].year, airports[REPORTING_AIRPORT_CODE]]
+        expected_df = TypedCube(dims, table=routes, session=session).to_df()
+        get_cube(session, dims, table=routes)
+        cached_df = get_cube(session, dims, table=routes).to_df()
+        pd.testing.assert_frame_equal(cached_df, expected_df)
+
+
+class TestTypedResults(SimpleTestCase):
+    def test_export_rows_are_typed(self):
+        columns = [
+            SimpleNamespace(description="Origin Destination", type=VariableType.SELECTOR),
+            SimpleNamespace(description="Origin Airport Latitude", type=VariableType.NUMERIC),
+            SimpleNamespace(description="Flight Route Name", type=VariableType.TEXT),
+        ]
+        rows = ["MALAGA\t   36.674900\tGatwick - Malaga", "NA\t\tNA"]
+        df = parse_export_rows(rows, columns)
+        self.assertEqual(df["Origin Destination"].dtype, "category")
+        self.assertEqual(df["Origin Destination"].tolist(), ["MALAGA", "NA"])
+        self.assertEqual(df["Origin Airport Latitude"].iloc[0], 36.6749)
+        self.assertTrue(pd.isna(df["Origin Airport Latitude"].iloc[1]))
+        self.assertEqual(df["Flight Route Name"].tolist(), ["Gatwick - Malaga", "NA"])
+
+    def test_measure_rows_are_float64(self):
+        values = parse_measure_rows(["1\t2\t3", "4\t5\t6"])
+        self.assertEqual(values.dtype, "float64")
+        self.assertEqual(values.tolist(), [1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+
+
+class TestRenderCache(SimpleTestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({"Origin Destination": ["MALAGA", "FARO"], "Flight Routes": [3, 4]})
+
+    def test_render_key_depends_on_contents(self):
+        self.assertEqual(
+            get_render_key("chart", self.df, "2015"),
+            get_render_key("chart", self.df.copy(), "2015"),
+        )
+        changed_df = self.df.assign(**{"Flight Routes": [3, 5]})
+        self.assertNotEqual(
+            get_render_key("chart", self.df, "2015"),
+            get_render_key("chart", changed_df, "2015"),
+        )
+
+    def test_render_key_depends_on_parameters(self):
+        self.assertNotEqual(
+            get_render_key("chart", self.df, "2015"),
+            get_render_key("chart", self.df, "2016"),
+        )
+
+
+class TestStreamedHtml(SimpleTestCase):
+    def test_streamed_html_draws_same_figure_as_plotly(self):
+        fig = go.Figure(
+            data=[go.Scatter(x=[1, 2], y=[3, 4])],
+            layout={"width": 500},
+            frames=[go.Frame(data=[go.Scatter(x=[1, 2], y=[4, 3])])],
+        )
+
+        def get_plot_call(html):
+            html = re.sub(r"[0-9a-f]{8}-[0-9a-f-]{27}", "ID", html)
+            return re.sub(r"\s+", "", html[html.index("Plotly.newPlot("):])
+
+        streamed_html = "".join(iter_html(fig))
+        self.assertEqual(
+            get_plot_call(streamed_html),
+            get_plot_call(pio.to_html(fig, full_html=False)),
+        )
+        self.assertIn("width:500px;", streamed_html)
+
+    def test_failed_streamed_write_stores_nothing(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        store = DiskCache(directory, 1024, suffix=".html")
+        with self.assertRaises(ValueError):
+            with store.open_for_write("chart") as file:
+                file.write(b"<div>")
+                raise ValueError("figure failed")
+        self.assertIsNone(store.get("chart"))
+        self.assertEqual(os.listdir(directory), [])
+
+
+class TestParallelQueries(SimpleTestCase):
+    def test_results_in_query_order(self):
+        results = run_queries((time.sleep, 0.2), (max, 3, 7), (min, 3, 7))
+        self.assertEqual(results, [None, 7, 3])
+
+    def test_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            run_queries((time.sleep, 0.2), (int, "not a number"))
+
+    def test_timeout_is_raised(self):
+        with self.assertRaises(TimeoutError):
+            run_queries((time.sleep, 1), timeout=0.1)
+
+    def test_time_queued_in_saturated_pool_is_not_counted(self):
+        release = threading.Event()
+        blockers = [query_executor.submit(release.wait) for __ in range(settings.QUERY_WORKERS)]
+        threading.Timer(0.3, release.set).start()
+        results = run_queries((time.sleep, 0.3), (max, 3, 7), timeout=0.4)
+        self.assertEqual(results, [None, 7])
+        self.assertTrue(all(blocker.done() for blocker in blockers))
+
+    def test_queries_not_started_in_saturated_pool_are_cancelled(self):
+        release = threading.Event()
+        blockers = [query_executor.submit(release.wait) for __ in range(settings.QUERY_WORKERS)]
+        self.addCleanup(release.set)
+        ran = []
+        start = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            run_queries((ran.append, "query"), timeout=0.2)
+        self.assertLess(time.monotonic() - start, 5)
+        release.set()
+        wait(blockers)
+        query_executor.submit(int).result()  # queued ahead of any later submissions
+        self.assertEqual(ran, [])
+
+
+class TestStageTiming(SimpleTestCase):
+    def test_repeated_stages_are_totalled(self):
+        timings = StageTimings()
+        timings.add("query", 0.01)
+        timings.add("figure", 0.005)
+        timings.add("query", 0.02)
+        self.assertEqual(
+            timings.server_timing(0.05),
+            'query;dur=30.0;desc="2 calls", figure;dur=5.0, total;dur=50.0',
+        )
+
+    def test_response_has_server_timing_header(self):
+        response = self.client.get("")
+        self.assertTrue(response["Server-Timing"].startswith("total;dur="))
+
+
+class TestProfiling(SimpleTestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir)
+
+    def test_sampled_request_is_profiled(self):
+        with self.settings(PROFILE_SAMPLE_RATE=1.0, PROFILER="cprofile", PROFILE_DIR=self.profile_dir):
+            self.client.get("")
+        (metadata_file,) = glob.glob(os.path.join(self.profile_dir, "*.json"))
+        with open(metadata_file) as file:
+            metadata = json.load(file)
+        self.assertEqual(metadata["reason"], "sampled")
+        self.assertEqual(metadata["view"], "index")
+        self.assertTrue(os.path.exists(os.path.join(self.profile_dir, metadata["profile"])))
+
+    def test_only_newest_profiles_are_kept(self):
+        with self.settings(
+            PROFILE_SAMPLE_RATE=1.0,
+            PROFILER="cprofile",
+            PROFILE_DIR=self.profile_dir,
+            PROFILE_MAX_FILES=2,
+        ):
+            for __ in range(3):
+                self.client.get("")
+        self.assertEqual(len(os.listdir(self.profile_dir)), 4)
+
+    def test_unsampled_request_is_not_profiled(self):
+        with self.settings(PROFILE_SAMPLE_RATE=0.0, PROFILE_DIR=self.profile_dir):
+            self.client.get("/?profile")  # Only staff users can ask for a profile
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+
 class TestSharedExampleLogic(TestCase):
     def test_get_codes_with_filter_limit_zero(self):
         codes = get_codes_with_filter(session, REPORTING_AIRPORT_CODE)
@@ -73,6 +579,13 @@ class TestSharedExampleLogic(TestCase):
         self.assertEqual(len(codes), 19)
         self.assertEqual(codes[10], "Flybe Ltd")
 
+    def test_get_codes_with_filter_is_cached(self):
+        caches["faststats_metadata"].clear()
+        codes = get_codes_with_filter(session, REPORTING_AIRPORT_CODE)
+        key = get_metadata_cache_key(session, "codes_with_filter", REPORTING_AIRPORT_CODE, 0)
+        self.assertEqual(caches["faststats_metadata"].get(key), codes)
+        self.assertEqual(get_codes_with_filter(session, REPORTING_AIRPORT_CODE), codes)
+
     def test_get_reporting_years(self):
         reporting_years = get_reporting_years(session)
         self.assertEqual(len(reporting_years), 24)
@@ -80,6 +593,47 @@ class TestSharedExampleLogic(TestCase):
         self.assertEqual(reporting_years[8], "2002")
 
 
+class TestCreateAndFilterCubeDataframe(SimpleTestCase):
+    def setUp(self):
+        months = pd.period_range("2014-11", "2015-02", freq="M", name="Reporting Period (Month)")
+        destinations = pd.CategoricalIndex(["FARO", "MALAGA"], name="Origin Destination")
+        index = pd.MultiIndex.from_product([destinations, months])
+        df = pd.DataFrame({"Flight Routes": [1.0, 2, 3, 4, 5, 6, 7, 8]}, index=index)
+        self.cube = CachedCube(df)
+
+    def test_filtered_to_selected_year(self):
+        df = create_and_filter_cube_dataframe(self.cube, "2015")
+        self.assertEqual(df["Flight Routes"].tolist(), [3.0, 4.0, 7.0, 8.0])
+        self.assertEqual(df["Date"].dt.year.unique().tolist(), [2015])
+        self.assertEqual(df["Origin Destination"].tolist(), ["FARO", "FARO", "MALAGA", "MALAGA"])
+
+    def test_month_labels_are_categorical(self):
+        df = create_and_filter_cube_dataframe(self.cube, "2015")
+        self.assertEqual(df["Month"].dtype, "category")
+        self.assertEqual(df["Month"].tolist(), ["January", "February", "January", "February"])
+        self.assertEqual(df["Month"].cat.categories.tolist(), ["January", "February"])
+
+    def test_month_labels_of_partly_covered_year(self):
+        df = create_and_filter_cube_dataframe(self.cube, "2014")
+        self.assertEqual(df["Month"].tolist(), ["November", "December", "November", "December"])
+        self.assertEqual(df["Month"].cat.categories.tolist(), ["November", "December"])
+
+    def test_empty_cube_draws_empty_map(self):
+        df = create_and_filter_cube_dataframe(CachedCube(self.cube.to_df().iloc[0:0]), "2015")
+        self.assertEqual(len(df), 0)
+        self.assertEqual(df["Month"].cat.categories.tolist(), [])
+
+        coordinates = pd.DataFrame(
+            {
+                "Origin Destination": ["FARO", "MALAGA"],
+                "Origin Airport Latitude": [37.0, 36.7],
+                "Origin Airport Longitude": [-7.9, -4.5],
+            }
+        )
+        fig = make_example_four_figure(df.merge(coordinates, on="Origin Destination"))
+        self.assertEqual(len(fig.frames), 0)
+
+
 class TestExampleOneLogic(TestCase):
     def test_nonzero_count(self):
         count = get_example_one_count(session, "ABERDEEN", "FARO")
@@ -104,6 +658,41 @@ class TestExampleTwoLogic(TestCase):
         self.assertEqual(jan15_counts, expected_counts)
 
 
+class TestExampleTwoTraces(SimpleTestCase):
+    def test_traces_per_selector_in_name_order(self):
+        df = pd.DataFrame(
+            {
+                "Airline Name": ["RYANAIR", "RYANAIR", "EASYJET", "EASYJET"],
+                "Date": pd.PeriodIndex(["2014", "2015", "2014", "2015"], freq="Y"),
+                "Flight Routes": [10.0, 20.0, 30.0, 40.0],
+            }
+        )
+        traces = get_example_two_traces(df, "Airline Name")
+        self.assertEqual([trace["name"] for trace in traces], ["EASYJET", "RYANAIR"])
+        self.assertEqual(traces[0]["x"].tolist(), ["2014-01-01T00:00:00", "2015-01-01T00:00:00"])
+        self.assertEqual(traces[0]["y"].tolist(), [30.0, 40.0])
+        self.assertEqual(traces[1]["y"].tolist(), [10.0, 20.0])
+
+    def test_data_refers_to_shared_dates(self):
+        df = pd.DataFrame(
+            {
+                "Airline Name": ["RYANAIR", "EASYJET", "EASYJET"],
+                "Date": pd.PeriodIndex(["2015", "2014", "2015"], freq="Y"),
+                "Flight Routes": [20.0, 30.0, 40.0],
+            }
+        )
+        data = get_example_two_data(df, "Airline Name")
+        self.assertEqual(data["dates"], ["2014-01-01T00:00:00", "2015-01-01T00:00:00"])
+        self.assertEqual(
+            data["series"],
+            [
+                {"name": "EASYJET", "x": [0, 1], "y": [30.0, 40.0]},
+                {"name": "RYANAIR", "x": [1], "y": [20.0]},
+            ],
+        )
+        json.dumps(data)  # Must be serializable as it is
+
+
 class TestExampleThreeLogic(TestCase):
     def setUp(self):
         self.df = get_example_three_dataframe(session, "EXETER")
@@ -122,23 +711,38 @@ class TestExampleThreeLogic(TestCase):
         self.assertTrue((self.df["Reporting Airport Latitude"] == 50.734400).all())
 
 
+class TestAirportCoordinates(TestCase):
+    def test_destination_coordinates(self):
+        df = get_destination_coordinates(session)
+        self.assertFalse(df["Origin Destination"].duplicated().any())
+        indianapolis = df[df["Origin Destination"] == "INDIANAPOLIS"].iloc[0].to_list()
+        self.assertEqual(indianapolis, ["INDIANAPOLIS", 39.7684, -86.1581])
+
+    def test_reporting_airport_coordinates(self):
+        df = get_reporting_airport_coordinates(session)
+        exeter = df[df["Reporting Airport"] == "EXETER"].iloc[0].to_list()
+        self.assertEqual(df.shape, (25, 3))
+        self.assertEqual(exeter, ["EXETER", 50.734400, -3.413890])
+
+
 class TestExampleFourLogic(TestCase):
     def test_example_four_cube(self):
         cube = get_example_four_cube(session, "RYANAIR", None, "GATWICK")
         df = cube.to_df().reset_index()
         expected_counts = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 0, 0, 4, 24, 24, 22, 16, 20, 24, 20]
         seville_counts = df[df["Origin Destination"] == "SEVILLE"]["Flight Routes"].to_list()
-        self.assertEqual(df.shape, (28980, 3))
+        # Only destinations with flight routes are sent
+        totals = df.groupby("Origin Destination", observed=True)["Flight Routes"].sum()
+        self.assertEqual(df.shape[1], 3)
+        self.assertTrue((totals > 0).all())
         self.assertEqual(seville_counts, expected_counts)
 
-    def test_example_four_datagrid(self):
-        dg = get_example_four_datagrid(session, "BRITISH AIRWAYS PLC")
-        # df = make_export_dataframe(export)
-        df = dg.to_df()
-        expected_details = ["HEATHROW", 39.7684,  -86.1581, "INDIANAPOLIS"]
-        indianapolic_details = df[df["Origin Destination"] == "INDIANAPOLIS"].iloc[0].to_list()
-        self.assertEqual(df.shape, (411, 4))
-        self.assertEqual(indianapolic_details, expected_details)
+    def test_example_four_dataframe_joins_destination_coordinates(self):
+        df = get_example_four_dataframe(session, "BRITISH AIRWAYS PLC", None, None)
+        indianapolis = df[df["Origin Destination"] == "INDIANAPOLIS"]
+        coordinates = indianapolis[["Origin Airport Latitude", "Origin Airport Longitude"]]
+        self.assertFalse(indianapolis.empty)
+        self.assertEqual(coordinates.drop_duplicates().values.tolist(), [[39.7684, -86.1581]])
 
     def test_example_four_dataframe_all_years_no_origin_airport(self):
         df = get_example_four_dataframe(session, "FLYBE LTD", None, None)
@@ -148,7 +752,7 @@ class TestExampleFourLogic(TestCase):
             self.assertEqual(len(set(df[df["Origin Destination"] == dest]["Origin Airport Latitude"].to_list())), 1)
             self.assertEqual(len(set(df[df["Origin Destination"] == dest]["Origin Airport Longitude"].to_list())), 1)
 
-        self.assertEqual(df.shape, (4071, 7))
+        self.assertEqual(df.shape, (4071, 6))
         self.assertEqual(stansted_routes, 42)
 
     def test_example_four_dataframe_selected_year_selected_origin_airport(self):
@@ -161,7 +765,7 @@ class TestExampleFourLogic(TestCase):
             self.assertEqual(len(set(df[df["Origin Destination"] == dest]["Origin Airport Latitude"].to_list())), 1)
             self.assertEqual(len(set(df[df["Origin Destination"] == dest]["Origin Airport Longitude"].to_list())), 1)
 
-        self.assertEqual(df.shape, (1944, 7))
+        self.assertEqual(df.shape, (1944, 6))
         self.assertEqual(feb_routes, 232)
 
 
@@ -184,6 +788,32 @@ class TestHomePage(TestCase):
         self.assertContains(response, "<h1>Welcome to your home page!</h1>")
 
 
+class TestChartJobs(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("test", password="this word will pass")
+        self.client.login(username="test", password="this word will pass")
+        self.session = SimpleNamespace(
+            base_url="http://faststats.test",
+            system="Flight Delays",
+            data_view="test",
+            system_info=SimpleNamespace(build_date=datetime.datetime(2020, 1, 1)),
+        )
+
+    def test_job_status_is_only_shown_to_its_owner(self):
+        def build_graph(session, title):
+            return title
+
+        other_user = User.objects.create_user("other", password="this word will pass")
+        job_id = submit_chart_job(other_user.pk, self.session, build_graph, "owned")
+        response = self.client.get(f"/chart_jobs/{job_id}")
+        self.assertEqual(response.status_code, 404)
+
+        job_id = submit_chart_job(self.user.pk, self.session, build_graph, "owned")
+        response = self.client.get(f"/chart_jobs/{job_id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("owner", response.json())
+
+
 class TestLoginApi(TestCase):
     def setUp(self):
         self.user = User.objects.create_user("test", password="this word will pass")
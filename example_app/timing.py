@@ -0,0 +1,156 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in milliseconds
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+
+_current_timings = contextvars.ContextVar("stage_timings", default=None)
+
+
+class StageTimings:
+    """Total duration and number of calls of each named stage of one request."""
+
+    def __init__(self):
+        self._stages = OrderedDict()  # stage name -> [seconds, calls]
+        self._lock = threading.Lock()  # stages can finish in query threads
+
+    def add(self, name, seconds):
+        with self._lock:
+            totals = self._stages.setdefault(name, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def items(self):
+        """Return list of (stage name, total seconds, calls) in the order first seen."""
+        with self._lock:
+            return [(name, seconds, calls) for name, (seconds, calls) in self._stages.items()]
+
+    def server_timing(self, total_seconds):
+        """Return Server-Timing header value for the stages and the whole request."""
+        metrics = [
+            f"{name};dur={seconds * 1000:.1f}" + (f';desc="{calls} calls"' if calls > 1 else "")
+            for name, seconds, calls in self.items()
+        ]
+        metrics.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+class StageHistograms:
+    """Thread-safe counts of stage durations per view, in fixed buckets."""
+
+    def __init__(self, buckets_ms=HISTOGRAM_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self._histograms = {}  # (view, stage) -> [bucket counts..., overflow count, sum ms]
+        self._lock = threading.Lock()
+
+    def observe(self, view, stage, seconds):
+        milliseconds = seconds * 1000
+        bucket = bisect.bisect_left(self.buckets_ms, milliseconds)
+        with self._lock:
+            histogram = self._histograms.setdefault(
+                (view, stage), [0] * (len(self.buckets_ms) + 1) + [0.0]
+            )
+            histogram[bucket] += 1
+            histogram[-1] += milliseconds
+
+    def snapshot(self):
+        """Return histograms as a dict of view -> stage -> count, sum and buckets."""
+        with self._lock:
+            histograms = {key: list(counts) for key, counts in self._histograms.items()}
+        labels = [f"<={bound}" for bound in self.buckets_ms] + [f">{self.buckets_ms[-1]}"]
+        snapshot = {}
+        for (view, stage), counts in sorted(histograms.items()):
+            *bucket_counts, sum_ms = counts
+            snapshot.setdefault(view, {})[stage] = {
+                "count": sum(bucket_counts),
+                "sum_ms": round(sum_ms, 1),
+                "buckets_ms": dict(zip(labels, bucket_counts)),
+            }
+        return snapshot
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+stage_histograms = StageHistograms()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time the enclosed block as stage 'name' of the current request, if any."""
+    timings = _current_timings.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.add(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorate function so each call is timed as stage 'name'."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class TimingMiddleware:
+    """Time the stages of each request.
+
+    Stage durations are sent in a Server-Timing header and logged as one JSON
+    line to the 'example_app.timing' logger. If STAGE_TIMING_HISTOGRAMS is set,
+    they're also added to per-process histograms for the timing_stats view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = StageTimings()
+        token = _current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        total_seconds = time.perf_counter() - start
+
+        response["Server-Timing"] = timings.server_timing(total_seconds)
+        stages = timings.items()
+        view = getattr(request.resolver_match, "url_name", None) or "unresolved"
+        logger.info(
+            json.dumps(
+                {
+                    "view": view,
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "total_ms": round(total_seconds * 1000, 1),
+                    "stages_ms": {name: round(seconds * 1000, 1) for name, seconds, __ in stages},
+                }
+            )
+        )
+        if settings.STAGE_TIMING_HISTOGRAMS:
+            for name, seconds, __ in stages:
+                stage_histograms.observe(view, name, seconds)
+            stage_histograms.observe(view, "total", total_seconds)
+        return response
@@ -0,0 +1,190 @@
+"""Cube and data grid results decoded straight into typed columns.
+
+apteco's Cube and DataGrid build an API model object for every row of a
+response, then split every cell into its own Python string, and their to_df()
+leaves selector and text columns as objects. These subclasses read the
+response's JSON directly and parse its rows in one pass with pandas' C parser,
+giving float64 measures and numbers, categorical selectors and period dates.
+"""
+import csv
+import io
+import json
+
+import apteco_api as aa
+import numpy as np
+import pandas as pd
+from apteco.common import VariableType
+from apteco.cube import Cube
+from apteco.datagrid import DataGrid
+
+# strftime formats of banded date header codes, and the matching period frequency
+DATE_BANDINGS = {"Years": ("%Y", "Y"), "Months": ("%Y%m", "M"), "Day": ("%Y%m%d", "D")}
+
+
+class TypedCube(Cube):
+    """Cube whose to_df() gives float64 measures, categorical selectors and periods."""
+
+    def _get_data(self):
+        cube_result = self._get_cube()
+        headers = [
+            {
+                "codes": [
+                    "TOTAL" if c == "iTOTAL" else c for c in dimension["headerCodes"].split("\t")
+                ],
+                "descs": [
+                    "TOTAL" if d == "iTOTAL" else d
+                    for d in dimension["headerDescriptions"].split("\t")
+                ],
+            }
+            for dimension in reversed(cube_result["dimensionResults"])
+        ]
+        sizes = tuple(len(dimension_headers["codes"]) for dimension_headers in headers)
+        data = [
+            parse_measure_rows(measure_result["rows"]).reshape(sizes)
+            for measure_result in cube_result["measureResults"]
+        ]
+        measure_names = [measure_result["id"] for measure_result in cube_result["measureResults"]]
+        return data, sizes, headers, measure_names
+
+    def _get_cube(self):
+        """Return the cube's results as a dict of the API's JSON response."""
+        cube = aa.Cube(
+            base_query=aa.Query(
+                selection=self.selection._to_model_selection()
+                if self.selection is not None
+                else aa.Selection(table_name=self.table.name)
+            ),
+            resolve_table_name=self.table.name,
+            storage="Full",
+            dimensions=self._create_dimensions(),
+            measures=self._create_measures(),
+        )
+        response = aa.CubesApi(self.session.api_client).cubes_calculate_cube_synchronously(
+            self.session.data_view, self.session.system, cube=cube, _preload_content=False
+        )
+        return json.loads(response.data)
+
+    def to_df(self):
+        """Return DataFrame of results, without unclassified and total cells."""
+        inner = tuple(get_values_slice(dimension) for dimension in self.dimensions)
+        levels = [
+            get_dimension_index(headers, dimension)
+            for headers, dimension in zip(self._headers, self.dimensions)
+        ]
+        if len(levels) == 1:
+            index = levels[0]
+        else:
+            index = pd.MultiIndex.from_product(levels)
+        return pd.DataFrame(
+            {
+                measure_name: measure_data[inner].ravel()
+                for measure_name, measure_data in zip(self._measure_names, self._data)
+            },
+            index=index,
+        )
+
+
+class TypedDataGrid(DataGrid):
+    """Data grid whose to_df() gives float64 numbers, categorical selectors and periods."""
+
+    def _get_data(self):
+        export_result = self._get_export()
+        return parse_export_rows(
+            [row["descriptions"] for row in export_result.get("rows") or []], self.columns
+        )
+
+    def _get_export(self):
+        """Return the export's results as a dict of the API's JSON response."""
+        export = aa.Export(
+            base_query=aa.Query(
+                selection=self.selection._to_model_selection()
+                if self.selection is not None
+                else aa.Selection(table_name=self.table.name)
+            ),
+            resolve_table_name=self.table.name,
+            maximum_number_of_rows_to_browse=self.max_rows,
+            return_browse_rows=True,
+            columns=self._create_columns(),
+        )
+        response = aa.ExportsApi(self.session.api_client).exports_perform_export_synchronously(
+            self.session.data_view, self.session.system, export=export, _preload_content=False
+        )
+        return json.loads(response.data)
+
+    def to_df(self):
+        return self._data.copy()
+
+
+def parse_measure_rows(rows):
+    """Return flat float64 array of the tab-separated values in cube measure 'rows'."""
+    try:
+        values = pd.read_csv(
+            io.StringIO("\n".join(rows)),
+            sep="\t",
+            header=None,
+            dtype=np.float64,
+            quoting=csv.QUOTE_NONE,
+            skip_blank_lines=False,
+        ).to_numpy()
+    except (ValueError, pd.errors.ParserError):
+        # Uneven rows or unexpected text: parse cell by cell, like apteco
+        cells = [cell for row in rows for cell in row.split("\t")]
+        values = pd.to_numeric(pd.Series(cells, dtype=object), errors="coerce").to_numpy()
+    return values.ravel()
+
+
+def parse_export_rows(rows, columns):
+    """Return DataFrame of tab-separated export 'rows', typed by each column's variable."""
+    names = [variable.description for variable in columns]
+    dtypes = {}
+    for name, variable in zip(names, columns):
+        if variable.type == VariableType.NUMERIC:
+            dtypes[name] = np.float64
+        elif variable.type == VariableType.SELECTOR:
+            dtypes[name] = "category"
+        else:
+            dtypes[name] = str
+    if not rows:
+        return pd.DataFrame({name: pd.Series(dtype=dtypes[name]) for name in names})
+
+    df = pd.read_csv(
+        io.StringIO("\n".join(rows)),
+        sep="\t",
+        header=None,
+        names=names,
+        dtype=dtypes,
+        quoting=csv.QUOTE_NONE,
+        keep_default_na=False,  # "NA" is a valid description
+        na_values={name: [""] for name in names if dtypes[name] is np.float64},
+        skip_blank_lines=False,
+    )
+    for name, variable in zip(names, columns):
+        if variable.type == VariableType.DATE:
+            dates = pd.to_datetime(df[name], format="%d-%m-%Y", errors="coerce")
+            df[name] = dates.dt.to_period("D")
+        elif variable.type == VariableType.DATETIME:
+            df[name] = pd.to_datetime(df[name], format="%d-%m-%Y %H:%M:%S", errors="coerce")
+    return df
+
+
+def get_values_slice(dimension):
+    """Return slice of a cube dimension's headers that holds its values.
+
+    Headers run unclassified (unless the dimension omits it), then each value,
+    then the total.
+    """
+    return slice(0 if getattr(dimension, "omit_unclassified", False) else 1, -1)
+
+
+def get_dimension_index(headers, dimension):
+    """Return index of a cube dimension's values, without unclassified and total."""
+    values = get_values_slice(dimension)
+    if dimension.type == VariableType.SELECTOR:
+        return pd.CategoricalIndex(headers["descs"][values], name=dimension.description)
+    if dimension.type == VariableType.BANDED_DATE and dimension.banding in DATE_BANDINGS:
+        date_format, freq = DATE_BANDINGS[dimension.banding]
+        dates = pd.to_datetime(headers["codes"][values], format=date_format)
+        return pd.PeriodIndex(dates, freq=freq, name=dimension.description)
+    # Other bandings as apteco converts them
+    normalized = Cube._normalize_headers(headers, dimension)[1:-1]
+    return pd.Index(Cube._convert_headers(normalized, dimension), name=dimension.description)
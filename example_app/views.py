@@ -1,26 +1,70 @@
+import itertools
+import logging
+
 import apteco_api as aa
-from apteco.session import Session, login_with_password
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate
 from django.contrib.auth import login as dj_login
 from django.contrib.auth import logout as dj_logout
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
-
-from .api_shared_methods import get_codes_with_filter, get_reporting_years
-from .example_four_code import get_example_four_dataframe, make_example_four_map
-from .example_one_code import get_example_one_count
-from .example_three_code import get_example_three_dataframe, make_example_three_map
-from .example_two_code import get_example_two_dataframe, make_example_two_graph
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.views.decorators.gzip import gzip_page
+
+from .api_shared_methods import (
+    get_codes_with_filter,
+    get_plotlyjs_html,
+    get_reporting_years,
+)
+from .chart_jobs import get_chart_job, submit_chart_job
+from .example_four_code import (
+    get_example_four_data,
+    get_example_four_dataframe,
+    make_example_four_figure,
+    make_example_four_map,
+)
+from .example_one_code import get_example_one_count, get_example_one_counts
+from .example_three_code import (
+    get_example_three_data,
+    get_example_three_dataframe,
+    make_example_three_figure,
+    make_example_three_map,
+)
+from .example_two_code import (
+    get_example_two_data,
+    get_example_two_dataframe,
+    make_example_two_figure,
+    make_example_two_graph,
+)
+from .faststats_client import get_pool_stats, login_with_password
 from .forms import LoginApiForm, LoginUserForm
 from .fs_var_names import (
     AIRLINE_NAME_CODE,
     ORIGIN_DESTINATION_CODE,
     REPORTING_AIRPORT_CODE,
 )
+from .parallel_queries import run_queries
+from .render_cache import iter_cached_figure_html
+from .session_registry import session_registry
+from .timing import stage, stage_histograms
+
+logger = logging.getLogger(__name__)
 
 EXAMPLE_ONE_DESTS = ["Malaga", "Faro", "Las Palmas", "Malta"]
 EXAMPLE_TWO_SELECTORS = ["Reporting Airport", "Airline Name", "Destination"]
 
+# Stands in for the graph when rendering a page, marking where to stream the chart
+STREAMED_CHART_MARKER = "<!-- streamed chart -->"
+NO_ROUTES_ALERT = """<div class="alert alert-danger" role="alert" style="margin-left:14px;">
+                      No flight routes were found in this selection
+                  </div>"""
+CHART_ERROR_ALERT = """<div class="alert alert-danger" role="alert" style="margin-left:14px;">
+                      The chart could not be created, please try again.
+                  </div>"""
+
 
 def index(request, context=None):
     """ Return the home page."""
@@ -39,9 +83,8 @@ def home(request, context=None):
     if context is None:
         context = {}
 
-    session = request.session.get("ApiSession", None)
+    session = get_api_session(request)
     if session is not None:
-        session = Session.deserialize(session)
         context.update(
             {
                 "system_name": session.system,
@@ -109,7 +152,7 @@ def login_api_proc(request):
                 form.cleaned_data["data_view"],
             )
             if session is not None:
-                request.session["ApiSession"] = session.serialize()
+                request.session["ApiSession"] = session_registry.add(session)
                 context = {
                     "alert_type": "alert-success",
                     "alert_message": "Successfully logged in",
@@ -123,12 +166,13 @@ def login_api_proc(request):
 @login_required
 def logout(request):
     """Log user out, delete session info."""
-    session = request.session.get("ApiSession", None)
-    if session is not None:
-        session = Session.deserialize(request.session["ApiSession"])
+    serialized_session = request.session.get("ApiSession", None)
+    if serialized_session is not None:
+        session = session_registry.get(serialized_session)
         aa.SessionsApi(session.api_client).sessions_logout_session(
             session.data_view, session.session_id
         )
+        session_registry.discard(serialized_session)
     username = request.user.username
     dj_logout(request)
 
@@ -142,12 +186,13 @@ def logout(request):
 @login_required
 def logout_api(request):
     """Logs out of FastStats session."""
-    session = request.session.get("ApiSession", None)
-    if session is not None:
-        session = Session.deserialize(request.session["ApiSession"])
+    serialized_session = request.session.get("ApiSession", None)
+    if serialized_session is not None:
+        session = session_registry.get(serialized_session)
         aa.SessionsApi(session.api_client).sessions_logout_session(
             session.data_view, session.session_id
         )
+        session_registry.discard(serialized_session)
         del request.session["ApiSession"]
 
     context = {
@@ -163,10 +208,9 @@ def example_one(request, context=None):
     if context is None:
         context = {}
 
-    session = request.session.get("ApiSession", None)
+    session = get_api_session(request)
     if session is None:
         return no_session_set(request)
-    session = Session.deserialize(session)
 
     origin_codes = get_codes_with_filter(session, REPORTING_AIRPORT_CODE, 0)
     context.update(
@@ -184,10 +228,9 @@ def example_one(request, context=None):
 def example_one_count(request):
     """Return count from user input in example one."""
     if request.method == "POST":
-        session = request.session.get("ApiSession", None)
+        session = get_api_session(request)
         if session is None:
             return no_session_set(request)
-        session = Session.deserialize(session)
 
         origin = request.POST["origin_code"]
         dest = request.POST["dest_code"]
@@ -210,10 +253,9 @@ def example_two(request, context=None):
     if context is None:
         context = {}
 
-    session = request.session.get("ApiSession", None)
+    session = get_api_session(request)
     if session is None:
         return no_session_set(request)
-    session = Session.deserialize(session)
 
     reporting_years = get_reporting_years(session)
     context.update(
@@ -231,17 +273,15 @@ def example_two(request, context=None):
 def example_two_graph(request):
     """Return graph from user input in example two."""
     if request.method == "POST":
-        session = request.session.get("ApiSession", None)
+        session = get_api_session(request)
         if session is None:
             return no_session_set(request)
-        session = Session.deserialize(session)
 
         first_selector = request.POST["first_selector"]
         date_option = request.POST["date_option"]
         top_pick = request.POST["top_choice"]
 
         measure_selector_code = encode_variable(first_selector)
-        measure_var_desc = session.variables[measure_selector_code].description
 
         if date_option == "Show All Years":
             selected_year = None
@@ -250,14 +290,36 @@ def example_two_graph(request):
 
         limit = int(top_pick)  # if limit = 0, same as None
 
-        df = get_example_two_dataframe(session, measure_selector_code, selected_year, limit)
-        graph_html = make_example_two_graph(df, measure_var_desc, selected_year)
         context = {
             "first_selected_col": first_selector,
             "selected_year": date_option,
             "selected_top_choice": top_pick,
-            "graph": graph_html,
         }
+        if settings.CLIENT_SIDE_CHARTS:
+            context.update(
+                get_chart_data_context(
+                    "example_two",
+                    first_selector=first_selector,
+                    date_option=date_option,
+                    top_choice=top_pick,
+                )
+            )
+            return example_two(request, context)
+        if streaming_charts_enabled():
+            chunks = stream_example_two_graph(
+                session, measure_selector_code, selected_year, limit
+            )
+            return stream_chart_page(request, example_two, context, chunks)
+        context.update(
+            get_graph(
+                request,
+                session,
+                build_example_two_graph,
+                measure_selector_code,
+                selected_year,
+                limit,
+            )
+        )
         return example_two(request, context)
     return redirect("example_two")
 
@@ -268,10 +330,9 @@ def example_three(request, context=None):
     if context is None:
         context = {}
 
-    session = request.session.get("ApiSession", None)
+    session = get_api_session(request)
     if session is None:
         return no_session_set(request)
-    session = Session.deserialize(session)
 
     airport_names = get_codes_with_filter(session, REPORTING_AIRPORT_CODE, 0)
     context.update(
@@ -289,16 +350,24 @@ def example_three_map(request):
     """Return graph from user input in example three."""
     # Get selected airport, update context that that one is selected, and encode it
     if request.method == "POST":
-        session = request.session.get("ApiSession", None)
+        session = get_api_session(request)
         if session is None:
             return no_session_set(request)
-        session = Session.deserialize(session)
 
         reporting_airport = request.POST["reporting_airport"]
 
-        df = get_example_three_dataframe(session, reporting_airport.upper())
-        graph_html = make_example_three_map(df)
-        context = {"graph": graph_html, "selected_airport": reporting_airport}
+        context = {"selected_airport": reporting_airport}
+        if settings.CLIENT_SIDE_CHARTS:
+            context.update(
+                get_chart_data_context("example_three", reporting_airport=reporting_airport)
+            )
+            return example_three(request, context)
+        if streaming_charts_enabled():
+            chunks = stream_example_three_map(session, reporting_airport.upper())
+            return stream_chart_page(request, example_three, context, chunks)
+        context.update(
+            get_graph(request, session, build_example_three_map, reporting_airport.upper())
+        )
         return example_three(request, context)
     return redirect("example_three")
 
@@ -308,13 +377,14 @@ def example_four(request, context=None):
     """Return web page for example three."""
     if context is None:
         context = {}
-    session = request.session.get("ApiSession", None)
+    session = get_api_session(request)
     if session is None:
         return no_session_set(request)
-    session = Session.deserialize(session)
 
-    airline_names = get_codes_with_filter(session, AIRLINE_NAME_CODE, 10001)
-    airport_names = get_codes_with_filter(session, REPORTING_AIRPORT_CODE, 0)
+    airline_names, airport_names = run_queries(
+        (get_codes_with_filter, session, AIRLINE_NAME_CODE, 10001),
+        (get_codes_with_filter, session, REPORTING_AIRPORT_CODE, 0),
+    )
     airport_names.insert(0, " ")  # First option is blank
     reporting_years = get_reporting_years(session)
     context.update(
@@ -333,10 +403,9 @@ def example_four(request, context=None):
 def example_four_map(request):
     """Return graph from user input in example three."""
     if request.method == "POST":
-        session = request.session.get("ApiSession", None)
+        session = get_api_session(request)
         if session is None:
             return no_session_set(request)
-        session = Session.deserialize(session)
 
         airline = request.POST["airline_name"]
         date_option = request.POST["year"]
@@ -350,30 +419,256 @@ def example_four_map(request):
         if reporting_airport == "":
             reporting_airport = None
 
-        df = get_example_four_dataframe(session, airline, selected_year, reporting_airport)
-
-        if (df["Flight Routes"] == 0).all():
-            graph_html = """<div class="alert alert-danger" role="alert" style="margin-left:14px;">
-                                No flight routes were found in this selection
-                            </div>"""
-        else:
-            graph_html = make_example_four_map(df)
         context = {
-            "graph": graph_html,
             "selected_airline": airline,
             "selected_year": selected_year,
             "selected_airport": reporting_airport,
         }
+        if settings.CLIENT_SIDE_CHARTS:
+            context.update(
+                get_chart_data_context(
+                    "example_four",
+                    airline_name=airline,
+                    year=date_option,
+                    reporting_airport=reporting_airport or "",
+                )
+            )
+            return example_four(request, context)
+        if streaming_charts_enabled():
+            chunks = stream_example_four_map(session, airline, selected_year, reporting_airport)
+            return stream_chart_page(request, example_four, context, chunks)
+        context.update(
+            get_graph(
+                request,
+                session,
+                build_example_four_map,
+                airline,
+                selected_year,
+                reporting_airport,
+            )
+        )
         return example_four(request, context)
     return redirect("example_four")
 
 
+@login_required
+@gzip_page
+def example_one_counts(request):
+    """Return flight route counts between many origins and destinations as JSON.
+
+    Origins and destinations are given as repeated 'origin_code' and 'dest_code'
+    parameters, and all of them are used if none are given.
+    All the counts come from a single FastStats query.
+    """
+    session = get_api_session(request)
+    if session is None:
+        return no_session_json()
+
+    origins = [origin.upper() for origin in request.GET.getlist("origin_code")]
+    dests = [dest.upper() for dest in request.GET.getlist("dest_code")]
+    counts = get_example_one_counts(session, origins, dests)
+    return JsonResponse(
+        {
+            "origins": counts.index.to_list(),
+            "destinations": counts.columns.to_list(),
+            "counts": counts.to_numpy().tolist(),
+        }
+    )
+
+
+@login_required
+@gzip_page
+def example_two_data(request):
+    """Return data for example two graph as JSON, to be drawn in the browser."""
+    session = get_api_session(request)
+    if session is None:
+        return no_session_json()
+
+    measure_selector_code = encode_variable(request.GET.get("first_selector", ""))
+    date_option = request.GET.get("date_option", "Show All Years")
+    try:
+        limit = int(request.GET.get("top_choice", "0"))
+    except ValueError:
+        limit = None
+    if measure_selector_code is None or limit is None:
+        return JsonResponse({"error": "Invalid chart options"}, status=400)
+
+    selected_year = None if date_option == "Show All Years" else date_option
+    measure_var_desc = session.variables[measure_selector_code].description
+    df = get_example_two_dataframe(session, measure_selector_code, selected_year, limit)
+    return JsonResponse(get_example_two_data(df, measure_var_desc, selected_year))
+
+
+@login_required
+@gzip_page
+def example_three_data(request):
+    """Return data for example three map as JSON, to be drawn in the browser."""
+    session = get_api_session(request)
+    if session is None:
+        return no_session_json()
+
+    reporting_airport = request.GET.get("reporting_airport", "")
+    if not reporting_airport:
+        return JsonResponse({"error": "Invalid chart options"}, status=400)
+
+    df = get_example_three_dataframe(session, reporting_airport.upper())
+    return JsonResponse(get_example_three_data(df))
+
+
+@login_required
+@gzip_page
+def example_four_data(request):
+    """Return data for example four map as JSON, to be drawn in the browser."""
+    session = get_api_session(request)
+    if session is None:
+        return no_session_json()
+
+    airline = request.GET.get("airline_name", "")
+    date_option = request.GET.get("year", "Show All Years")
+    reporting_airport = request.GET.get("reporting_airport") or None
+    if not airline:
+        return JsonResponse({"error": "Invalid chart options"}, status=400)
+
+    selected_year = None if date_option == "Show All Years" else date_option
+    df = get_example_four_dataframe(session, airline, selected_year, reporting_airport)
+    return JsonResponse(get_example_four_data(df))
+
+
+@login_required
+def chart_job_status(request, job_id):
+    """Return status of a background chart job, including its graph once done."""
+    job = get_chart_job(job_id, request.user.pk)
+    if job is None:
+        return JsonResponse({"status": "missing"}, status=404)
+    return JsonResponse(job)
+
+
+@staff_member_required
+def timing_stats(request):
+    """Return this process's histograms of request stage durations, for admins."""
+    if not settings.STAGE_TIMING_HISTOGRAMS:
+        raise Http404("Stage timing histograms are not enabled")
+    return JsonResponse(stage_histograms.snapshot())
+
+
+@staff_member_required
+def connection_pool_stats(request):
+    """Return this process's counts of pooled FastStats connections, for admins."""
+    return JsonResponse(get_pool_stats())
+
+
 # Helper functions
+def get_graph(request, session, build_graph, *args):
+    """Return context for graph, built now or as a background job if enabled."""
+    if settings.CHART_JOBS_ENABLED:
+        return {"job_id": submit_chart_job(request.user.pk, session, build_graph, *args)}
+    return {"graph": build_graph(session, *args)}
+
+
+def build_example_two_graph(session, measure_selector_code, selected_year, limit):
+    """Return HTML for example two graph."""
+    measure_var_desc = session.variables[measure_selector_code].description
+    df = get_example_two_dataframe(session, measure_selector_code, selected_year, limit)
+    return make_example_two_graph(df, measure_var_desc, selected_year, validate=False)
+
+
+def build_example_three_map(session, reporting_airport):
+    """Return HTML for example three map."""
+    df = get_example_three_dataframe(session, reporting_airport)
+    return make_example_three_map(df)
+
+
+def build_example_four_map(session, airline, selected_year, reporting_airport):
+    """Return HTML for example four map, or an alert if there are no flight routes."""
+    df = get_example_four_dataframe(session, airline, selected_year, reporting_airport)
+
+    if (df["Flight Routes"] == 0).all():
+        return NO_ROUTES_ALERT
+    return make_example_four_map(df)
+
+
+def get_chart_data_context(chart_name, **options):
+    """Return context for a chart drawn in the browser from its data endpoint."""
+    data_url = reverse(f"{chart_name}_data") + "?" + urlencode(options)
+    return {
+        "chart_name": chart_name,
+        "chart_data_url": data_url,
+        "plotly_js_url": settings.PLOTLY_JS_URL,
+    }
+
+
+def streaming_charts_enabled():
+    """Return whether chart pages are streamed, which background jobs take priority over."""
+    return settings.STREAMING_CHARTS and not settings.CHART_JOBS_ENABLED
+
+
+def stream_chart_page(request, page_view, context, chart_chunks):
+    """Return page_view's page as a streaming response, with the chart streamed into it.
+
+    The page up to the chart goes out straight away followed by plotly.js,
+    so the browser has both while the chart's data is still being fetched.
+    """
+    context["graph"] = STREAMED_CHART_MARKER
+    page = page_view(request, context)
+    content = page.content.decode(page.charset)
+    if STREAMED_CHART_MARKER not in content:
+        return page  # e.g. redirected to log in
+    head, tail = content.split(STREAMED_CHART_MARKER, 1)
+    chunks = itertools.chain([head, get_plotlyjs_html()], iter_chart_chunks(chart_chunks), [tail])
+    return StreamingHttpResponse(chunks, content_type=page["Content-Type"])
+
+
+def iter_chart_chunks(chunks):
+    """Yield streamed chart HTML, ending with an alert if the chart can't be built.
+
+    The response status has been sent by then, so errors can only be shown in the page.
+    """
+    try:
+        yield from chunks
+    except Exception:
+        logger.exception("Streamed chart failed")
+        yield CHART_ERROR_ALERT
+
+
+def stream_example_two_graph(session, measure_selector_code, selected_year, limit):
+    """Yield HTML for example two graph in chunks, without plotly.js."""
+    measure_var_desc = session.variables[measure_selector_code].description
+    df = get_example_two_dataframe(session, measure_selector_code, selected_year, limit)
+    yield from iter_cached_figure_html(
+        make_example_two_figure, df, measure_var_desc, selected_year, validate=False
+    )
+
+
+def stream_example_three_map(session, reporting_airport):
+    """Yield HTML for example three map in chunks, without plotly.js."""
+    df = get_example_three_dataframe(session, reporting_airport)
+    yield from iter_cached_figure_html(make_example_three_figure, df)
+
+
+def stream_example_four_map(session, airline, selected_year, reporting_airport):
+    """Yield HTML for example four map in chunks, or an alert if there are no flight routes."""
+    df = get_example_four_dataframe(session, airline, selected_year, reporting_airport)
+
+    if (df["Flight Routes"] == 0).all():
+        yield NO_ROUTES_ALERT
+        return
+    yield from iter_cached_figure_html(make_example_four_figure, df)
+
+
 def start_session(username, password, url, system_name, data_view):
     session = login_with_password(url, data_view, system_name, username, password)
     return session
 
 
+def get_api_session(request):
+    """Return live FastStats session for the request, or None if not logged in."""
+    serialized_session = request.session.get("ApiSession", None)
+    if serialized_session is None:
+        return None
+    with stage("session"):
+        return session_registry.get(serialized_session)
+
+
 def not_logged_in(request):
     """Return error page if login required for web page."""
     context = {
@@ -396,6 +691,13 @@ def incorrect_details(request, page):
     return redirect("index")
 
 
+def no_session_json():
+    """Return JSON error for data requests without a FastStats session."""
+    return JsonResponse(
+        {"error": "Please log in to a FastStats system to access that page."}, status=403
+    )
+
+
 def no_session_set(request):
     context = {
         "alert_type": "alert-danger",